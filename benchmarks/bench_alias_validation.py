@@ -0,0 +1,113 @@
+"""
+Micro-benchmark for display name validation as the banned names list
+grows.
+
+Run with::
+
+    $ py.test benchmarks/bench_alias_validation.py
+
+For every list size this prints the cost of a single call to
+``GemAliasMixin._clean_alias`` (which includes the settings lookups) and of
+the compiled matcher on its own, next to the cost of the previous
+implementation that ran ``re.search`` for every line of the list.
+"""
+import random
+import re
+import string
+import timeit
+
+from django.test import TestCase
+
+from wagtail.wagtailcore.models import Site
+
+from gem.forms import GemAliasMixin
+from gem.models import GemSettings
+from gem.moderation import get_matcher
+from molo.core.tests.base import MoloTestCaseMixin
+
+
+SIZES = (100, 1000, 10000, 50000)
+ALIASES = 50
+ROUNDS = 20
+NAIVE_ROUNDS = 2
+LETTERS = string.ascii_lowercase.replace('z', '')
+
+
+def random_word(rng, min_length=4, max_length=12, letters=LETTERS):
+    return ''.join(
+        rng.choice(letters)
+        for i in range(rng.randint(min_length, max_length)))
+
+
+def random_keyword(rng):
+    # Every keyword contains a 'z', which never appears in the aliases
+    word = random_word(rng)
+    position = rng.randint(0, len(word))
+    return word[:position] + 'z' + word[position:]
+
+
+class AliasForm(GemAliasMixin):
+
+    def __init__(self, alias):
+        self.cleaned_data = {'alias': alias}
+
+
+def naive_search(banned_list, alias):
+    for keyword in banned_list:
+        if re.search(keyword.replace('\r', ''), alias.lower()):
+            return True
+    return False
+
+
+def per_call(func, rounds, calls):
+    return min(timeit.repeat(func, number=1, repeat=rounds)) / calls * 1e6
+
+
+class AliasValidationBenchmark(TestCase, MoloTestCaseMixin):
+
+    def setUp(self):
+        self.mk_main()
+        self.site = Site.objects.get(is_default_site=True)
+        self.rng = random.Random(1)
+        # None of these match, so every check scans the whole alias
+        self.aliases = [
+            random_word(self.rng, 16, 30) for i in range(ALIASES)]
+
+    def test_alias_validation_cost_is_flat(self):
+        print('\n%8s %14s %14s %14s' % (
+            'entries', 'clean (us)', 'matcher (us)', 'naive (us)'))
+
+        results = {}
+        for size in SIZES:
+            banned_list = [random_keyword(self.rng) for i in range(size)]
+            settings = GemSettings.for_site(self.site)
+            settings.banned_names_with_offensive_language = \
+                '\r\n'.join(banned_list)
+            settings.save()
+
+            matcher = get_matcher(
+                settings, 'banned_names_with_offensive_language')
+
+            def clean():
+                for alias in self.aliases:
+                    AliasForm(alias)._clean_alias()
+
+            def match():
+                for alias in self.aliases:
+                    matcher.search(alias)
+
+            def naive():
+                for alias in self.aliases[:5]:
+                    naive_search(banned_list, alias)
+
+            clean()
+            results[size] = (
+                per_call(clean, ROUNDS, ALIASES),
+                per_call(match, ROUNDS, ALIASES),
+                per_call(naive, NAIVE_ROUNDS, 5),
+            )
+            print('%8d %14.1f %14.1f %14.1f' % ((size,) + results[size]))
+
+        smallest, largest = results[SIZES[0]], results[SIZES[-1]]
+        self.assertLess(largest[1], smallest[1] * 3)
+        self.assertLess(largest[0], smallest[0] * 3)
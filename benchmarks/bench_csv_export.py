@@ -0,0 +1,115 @@
+"""
+Benchmark for the ``download_as_csv_gem`` admin action.
+
+Run with::
+
+    $ py.test -s benchmarks/bench_csv_export.py
+
+This creates 100,000 synthetic users with their profiles and streams the
+export of all of them, printing the queries, the time, the size of the
+export and how much the peak memory of the process grew. The previous
+implementation, which built the whole export in one response and queried
+both profiles for every user, is measured on a smaller number of users.
+"""
+import csv
+import resource
+import timeit
+
+from django.contrib.auth.models import User
+from django.db import connection
+from django.http import HttpResponse
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+
+from gem.admin import GemUserAdmin, download_as_csv_gem
+from gem.models import GemUserProfile
+from molo.core.tests.base import MoloTestCaseMixin
+from molo.profiles.models import UserProfile
+
+
+USERS = 100000
+PREVIOUS_USERS = 5000
+BATCH_SIZE = 500
+
+
+def previous_download_as_csv_gem(queryset):
+    response = HttpResponse(content_type='text/csv')
+    writer = csv.writer(response)
+    user_model_fields = (
+        'username', 'email', 'first_name',
+        'last_name', 'is_staff', 'date_joined')
+    profile_fields = ('alias', 'mobile_number', 'date_of_birth')
+    gem_profile_fields = ('gender',)
+    writer.writerow(user_model_fields + profile_fields + gem_profile_fields)
+    for obj in queryset:
+        if hasattr(obj, 'gem_profile'):
+            if obj.profile.alias:
+                obj.profile.alias = obj.profile.alias.encode('utf-8')
+            obj.username = obj.username.encode('utf-8')
+            obj.date_joined = obj.date_joined.strftime("%Y-%m-%d %H:%M")
+            writer.writerow(
+                [getattr(obj, field) for field in user_model_fields] +
+                [getattr(obj.profile, field) for field in profile_fields] +
+                [getattr(
+                    obj.gem_profile, field) for field in gem_profile_fields])
+    return response.content
+
+
+def peak_memory_kb():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def create_users(count):
+    for start in range(0, count, BATCH_SIZE):
+        User.objects.bulk_create(
+            User(username='user%06d' % i, email='user%06d@example.com' % i)
+            for i in range(start, min(start + BATCH_SIZE, count)))
+    user_ids = list(User.objects.values_list('pk', flat=True))
+    for start in range(0, len(user_ids), BATCH_SIZE):
+        batch = user_ids[start:start + BATCH_SIZE]
+        UserProfile.objects.bulk_create(
+            UserProfile(user_id=pk, alias=u'Alias \u00e9 %s' % pk)
+            for pk in batch)
+        GemUserProfile.objects.bulk_create(
+            GemUserProfile(user_id=pk, gender='fm'[pk % 2]) for pk in batch)
+
+
+class CSVExportBenchmark(TestCase, MoloTestCaseMixin):
+
+    def setUp(self):
+        self.mk_main()
+        create_users(USERS)
+
+    def test_export_users(self):
+        print('\n%-10s %8s %10s %10s %12s %14s' % (
+            'export', 'users', 'queries', 'time (s)', 'size (MB)',
+            'memory (MB)'))
+
+        def row(name, users, export):
+            memory = peak_memory_kb()
+            start = timeit.default_timer()
+            with CaptureQueriesContext(connection) as queries:
+                size = export()
+            seconds = timeit.default_timer() - start
+            growth = (peak_memory_kb() - memory) / 1024.0
+            print('%-10s %8d %10d %10.1f %12.1f %14.1f' % (
+                name, users, len(queries.captured_queries), seconds,
+                size / 1024.0 / 1024, growth))
+            return growth
+
+        def stream():
+            response = download_as_csv_gem(
+                GemUserAdmin(User, None), None, User.objects.all())
+            return sum(len(chunk) for chunk in response.streaming_content)
+
+        def previous():
+            queryset = User.objects.filter(
+                pk__in=User.objects.order_by('pk').values_list(
+                    'pk', flat=True)[:PREVIOUS_USERS])
+            return len(previous_download_as_csv_gem(queryset))
+
+        growth = row('streaming', USERS, stream)
+        row('previous', PREVIOUS_USERS, previous)
+
+        # only one chunk of users is in memory at a time
+        self.assertLess(growth, 50)
@@ -0,0 +1,86 @@
+"""
+Benchmark for serving pages to logged in readers.
+
+Run with::
+
+    $ py.test -s benchmarks/bench_page_cache.py
+
+This requests an article with comments and the home page as a logged in
+reader, first without gem.middleware.PageCacheMiddleware, rendering every
+page in full, and then with it, serving the cached pages with the
+reader's fragments rendered in. It prints the queries per page, the time
+and the pages served per second for each.
+"""
+import timeit
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.contrib.contenttypes.models import ContentType
+from django.contrib.sites.models import Site
+from django.db import connection, reset_queries
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.utils import timezone
+
+from molo.commenting.models import MoloComment
+from molo.core import constants
+from molo.core.models import SiteLanguage
+from molo.core.tests.base import MoloTestCaseMixin
+
+
+REQUESTS = 200
+PAGE_CACHE_MIDDLEWARE = 'gem.middleware.PageCacheMiddleware'
+
+
+class PageCacheBenchmark(TestCase, MoloTestCaseMixin):
+
+    def setUp(self):
+        SiteLanguage.objects.create(locale='en')
+        self.mk_main()
+        section = self.mk_section(self.section_index)
+        self.mk_articles(section, count=10)
+        self.article = self.mk_article(
+            section, title='Commented article',
+            commenting_state=constants.COMMENTING_OPEN)
+        user = User.objects.create_user(username='tester', password='tester')
+        for i in range(5):
+            MoloComment.objects.create(
+                content_type=ContentType.objects.get_for_model(self.article),
+                object_pk=self.article.pk, site=Site.objects.get_current(),
+                user=user, comment='comment %s' % i,
+                submit_date=timezone.now())
+
+    def serve(self, paths):
+        # the client loads the middleware on its first request
+        self.client = self.client_class()
+        self.client.login(username='tester', password='tester')
+        for path in paths:
+            self.client.get(path)
+        reset_queries()
+        start = timeit.default_timer()
+        with CaptureQueriesContext(connection) as queries:
+            for i in range(REQUESTS):
+                response = self.client.get(paths[i % len(paths)])
+                self.assertEqual(response.status_code, 200)
+        return (
+            len(queries.captured_queries) / float(REQUESTS),
+            timeit.default_timer() - start)
+
+    def test_page_cache(self):
+        print('\n%-10s %8s %10s %10s %10s' % (
+            'path', 'pages', 'queries', 'time (s)', 'pages/s'))
+
+        without_cache = [
+            middleware for middleware in settings.MIDDLEWARE_CLASSES
+            if middleware != PAGE_CACHE_MIDDLEWARE]
+        rates = {}
+        for name, middleware in (
+                ('previous', without_cache),
+                ('cached', settings.MIDDLEWARE_CLASSES)):
+            with override_settings(MIDDLEWARE_CLASSES=middleware):
+                queries, seconds = self.serve(['/', self.article.url])
+            rates[name] = REQUESTS / seconds
+            print('%-10s %8d %10.1f %10.1f %10.0f' % (
+                name, REQUESTS, queries, seconds, rates[name]))
+
+        self.assertGreater(rates['cached'], 2 * rates['previous'])
@@ -0,0 +1,76 @@
+"""
+Benchmark for provisioning users in bulk.
+
+Run with::
+
+    $ py.test -s benchmarks/bench_provisioning.py
+
+This creates 100,000 users with ``gem.registration.bulk_create_users`` and,
+for comparison, a smaller number by saving each user and letting the
+post_save handlers create its profiles one row at a time. The passwords are
+hashed once beforehand for both, so only the database work is measured. It
+prints the queries, the time and the users created per second for each.
+"""
+import timeit
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.db import connection, reset_queries
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+
+from gem.registration import bulk_create_users
+from molo.core.tests.base import MoloTestCaseMixin
+
+
+USERS = 100000
+PREVIOUS_USERS = 500
+BATCH_SIZE = 1000
+
+
+def previous_provisioning(users):
+    for fields in users:
+        user = User(username=fields['username'], password=fields['password'])
+        user.save()
+        user.profile.alias = fields['alias']
+        user.profile.save()
+        user.gem_profile.gender = fields['gender']
+        user.gem_profile.save()
+
+
+def bulk_provisioning(users):
+    bulk_create_users(users, BATCH_SIZE)
+
+
+class ProvisioningBenchmark(TestCase, MoloTestCaseMixin):
+
+    def setUp(self):
+        self.mk_main()
+        self.password = make_password('1234')
+
+    def users(self, prefix, count):
+        return (
+            {'username': '%s%d' % (prefix, i), 'password': self.password,
+             'alias': '%s%d' % (prefix, i), 'gender': 'fm'[i % 2]}
+            for i in range(count))
+
+    def test_provisioning(self):
+        print('\n%-10s %8s %10s %10s %10s' % (
+            'path', 'users', 'queries', 'time (s)', 'users/s'))
+
+        rates = {}
+        for name, provision, count in (
+                ('previous', previous_provisioning, PREVIOUS_USERS),
+                ('bulk', bulk_provisioning, USERS)):
+            reset_queries()
+            start = timeit.default_timer()
+            with CaptureQueriesContext(connection) as queries:
+                provision(self.users(name, count))
+            seconds = timeit.default_timer() - start
+            rates[name] = count / seconds
+            print('%-10s %8d %10d %10.1f %10.0f' % (
+                name, count, len(queries.captured_queries), seconds,
+                rates[name]))
+
+        self.assertEqual(User.objects.count(), USERS + PREVIOUS_USERS)
+        self.assertGreater(rates['bulk'], 10 * rates['previous'])
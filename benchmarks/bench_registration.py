@@ -0,0 +1,95 @@
+"""
+Benchmark for registration with the password hasher and with the
+security answer hasher used for security question answers.
+
+Run with::
+
+    $ py.test -s benchmarks/bench_registration.py
+
+This prints the latency of a registration request through the test client,
+and the throughput of the hashing done by a registration (the password,
+both answers and the password check when logging in) with several threads
+registering at once. The test database is SQLite, so the concurrent part
+leaves the database out; PBKDF2 releases the GIL, so the threads do hash in
+parallel.
+"""
+import threading
+import timeit
+
+from django.contrib.auth.hashers import make_password, check_password
+from django.core.urlresolvers import reverse
+from django.test import TestCase
+from django.test.utils import override_settings
+
+from molo.core.tests.base import MoloTestCaseMixin
+
+
+REGISTRATIONS = 20
+CONCURRENCY = (1, 4, 8)
+POLICIES = (
+    ('password hasher', 'pbkdf2_sha256'),
+    ('answer hasher', 'gem_answer_pbkdf2_sha256'),
+)
+
+
+def hash_registration(answer_hasher):
+    encoded = make_password('password')
+    make_password('cat', hasher=answer_hasher)
+    make_password('dog', hasher=answer_hasher)
+    check_password('password', encoded)
+
+
+def registrations_per_second(answer_hasher, threads):
+    per_thread = REGISTRATIONS
+
+    def register():
+        for i in range(per_thread):
+            hash_registration(answer_hasher)
+
+    workers = [threading.Thread(target=register) for i in range(threads)]
+    start = timeit.default_timer()
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    return per_thread * threads / (timeit.default_timer() - start)
+
+
+class RegistrationBenchmark(TestCase, MoloTestCaseMixin):
+
+    def setUp(self):
+        self.mk_main()
+        self.count = 0
+
+    def register(self):
+        self.count += 1
+        response = self.client.post(reverse('user_register'), {
+            'username': 'tester%s' % self.count,
+            'password': '1234',
+            'alias': 'tester%s' % self.count,
+            'gender': 'f',
+            'security_question_1_answer': 'cat',
+            'security_question_2_answer': 'dog',
+            'terms_and_conditions': 'on',
+        })
+        self.assertEqual(response.status_code, 302)
+        self.client.logout()
+
+    def test_registration_latency_and_throughput(self):
+        print('\n%-16s %14s' % ('answers', 'latency (ms)') + ''.join(
+            '%14s' % ('%d threads/s' % threads) for threads in CONCURRENCY))
+
+        results = {}
+        for name, answer_hasher in POLICIES:
+            with override_settings(SECURITY_ANSWER_HASHER=answer_hasher):
+                latency = min(timeit.repeat(
+                    self.register, number=1, repeat=REGISTRATIONS)) * 1e3
+                throughput = [
+                    registrations_per_second(answer_hasher, threads)
+                    for threads in CONCURRENCY]
+            results[name] = latency
+            print('%-16s %14.1f' % (name, latency) + ''.join(
+                '%14.1f' % rate for rate in throughput))
+
+        self.assertLess(
+            results['answer hasher'], results['password hasher'])
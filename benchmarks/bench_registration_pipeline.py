@@ -0,0 +1,107 @@
+"""
+Benchmark for the queries and hashes of a registration.
+
+Run with::
+
+    $ py.test -s benchmarks/bench_registration_pipeline.py
+
+This compares the previous ``GemRegistrationView.form_valid``, which saved
+each profile after creating the user and checked the password again with
+``authenticate``, with ``gem.registration.create_user`` and
+``login_new_user``. It prints the queries, the writes, the PBKDF2 hashes
+and the wall time of a registration for each.
+"""
+import timeit
+
+from django.contrib.auth import authenticate, login, hashers
+from django.contrib.auth.models import User
+from django.contrib.sessions.middleware import SessionMiddleware
+from django.db import connection
+from django.test import TestCase, RequestFactory
+from django.test.utils import CaptureQueriesContext
+
+from gem.registration import create_user, login_new_user
+from molo.core.tests.base import MoloTestCaseMixin
+
+
+REGISTRATIONS = 20
+
+
+def previous_registration(request, username):
+    user = User.objects.create_user(username=username, password='1234')
+
+    user.profile.alias = username
+    user.profile.mobile_number = None
+    user.profile.save()
+
+    user.gem_profile.gender = 'f'
+    user.gem_profile.set_security_question_1_answer('cat')
+    user.gem_profile.set_security_question_2_answer('dog')
+    user.gem_profile.save()
+
+    authed_user = authenticate(username=username, password='1234')
+    login(request, authed_user)
+
+
+def registration(request, username):
+    user = create_user(
+        username=username,
+        password='1234',
+        alias=username,
+        mobile_number=None,
+        gender='f',
+        security_question_1_answer='cat',
+        security_question_2_answer='dog')
+    login_new_user(request, user)
+
+
+class RegistrationPipelineBenchmark(TestCase, MoloTestCaseMixin):
+
+    def setUp(self):
+        self.mk_main()
+        self.factory = RequestFactory()
+        self.count = 0
+        self.hashes = 0
+
+        pbkdf2 = hashers.pbkdf2
+
+        def counting_pbkdf2(*args, **kwargs):
+            self.hashes += 1
+            return pbkdf2(*args, **kwargs)
+
+        hashers.pbkdf2 = counting_pbkdf2
+        self.addCleanup(setattr, hashers, 'pbkdf2', pbkdf2)
+
+    def register(self, pipeline):
+        self.count += 1
+        request = self.factory.post('/profiles/register/')
+        SessionMiddleware().process_request(request)
+        pipeline(request, 'tester%s' % self.count)
+
+    def measure(self, pipeline):
+        self.hashes = 0
+        with CaptureQueriesContext(connection) as queries:
+            self.register(pipeline)
+        hashes = self.hashes
+        writes = [
+            query for query in queries.captured_queries
+            if not query['sql'].startswith(
+                ('SELECT', 'SAVEPOINT', 'RELEASE SAVEPOINT'))]
+        seconds = min(timeit.repeat(
+            lambda: self.register(pipeline), number=1, repeat=REGISTRATIONS))
+        return (
+            len(queries.captured_queries), len(writes), hashes,
+            seconds * 1e3)
+
+    def test_registration_queries_and_hashes(self):
+        print('\n%-12s %8s %8s %8s %10s' % (
+            'pipeline', 'queries', 'writes', 'hashes', 'time (ms)'))
+
+        results = {}
+        for name, pipeline in (('previous', previous_registration),
+                               ('current', registration)):
+            results[name] = self.measure(pipeline)
+            print('%-12s %8d %8d %8d %10.1f' % ((name,) + results[name]))
+
+        self.assertLess(results['current'][0], results['previous'][0])
+        self.assertEqual(results['current'][2], 3)
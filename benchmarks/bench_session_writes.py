@@ -0,0 +1,104 @@
+"""
+Benchmark for session writes under a mix of anonymous and logged in
+traffic.
+
+Run with::
+
+    $ py.test -s benchmarks/bench_session_writes.py
+
+For each configuration this prints how many times a session was written
+per 1,000 requests.
+The previous configuration saved every session to the database on every
+request to slide the 10 minute expiry along.
+"""
+from django.contrib.auth.models import User
+from django.test import TestCase, Client
+from django.test.utils import override_settings
+
+from molo.core.tests.base import MoloTestCaseMixin
+
+
+REQUESTS = 1000
+CLIENTS = 20
+URLS = ('/', '/profiles/view/myprofile/')
+
+CONFIGURATIONS = (
+    ('db, save every request', {
+        'SESSION_ENGINE': 'django.contrib.sessions.backends.db',
+        'SESSION_SAVE_EVERY_REQUEST': True,
+        'MIDDLEWARE_CLASSES_REPLACE': (
+            'gem.middleware.SlidingSessionMiddleware',
+            'django.contrib.sessions.middleware.SessionMiddleware'),
+    }),
+    ('cached_db, sliding', {
+        'SESSION_ENGINE': 'django.contrib.sessions.backends.cached_db',
+    }),
+    ('gem.sessions, sliding', {
+        'SESSION_ENGINE': 'gem.sessions',
+    }),
+    ('signed_cookies, sliding', {
+        'SESSION_ENGINE': 'django.contrib.sessions.backends.signed_cookies',
+    }),
+)
+
+
+class SessionWriteBenchmark(TestCase, MoloTestCaseMixin):
+
+    def setUp(self):
+        self.mk_main()
+        for i in range(CLIENTS):
+            User.objects.create_user(
+                username='tester%s' % i, password='tester')
+
+    def count_writes(self, overrides):
+        from django.conf import settings
+
+        overrides = dict(overrides)
+        replace = overrides.pop('MIDDLEWARE_CLASSES_REPLACE', None)
+        if replace is not None:
+            overrides['MIDDLEWARE_CLASSES'] = [
+                replace[1] if cls == replace[0] else cls
+                for cls in settings.MIDDLEWARE_CLASSES]
+
+        with override_settings(**overrides):
+            clients = []
+            for i in range(CLIENTS):
+                client = Client()
+                # half of the clients are logged in
+                if i % 2:
+                    client.login(username='tester%s' % i, password='tester')
+                clients.append(client)
+
+            writes = [0]
+            engine = Client().session.__class__
+            own_save = engine.__dict__.get('save')
+            original_save = engine.save
+
+            def counting_save(self, *args, **kwargs):
+                writes[0] += 1
+                return original_save(self, *args, **kwargs)
+
+            engine.save = counting_save
+            try:
+                for i in range(REQUESTS):
+                    clients[i % CLIENTS].get(URLS[i % len(URLS)])
+            finally:
+                if own_save is None:
+                    del engine.save
+                else:
+                    engine.save = own_save
+
+        return writes[0]
+
+    def test_session_writes_per_thousand_requests(self):
+        print('\n%-26s %16s' % ('configuration', 'session writes'))
+
+        results = {}
+        for name, overrides in CONFIGURATIONS:
+            results[name] = self.count_writes(overrides)
+            print('%-26s %16d' % (name, results[name]))
+
+        baseline = results[CONFIGURATIONS[0][0]]
+        for name, result in results.items():
+            if name != CONFIGURATIONS[0][0]:
+                self.assertLess(result, baseline / 10)
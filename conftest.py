@@ -0,0 +1,10 @@
+import pytest
+
+from django.core.cache import cache
+
+
+@pytest.fixture(autouse=True)
+def clear_cache():
+    # Cached settings and pages would otherwise outlive the test database
+    # transaction they were created in.
+    cache.clear()
@@ -1,41 +1,53 @@
 from django.contrib import admin
 from django.contrib.auth.models import User
-from gem.models import GemUserProfile, GemCommentReport
+from django.db.models import F
+from django.db.models.query import QuerySet
+from gem.constants import GENDER_NAMES
+from gem.models import (
+    GemUserProfile, GemCommentReport, GemCommentReportCount)
+from django_comments.models import CommentFlag
 from molo.commenting.admin import MoloCommentAdmin
 from molo.commenting.models import MoloComment
 from molo.profiles.admin import ProfileUserAdmin
 from molo.profiles.admin import FrontendUsersModelAdmin
 from molo.profiles.admin_import_export import FrontendUsersResource
-from django.http import HttpResponse
+from django.http import StreamingHttpResponse
 from import_export.fields import Field
-from wagtail.contrib.modeladmin.views import IndexView
 from molo.profiles.admin_views import FrontendUsersAdminView
 import csv
+from gem.pagination import EstimatedCountPaginator, with_estimated_count
 from gem.tasks import send_export_email_gem
+from gem.utils import Echo, encode_csv_value, queryset_in_chunks
+
+
+USER_MODEL_FIELDS = (
+    'username', 'email', 'first_name',
+    'last_name', 'is_staff', 'date_joined')
+PROFILE_FIELDS = ('alias', 'mobile_number', 'date_of_birth')
+GEM_PROFILE_FIELDS = ('gender',)
+
+
+def user_csv_rows(queryset):
+    yield USER_MODEL_FIELDS + PROFILE_FIELDS + GEM_PROFILE_FIELDS
+    queryset = queryset.select_related('profile', 'gem_profile')
+    for obj in queryset_in_chunks(queryset):
+        if hasattr(obj, 'gem_profile'):
+            values = (
+                [getattr(obj, field) for field in USER_MODEL_FIELDS] +
+                [getattr(obj.profile, field) for field in PROFILE_FIELDS] +
+                [getattr(obj.gem_profile, field)
+                 for field in GEM_PROFILE_FIELDS])
+            values[USER_MODEL_FIELDS.index('date_joined')] = \
+                obj.date_joined.strftime("%Y-%m-%d %H:%M")
+            yield [encode_csv_value(value) for value in values]
 
 
 def download_as_csv_gem(GemUserAdmin, request, queryset):
-    response = HttpResponse(content_type='text/csv')
+    writer = csv.writer(Echo())
+    response = StreamingHttpResponse(
+        (writer.writerow(row) for row in user_csv_rows(queryset)),
+        content_type='text/csv')
     response['Content-Disposition'] = 'attachment;filename=export.csv'
-    writer = csv.writer(response)
-    user_model_fields = (
-        'username', 'email', 'first_name',
-        'last_name', 'is_staff', 'date_joined')
-    profile_fields = ('alias', 'mobile_number', 'date_of_birth')
-    gem_profile_fields = ('gender',)
-    field_names = user_model_fields + profile_fields + gem_profile_fields
-    writer.writerow(field_names)
-    for obj in queryset:
-        if hasattr(obj, 'gem_profile'):
-            if obj.profile.alias:
-                obj.profile.alias = obj.profile.alias.encode('utf-8')
-            obj.username = obj.username.encode('utf-8')
-            obj.date_joined = obj.date_joined.strftime("%Y-%m-%d %H:%M")
-            writer.writerow(
-                [getattr(obj, field) for field in user_model_fields] +
-                [getattr(obj.profile, field) for field in profile_fields] +
-                [getattr(
-                    obj.gem_profile, field) for field in gem_profile_fields])
     return response
 download_as_csv_gem.short_description = "Download selected as csv gem"
 
@@ -53,14 +65,29 @@ class GemCommentReportModelAdmin(admin.StackedInline):
     readonly_fields = ["user", "reported_reason", ]
 
 
-class GemUserAdmin(ProfileUserAdmin):
+class GemUserQuerySetMixin(object):
+    """
+    Fetch the profile and the gender with the users listed, instead of
+    querying both for every row.
+    """
+
+    def get_queryset(self, request):
+        queryset = super(GemUserQuerySetMixin, self).get_queryset(request)
+        return queryset.select_related('profile').annotate(
+            gem_gender=F('gem_profile__gender'))
+
+    def gender(self, obj):
+        return GENDER_NAMES.get(obj.gem_gender, obj.gem_gender)
+    gender.admin_order_field = 'gem_gender'
+
+
+class GemUserAdmin(GemUserQuerySetMixin, ProfileUserAdmin):
     inlines = (GemUserProfileInlineModelAdmin, )
     list_display = ProfileUserAdmin.list_display + ('gender',)
     actions = ProfileUserAdmin.actions + [download_as_csv_gem]
     list_filter = ('gem_profile__gender',)
-
-    def gender(self, obj):
-        return obj.gem_profile.get_gender_display()
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
 
 
 class GemFrontendUsersResource(FrontendUsersResource):
@@ -70,29 +97,89 @@ class GemFrontendUsersResource(FrontendUsersResource):
             export_order = FrontendUsersResource.Meta.export_order + (
                 'gender',)
 
+        def prepare_queryset(self, queryset):
+            # every relation that is dehydrated
+            return queryset.select_related('profile', 'gem_profile')
+
+        def get_queryset(self):
+            return self.prepare_queryset(
+                super(GemFrontendUsersResource, self).get_queryset())
+
+        def export(self, queryset=None, *args, **kwargs):
+            if isinstance(queryset, QuerySet):
+                queryset = self.prepare_queryset(queryset)
+            return super(GemFrontendUsersResource, self).export(
+                queryset, *args, **kwargs)
+
         def dehydrate_gender(self, user):
-            if hasattr(user, 'gem_profile'):
-                return user.gem_profile.get_gender_display() if hasattr(
-                    user, 'gem_profile') else ''
-            return None
+            gem_profile = getattr(user, 'gem_profile', None)
+            if gem_profile is None:
+                return None
+            return GENDER_NAMES.get(gem_profile.gender, gem_profile.gender)
 
 
 class GemFrontendUsersAdminView(FrontendUsersAdminView):
     def send_export_email_to_celery(self, email, arguments):
         send_export_email_gem.delay(email, arguments)
 
+    def get_base_queryset(self, request=None):
+        # IndexView counts the users itself, so estimate the counts and
+        # count the listed users once for the paginator and the total
+        return with_estimated_count(
+            super(GemFrontendUsersAdminView, self).get_base_queryset(
+                request))
+
 
-class GemFrontendUsersModelAdmin(FrontendUsersModelAdmin):
+class GemFrontendUsersModelAdmin(GemUserQuerySetMixin,
+                                 FrontendUsersModelAdmin):
     list_display = FrontendUsersModelAdmin.list_display + ('gender',)
     index_view_class = GemFrontendUsersAdminView
 
-    def gender(self, obj):
-        return obj.gem_profile.get_gender_display()
-
 
 class GemCommentReportAdmin(MoloCommentAdmin):
     inlines = (GemCommentReportModelAdmin,)
 
+    list_display = MoloCommentAdmin.list_display[:-1] + (
+        'reports', 'submit_date')
+
+    def get_queryset(self, request):
+        # read the flag and report counts with the comments listed instead
+        # of counting them for each comment, as subqueries so that the
+        # changelist's count doesn't have to group the comments
+        return super(GemCommentReportAdmin, self).get_queryset(
+            request).extra(
+            select={
+                'removal_flags': (
+                    'SELECT COUNT(*) FROM %s WHERE %s.comment_id = %s.%s '
+                    'AND %s.flag = %%s' % (
+                        CommentFlag._meta.db_table,
+                        CommentFlag._meta.db_table,
+                        MoloComment._meta.db_table,
+                        MoloComment._meta.pk.column,
+                        CommentFlag._meta.db_table)),
+                'gem_reports': (
+                    'SELECT count FROM %s WHERE %s.comment_id = %s.%s' % (
+                        GemCommentReportCount._meta.db_table,
+                        GemCommentReportCount._meta.db_table,
+                        MoloComment._meta.db_table,
+                        MoloComment._meta.pk.column)),
+            },
+            select_params=(CommentFlag.SUGGEST_REMOVAL,))
+
+    def is_reported(self, obj):
+        return obj.removal_flags > 0
+    is_reported.boolean = True
+
+    def reported_count(self, obj):
+        return obj.removal_flags
+    reported_count.short_description = 'Times reported'
+    reported_count.admin_order_field = 'removal_flags'
+
+    def reports(self, obj):
+        return obj.gem_reports or 0
+    reports.short_description = 'Reports'
+    reports.admin_order_field = 'gem_reports'
+
 
 admin.site.unregister(User)
 admin.site.register(User, GemUserAdmin)
@@ -0,0 +1,29 @@
+"""
+Version keys for invalidating process-local caches across workers.
+
+A version is an opaque token kept in the shared cache. Anything cached
+locally is stored together with the version it was built for and is
+rebuilt once the version changes, so bumping a version from one process
+invalidates the matching entries in every process.
+"""
+from uuid import uuid4
+
+from django.core.cache import cache
+
+
+VERSION_KEY = 'gem:version:%s'
+
+
+def get_cache_version(name):
+    key = VERSION_KEY % name
+    version = cache.get(key)
+    if version is None:
+        # another process may have created the version in the meantime
+        cache.add(key, uuid4().hex, None)
+        # a cache that doesn't store anything gets a new version every time
+        version = cache.get(key) or uuid4().hex
+    return version
+
+
+def bump_cache_version(name):
+    cache.set(VERSION_KEY % name, uuid4().hex, None)
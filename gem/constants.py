@@ -6,3 +6,4 @@ UNSPECIFIED = "-"
 GENDERS = {(MALE, _("male")),
            (FEMALE, _("female")),
            (UNSPECIFIED, _("don't want to answer"))}
+GENDER_NAMES = dict(GENDERS)
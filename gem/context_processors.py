@@ -1,10 +1,47 @@
+from functools import partial
+
+from django.utils.functional import SimpleLazyObject
+
 from molo.profiles.forms import RegistrationForm
 from molo.profiles.forms import EditProfileForm, ProfilePasswordChangeForm
 
 
+DEFAULT_FORMS = (
+    ('registration_form', RegistrationForm),
+    ('edit_profile_form', EditProfileForm),
+    ('password_change_form', ProfilePasswordChangeForm),
+)
+
+
+class DefaultFormsCounter(object):
+    """
+    Counts the default forms offered to templates during a request and how
+    many of them were actually built.
+    """
+    def __init__(self):
+        self.offered = 0
+        self.built = 0
+
+    @property
+    def avoided(self):
+        return self.offered - self.built
+
+    def build(self, form_class):
+        self.built += 1
+        return form_class()
+
+
 def default_forms(request):
-    return {
-        'registration_form': RegistrationForm(),
-        'edit_profile_form': EditProfileForm(),
-        'password_change_form': ProfilePasswordChangeForm()
-    }
+    """
+    Offer the default forms to every template, building each form only if
+    the template uses it.
+    """
+    counter = getattr(request, 'default_forms_counter', None)
+    if counter is None:
+        counter = request.default_forms_counter = DefaultFormsCounter()
+
+    context = {}
+    for name, form_class in DEFAULT_FORMS:
+        counter.offered += 1
+        context[name] = SimpleLazyObject(partial(counter.build, form_class))
+    return context
@@ -0,0 +1,131 @@
+"""
+Exports of frontend users, written in the background.
+
+An export is written to a gzipped CSV file in EXPORT_ROOT one chunk of users
+at a time. Every chunk is a separate gzip member and, once it is on disk, the
+primary key of the last user written and the size of the file are recorded in
+the cache. An export that was interrupted truncates the file to the last
+recorded size and carries on from there when it runs again.
+"""
+import csv
+import gzip
+import os
+import time
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core import signing
+from django.core.cache import cache
+from django.core.urlresolvers import reverse
+
+from gem.utils import encode_csv_value, queryset_chunks
+
+
+SIGNING_SALT = 'gem.exports'
+
+
+class UserExport(object):
+
+    def __init__(self, export_id, arguments, chunk_size=None):
+        self.export_id = export_id
+        self.arguments = arguments
+        self.chunk_size = chunk_size or settings.EXPORT_CHUNK_SIZE
+
+    @property
+    def path(self):
+        return get_export_path(self.export_id)
+
+    @property
+    def progress_key(self):
+        return 'gem:export:%s' % self.export_id
+
+    def get_resource(self):
+        from gem.admin import GemFrontendUsersResource
+        return GemFrontendUsersResource()
+
+    def get_queryset(self, resource):
+        return resource.prepare_queryset(
+            User.objects.filter(is_staff=False, **self.arguments))
+
+    def write_member(self, rows):
+        with gzip.open(self.path, 'ab') as f:
+            writer = csv.writer(f)
+            for row in rows:
+                writer.writerow([encode_csv_value(value) for value in row])
+        return os.path.getsize(self.path)
+
+    def save_progress(self, progress):
+        cache.set(self.progress_key, progress, settings.EXPORT_MAX_AGE)
+
+    def write_chunks(self):
+        """
+        Write the export, yielding the progress after every chunk.
+        """
+        resource = self.get_resource()
+        progress = cache.get(self.progress_key)
+
+        if progress is None or not os.path.exists(self.path):
+            if not os.path.isdir(settings.EXPORT_ROOT):
+                os.makedirs(settings.EXPORT_ROOT)
+            open(self.path, 'wb').close()
+            progress = {
+                'last_pk': None,
+                'rows': 0,
+                'size': self.write_member([resource.get_export_headers()]),
+            }
+            self.save_progress(progress)
+        else:
+            # drop anything written after the last recorded chunk
+            with open(self.path, 'r+b') as f:
+                f.truncate(progress['size'])
+
+        for chunk in queryset_chunks(
+                self.get_queryset(resource), self.chunk_size,
+                progress['last_pk']):
+            size = self.write_member(
+                resource.export_resource(user) for user in chunk)
+            progress = {
+                'last_pk': chunk[-1].pk,
+                'rows': progress['rows'] + len(chunk),
+                'size': size,
+            }
+            self.save_progress(progress)
+            yield progress
+
+    def write(self):
+        for progress in self.write_chunks():
+            pass
+        return self.path
+
+    def get_download_url(self):
+        token = signing.dumps(self.export_id, salt=SIGNING_SALT)
+        return settings.BASE_URL + reverse('export_download', args=[token])
+
+    def delete(self):
+        cache.delete(self.progress_key)
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+
+def get_export_path(export_id):
+    return os.path.join(settings.EXPORT_ROOT, '%s.csv.gz' % export_id)
+
+
+def get_export_path_from_token(token):
+    """
+    Return the path of the export a download link was signed for, raising
+    signing.BadSignature if the link was tampered with or has expired.
+    """
+    export_id = signing.loads(
+        token, salt=SIGNING_SALT, max_age=settings.EXPORT_MAX_AGE)
+    return get_export_path(export_id)
+
+
+def remove_expired_exports():
+    if not os.path.isdir(settings.EXPORT_ROOT):
+        return
+    expired = time.time() - settings.EXPORT_MAX_AGE
+    for name in os.listdir(settings.EXPORT_ROOT):
+        path = os.path.join(settings.EXPORT_ROOT, name)
+        if name.endswith('.csv.gz') and os.path.getmtime(path) < expired:
+            os.remove(path)
@@ -4,12 +4,12 @@ from django.forms import Form
 from django.utils.translation import ugettext_lazy as _
 from gem.constants import GENDERS
 from gem.models import GemSettings
+from gem.moderation import get_matcher
+from gem.sites import get_default_site
 from molo.profiles.forms import RegistrationForm, EditProfileForm
 from molo.profiles.models import UserProfile
 from gem.settings import REGEX_EMAIL, REGEX_PHONE
 
-from wagtail.wagtailcore.models import Site
-
 
 def validate_no_email_or_phone(input):
     regexes = [REGEX_EMAIL, REGEX_PHONE]
@@ -23,6 +23,12 @@ def validate_no_email_or_phone(input):
 
 class GemAliasMixin(object):
 
+    def __init__(self, *args, **kwargs):
+        # the site the display name is validated against, usually the
+        # request's site
+        self.site = kwargs.pop('site', None)
+        super(GemAliasMixin, self).__init__(*args, **kwargs)
+
     def _clean_alias(self):
         """
         Check for email addresses, telephone numbers and any other keywords or
@@ -38,27 +44,17 @@ class GemAliasMixin(object):
                     " name.")
             )
 
-        site = Site.objects.get(is_default_site=True)
-        settings = GemSettings.for_site(site)
-
-        banned_list = [REGEX_EMAIL, REGEX_PHONE]
-
-        banned_names_with_offensive_language = \
-            settings.banned_names_with_offensive_language.split('\n') \
-            if settings.banned_names_with_offensive_language else []
+        settings = GemSettings.for_site(self.site or get_default_site())
 
-        banned_list += banned_names_with_offensive_language
-
-        for keyword in banned_list:
-            keyword = keyword.replace('\r', '')
-            match = re.search(keyword, alias.lower())
-            if match:
-                raise forms.ValidationError(
-                    _(
-                        'Sorry, the name you have used is not allowed. '
-                        'Please, use a different name for your display name.'
-                    )
+        matcher = get_matcher(
+            settings, 'banned_names_with_offensive_language')
+        if matcher.search(alias):
+            raise forms.ValidationError(
+                _(
+                    'Sorry, the name you have used is not allowed. '
+                    'Please, use a different name for your display name.'
                 )
+            )
 
         return alias
 
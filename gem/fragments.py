@@ -0,0 +1,58 @@
+"""
+Fragments of a page that are particular to the reader.
+
+A template marks such a fragment with the ``fragment`` tag. While a page
+is rendered for gem.pagecache the tag leaves a marker naming the
+fragment's template and its context instead, so the page can be cached
+once and the fragments rendered for each reader the page is served to.
+The markers are signed so that content on the page can't make up its own,
+without a timestamp so that rendering the same fragment again gives the
+same marker and snapshots holding markers can be compared.
+"""
+import json
+import re
+
+from django.core import signing
+from django.template.context_processors import csrf
+from django.template.loader import render_to_string
+from django.utils.encoding import force_bytes
+
+
+SALT = 'gem.fragments'
+MARKER = '<!--gem-fragment:%s-->'
+MARKER_RE = re.compile(br'<!--gem-fragment:([\w:-]+)-->')
+
+
+def get_marker(template_name, context):
+    data = json.dumps(
+        [template_name, context], sort_keys=True, separators=(',', ':'))
+    return MARKER % signing.Signer(salt=SALT).sign(
+        signing.b64_encode(data.encode('utf-8')).decode('ascii'))
+
+
+def load_marker(value):
+    data = signing.Signer(salt=SALT).unsign(value)
+    return json.loads(signing.b64_decode(force_bytes(data)).decode('utf-8'))
+
+
+def render_fragment(request, template_name, context):
+    # Only the request, the reader and the CSRF token are added to the
+    # context, the context processors aren't run for each fragment.
+    context = dict(context, request=request, user=request.user)
+    context.update(csrf(request))
+    return render_to_string(template_name, context)
+
+
+def render_fragments(request, content):
+    if b'<!--gem-fragment:' not in content:
+        return content
+
+    def render(match):
+        try:
+            template_name, context = load_marker(
+                match.group(1).decode('ascii'))
+        except signing.BadSignature:
+            return b''
+        return force_bytes(render_fragment(request, template_name, context))
+
+    return MARKER_RE.sub(render, content)
@@ -0,0 +1,15 @@
+from django.conf import settings
+from django.contrib.auth.hashers import PBKDF2PasswordHasher
+
+
+class SecurityAnswerHasher(PBKDF2PasswordHasher):
+    """
+    PBKDF2 for security question answers, with its own work factor set by
+    SECURITY_ANSWER_HASH_ITERATIONS so that it can be tuned separately from
+    the one used for passwords.
+    """
+    algorithm = 'gem_answer_pbkdf2_sha256'
+
+    @property
+    def iterations(self):
+        return settings.SECURITY_ANSWER_HASH_ITERATIONS
@@ -0,0 +1,110 @@
+"""
+Snapshots of the homepage listing blocks.
+
+Each block of core/main.html is rendered once per site and locale and kept
+in the shared cache, so the homepage reads them instead of running the
+block's page queries on every request. The parts of a block particular to
+the reader are fragments (see gem.fragments), which are left as markers
+in the snapshot.
+
+The listings change when pages are published, unpublished or moved, which
+clears the snapshots of the site, and when the content rotation tasks
+promote, demote or rotate articles. The gem.tasks wrappers of those tasks
+render the snapshots again after they run, and clear the site's pages if
+any block changed.
+"""
+from collections import OrderedDict
+
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import cache
+from django.http import HttpRequest
+from django.template import engines
+from django.utils import translation
+
+from gem.caching import get_cache_version, bump_cache_version
+from gem.pagecache import clear_pages
+from molo.core.models import SiteLanguage
+from wagtail.wagtailcore.models import Site
+
+
+# block name: the template tag library it is loaded from
+BLOCKS = OrderedDict((
+    ('latest_listing_homepage', 'core_tags'),
+    ('surveys_list', 'molo_survey_tags'),
+    ('poll_page', 'poll_votings'),
+    ('section_listing_homepage', 'core_tags'),
+    ('your_words_competition', 'competition_tag'),
+))
+
+
+def get_cache_key(site_id, locale, name):
+    return 'gem:homepage:%s:%s:%s:%s' % (
+        site_id, get_cache_version('homepage:%s' % site_id), locale, name)
+
+
+def clear_homepage(site_id):
+    bump_cache_version('homepage:%s' % site_id)
+
+
+def get_request(site):
+    # The blocks only depend on the site and the locale, so they are
+    # rendered for an anonymous reader of the site's root, with fragments
+    # left as markers.
+    request = HttpRequest()
+    request.path = request.path_info = '/'
+    request.META['SERVER_NAME'] = site.hostname
+    request.site = site
+    request.user = AnonymousUser()
+    request.page_fragments = True
+    return request
+
+
+def render_block(site, locale, name):
+    template = engines['django'].from_string(
+        '{%% load %s %%}{%% %s %%}' % (BLOCKS[name], name))
+    with translation.override(locale):
+        return template.render({
+            'request': get_request(site),
+            'locale_code': locale,
+        })
+
+
+def get_block(site, locale, name):
+    key = get_cache_key(site.pk, locale, name)
+    content = cache.get(key)
+    if content is None:
+        content = render_block(site, locale, name)
+        cache.set(key, content, settings.HOMEPAGE_CACHE_TIMEOUT)
+    return content
+
+
+def refresh_homepage(site):
+    """
+    Render the blocks of a site's homepage in every active language, and
+    clear the site's pages if any of them changed. Returns whether they did.
+    """
+    locales = SiteLanguage.objects.filter(
+        is_active=True).values_list('locale', flat=True)
+    blocks = dict(
+        ((locale, name), render_block(site, locale, name))
+        for locale in locales for name in BLOCKS)
+
+    def get_contents():
+        return dict(
+            (get_cache_key(site.pk, locale, name), content)
+            for (locale, name), content in blocks.items())
+
+    contents = get_contents()
+    changed = cache.get_many(contents.keys()) != contents
+    if changed:
+        # drops the blocks of other locales and the pages showing them
+        clear_homepage(site.pk)
+        clear_pages(site.pk)
+        contents = get_contents()
+    cache.set_many(contents, settings.HOMEPAGE_CACHE_TIMEOUT)
+    return changed
+
+
+def refresh_homepages():
+    return [site for site in Site.objects.all() if refresh_homepage(site)]
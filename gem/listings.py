@@ -0,0 +1,155 @@
+"""
+Cached article listings of section pages.
+
+A section page shows a page of the section's articles, the first of them
+as the hero. The page of articles is loaded once, the parent sections,
+images and renditions the listing shows are fetched in batches instead of
+by each article, and the rendered listing is kept in the shared cache per
+site, section, page number and locale. The listings of a site are dropped
+together when a page of the site is published, unpublished or moved, or
+the site's settings or languages change.
+"""
+from django.conf import settings
+from django.core.cache import cache
+from django.template.loader import render_to_string
+from wagtail.wagtailimages import get_image_model
+from wagtail.wagtailimages.models import Filter
+
+from gem.caching import get_cache_version, bump_cache_version
+from molo.core.models import SectionPage
+from molo.core.templatetags.core_tags import load_child_articles_for_section
+
+
+HERO_FILTER = 'fill-600x250'
+LIST_FILTER = 'fill-200x200'
+SECTION_FILTERS = ('width-200', 'width-400')
+
+
+def get_cache_key(site_id, section_id, page_number, locale):
+    return 'gem:listing:%s:%s:%s:%s:%s' % (
+        site_id, get_cache_version('listings:%s' % site_id), section_id,
+        page_number, locale)
+
+
+def clear_listings(site_id):
+    bump_cache_version('listings:%s' % site_id)
+
+
+def get_parent_sections(pages):
+    """
+    Return the closest section above each page, like
+    ``ArticlePage.get_parent_section``, in a single query.
+    """
+    steplen = SectionPage.steplen
+    ancestor_paths = dict(
+        (page.pk, [page.path[:i] for i in range(
+            steplen, len(page.path), steplen)])
+        for page in pages)
+    sections = dict(
+        (section.path, section) for section in SectionPage.objects.filter(
+            path__in=set(sum(ancestor_paths.values(), []))))
+    parents = {}
+    for page in pages:
+        for path in reversed(ancestor_paths[page.pk]):
+            if path in sections:
+                parents[page.pk] = sections[path]
+                break
+    return parents
+
+
+def get_renditions(image_ids, filter_specs):
+    """
+    Return the renditions of the images for the filter specs, keyed by
+    image id and filter spec. Renditions are fetched in a single query and
+    only the missing ones are created.
+    """
+    Image = get_image_model()
+    Rendition = Image.get_rendition_model()
+    images = Image.objects.in_bulk(set(image_ids))
+    existing = dict(
+        ((rendition.image_id, rendition.filter_spec,
+          rendition.focal_point_key), rendition)
+        for rendition in Rendition.objects.filter(
+            image_id__in=images, filter_spec__in=filter_specs))
+
+    renditions = {}
+    for image in images.values():
+        for spec in filter_specs:
+            rendition = existing.get(
+                (image.pk, spec, Filter(spec=spec).get_cache_key(image)))
+            if rendition is None:
+                rendition = image.get_rendition(spec)
+            # the img tag's alt text is the image's title
+            rendition.image = image
+            renditions[image.pk, spec] = rendition
+    return renditions
+
+
+def get_items(articles):
+    sections = get_parent_sections(articles)
+    renditions = get_renditions(
+        [article.image_id for article in articles if article.image_id] +
+        [section.image_id for section in sections.values()
+         if section.image_id],
+        (HERO_FILTER, LIST_FILTER) + SECTION_FILTERS)
+
+    items = []
+    for index, article in enumerate(articles):
+        section = sections.get(article.pk)
+        section_image_id = section and section.image_id
+        items.append({
+            'article': article,
+            'image': renditions.get((
+                article.image_id, HERO_FILTER if index == 0 else
+                LIST_FILTER)),
+            'section_image_small': renditions.get(
+                (section_image_id, SECTION_FILTERS[0])),
+            'section_image_large': renditions.get(
+                (section_image_id, SECTION_FILTERS[1])),
+        })
+    return items
+
+
+def load_articles(context, section):
+    return load_child_articles_for_section({
+        'request': context['request'],
+        'locale_code': context.get('locale_code'),
+        'p': context.get('p', 1),
+    }, section)
+
+
+def render_listing(context, section, articles):
+    items = get_items(list(articles))
+    listing_context = {
+        'request': context['request'],
+        'settings': context.get('settings'),
+        'self': section,
+        'hero': items[:1],
+        'items': items[1:],
+        'articles_paginated': articles,
+    }
+    return {
+        'articles': render_to_string(
+            'core/section_articles.html', listing_context),
+        'pagination': render_to_string(
+            'core/section_pagination.html', listing_context),
+    }
+
+
+def get_listing(context, section):
+    request = context['request']
+    site_id = getattr(request.site, 'pk', None)
+    locale = context.get('locale_code')
+    listing = cache.get(get_cache_key(
+        site_id, section.pk, context.get('p', 1), locale))
+    if listing is None:
+        # Listings are only kept under the number of the page served, so
+        # out of range and other page numbers that serve the same page
+        # don't each keep a copy of it.
+        articles = load_articles(context, section)
+        key = get_cache_key(site_id, section.pk, articles.number, locale)
+        listing = cache.get(key)
+        if listing is None:
+            listing = render_listing(context, section, articles)
+            cache.set(key, listing, settings.LISTING_CACHE_TIMEOUT)
+    return listing
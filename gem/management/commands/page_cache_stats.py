@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from gem.pagecache import get_stats
+
+
+class Command(BaseCommand):
+    help = 'Show the hits and misses of the anonymous page cache.'
+
+    def handle(self, *args, **options):
+        stats = get_stats()
+        requests = stats['hits'] + stats['misses']
+        self.stdout.write('Hits: %d, misses: %d, hit rate: %.1f%%' % (
+            stats['hits'], stats['misses'],
+            100.0 * stats['hits'] / requests if requests else 0))
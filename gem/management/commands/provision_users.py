@@ -0,0 +1,53 @@
+import timeit
+
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand
+from wagtail.wagtailcore.models import Site
+
+from gem.constants import FEMALE, MALE, UNSPECIFIED
+from gem.registration import bulk_create_users
+
+
+class Command(BaseCommand):
+    help = (
+        'Create users with their profiles in batches, for imports and load '
+        'tests. Every user gets the same password and security question '
+        'answers, hashed once.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('count', type=int)
+        parser.add_argument('--prefix', default='user')
+        parser.add_argument('--start', type=int, default=0)
+        parser.add_argument('--password', default='1234')
+        parser.add_argument('--answer', default='answer')
+        parser.add_argument('--site', type=int, dest='site_id')
+        parser.add_argument('--language', default='')
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        password = make_password(options['password'])
+        answer = make_password(
+            options['answer'].strip().lower(),
+            hasher=settings.SECURITY_ANSWER_HASHER)
+        site = options['site_id'] and Site.objects.get(pk=options['site_id'])
+        genders = (FEMALE, MALE, UNSPECIFIED)
+
+        users = (
+            {
+                'username': '%s%d' % (options['prefix'], i),
+                'password': password,
+                'alias': '%s%d' % (options['prefix'], i),
+                'gender': genders[i % len(genders)],
+                'security_question_1_answer': answer,
+                'security_question_2_answer': answer,
+                'site': site,
+                'language': options['language'],
+            }
+            for i in range(
+                options['start'], options['start'] + options['count']))
+
+        start = timeit.default_timer()
+        created = bulk_create_users(users, options['batch_size'])
+        self.stdout.write('Created %d users in %.1f seconds' % (
+            created, timeit.default_timer() - start))
@@ -1,3 +1,19 @@
+import logging
+import time
+
+from django.conf import settings
+from django.contrib.sessions.middleware import SessionMiddleware
+from django.http import HttpResponse
+from django.middleware.csrf import CsrfViewMiddleware
+
+from gem import pagecache
+from gem.fragments import render_fragments
+from gem.sites import find_site_for_request
+from wagtail.wagtailcore.models import Site
+from wagtail.wagtailcore.views import serve
+
+logger = logging.getLogger(__name__)
+
 
 class ForceDefaultLanguageMiddleware(object):
     """
@@ -21,3 +37,146 @@ class LogHeaderInformationMiddleware(object):
     def process_request(self, request):
         print '---------- Header Dump -------------'
         print request.META.items()
+
+
+class CachedSiteMiddleware(object):
+    """
+    Drop-in replacement for wagtail's SiteMiddleware that resolves
+    request.site from the cached list of sites instead of querying for it
+    on every request.
+    """
+    def process_request(self, request):
+        try:
+            request.site = find_site_for_request(request)
+        except Site.DoesNotExist:
+            request.site = None
+
+
+class DefaultFormsCounterMiddleware(object):
+    """
+    Log how many of the forms offered by the default_forms context
+    processor were never built while handling the request. With DEBUG on
+    the count is also sent in the X-Default-Forms-Avoided header.
+    """
+    def process_response(self, request, response):
+        counter = getattr(request, 'default_forms_counter', None)
+        if counter is None:
+            return response
+
+        logger.debug(
+            '%s: built %d of %d default forms', request.path,
+            counter.built, counter.offered)
+        if settings.DEBUG:
+            response['X-Default-Forms-Avoided'] = str(counter.avoided)
+        return response
+
+
+class SlidingSessionMiddleware(SessionMiddleware):
+    """
+    SessionMiddleware that keeps the session expiry sliding without saving
+    the session on every request.
+
+    A session that wasn't modified is only saved again once
+    SESSION_REFRESH_RATIO of its age has passed since it was last saved,
+    so sessions still expire SESSION_COOKIE_AGE after the last activity,
+    give or take that fraction.
+    """
+    refreshed_key = '_session_refreshed_at'
+
+    def needs_refresh(self, session):
+        refreshed_at = session.get(self.refreshed_key)
+        if not session.session_key:
+            # the session expired or never existed
+            return False
+        if refreshed_at is None:
+            return True
+        return time.time() - refreshed_at >= \
+            session.get_expiry_age() * settings.SESSION_REFRESH_RATIO
+
+    def process_response(self, request, response):
+        session = getattr(request, 'session', None)
+        if session is not None and not session.is_empty():
+            if session.modified or self.needs_refresh(session):
+                session[self.refreshed_key] = time.time()
+
+        return super(SlidingSessionMiddleware, self).process_response(
+            request, response)
+
+
+class PageCacheMiddleware(object):
+    """
+    Serve GET requests from gem.pagecache, and cache the pages rendered
+    for them.
+
+    Pages are cached for anonymous readers, and for logged in readers if
+    they are Wagtail pages, where only the fragments rendered by the
+    fragment tag are particular to the reader. Those are rendered for each
+    reader when the page is served.
+
+    Pages that used a CSRF token or showed messages are particular to the
+    reader and aren't cached, nor are Wagtail pages with view restrictions,
+    which are checked when the page is served rather than when it is read
+    from the cache. With DEBUG on, whether the page was served
+    from the cache is sent in the X-Page-Cache header.
+    """
+    def is_cacheable(self, request):
+        return (
+            request.method == 'GET' and
+            not request.path.startswith(settings.PAGE_CACHE_IGNORE_PATHS) and
+            # messages waiting to be shown
+            not len(getattr(request, '_messages', ())))
+
+    def process_request(self, request):
+        request.page_cacheable = request.page_fragments = \
+            self.is_cacheable(request)
+        if not request.page_cacheable:
+            return None
+
+        page = pagecache.get_page(request)
+        if page is None:
+            pagecache.count('miss')
+            return None
+
+        pagecache.count('hit')
+        request.page_cache_hit = True
+        # the CSRF token of a fragment is the one the reader already has
+        CsrfViewMiddleware().process_view(request, None, (), {})
+        response = HttpResponse(
+            render_fragments(request, page['content']),
+            content_type=page['content_type'])
+        if settings.DEBUG:
+            response['X-Page-Cache'] = 'hit'
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        request.page_cache_serve = view_func is serve
+
+    def is_response_cacheable(self, request, response):
+        messages = getattr(request, '_messages', None)
+        serve_page = getattr(request, 'page_cache_serve', False)
+        return (
+            (not request.user.is_authenticated() or serve_page) and
+            # set by the before_serve_page hook, which isn't reached when
+            # the restrictions turn the reader away
+            not (serve_page and
+                 getattr(request, 'page_view_restricted', True)) and
+            response.status_code == 200 and
+            not response.streaming and
+            response.get('Content-Type', '').startswith('text/html') and
+            not request.META.get('CSRF_COOKIE_USED') and
+            not getattr(messages, 'used', False) and
+            not set(('private', 'no-cache', 'no-store')).intersection(
+                response.get('Cache-Control', '').split(', ')))
+
+    def process_response(self, request, response):
+        if not getattr(request, 'page_cacheable', False) or \
+                getattr(request, 'page_cache_hit', False):
+            return response
+
+        if self.is_response_cacheable(request, response):
+            pagecache.set_page(request, response)
+        if not response.streaming:
+            response.content = render_fragments(request, response.content)
+        if settings.DEBUG:
+            response['X-Page-Cache'] = 'miss'
+        return response
@@ -0,0 +1,20 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.9.13 on 2026-10-18 14:02
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gem', '0012_partner_credit'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='gemuserprofile',
+            name='gender',
+            field=models.CharField(blank=True, choices=[(b'f', 'female'), (b'-', "don't want to answer"), (b'm', 'male')], db_index=True, max_length=1, null=True),
+        ),
+    ]
@@ -0,0 +1,42 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.9.13 on 2026-10-18 14:06
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('wagtailcore', '0032_add_bulk_delete_page_permission'),
+        ('gem', '0013_gemuserprofile_gender_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='GemUserRollup',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('language', models.CharField(blank=True, max_length=32)),
+                ('gender', models.CharField(blank=True, choices=[(b'f', 'female'), (b'-', "don't want to answer"), (b'm', 'male')], max_length=1)),
+                ('count', models.IntegerField(default=0)),
+                ('site', models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='wagtailcore.Site')),
+            ],
+        ),
+        migrations.AddField(
+            model_name='gemuserprofile',
+            name='language',
+            field=models.CharField(blank=True, default=b'', max_length=32),
+        ),
+        migrations.AddField(
+            model_name='gemuserprofile',
+            name='site',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='wagtailcore.Site'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='gemuserrollup',
+            unique_together=set([('date', 'site', 'language', 'gender')]),
+        ),
+    ]
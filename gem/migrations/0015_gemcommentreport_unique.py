@@ -0,0 +1,53 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.9.13 on 2026-10-18 14:15
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+from django.db.models import Count, Min
+import django.db.models.deletion
+
+
+def remove_duplicate_reports(apps, schema_editor):
+    GemCommentReport = apps.get_model('gem', 'GemCommentReport')
+    duplicates = GemCommentReport.objects.values(
+        'comment', 'user').annotate(
+        first=Min('pk'), reports=Count('pk')).filter(reports__gt=1)
+    for duplicate in duplicates:
+        GemCommentReport.objects.filter(
+            comment=duplicate['comment'], user=duplicate['user']).exclude(
+            pk=duplicate['first']).delete()
+
+
+def count_reports(apps, schema_editor):
+    GemCommentReport = apps.get_model('gem', 'GemCommentReport')
+    GemCommentReportCount = apps.get_model('gem', 'GemCommentReportCount')
+    GemCommentReportCount.objects.bulk_create(
+        GemCommentReportCount(comment_id=report['comment'],
+                              count=report['reports'])
+        for report in GemCommentReport.objects.values('comment').annotate(
+            reports=Count('pk')).order_by())
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('commenting', '0005_add_commenting_permissions_to_groups'),
+        ('gem', '0014_gemuserrollup'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            remove_duplicate_reports, migrations.RunPython.noop),
+        migrations.CreateModel(
+            name='GemCommentReportCount',
+            fields=[
+                ('comment', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='gem_report_count', serialize=False, to='commenting.MoloComment')),
+                ('count', models.IntegerField(default=0)),
+            ],
+        ),
+        migrations.AlterUniqueTogether(
+            name='gemcommentreport',
+            unique_together=set([('comment', 'user')]),
+        ),
+        migrations.RunPython(count_reports, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,24 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.9.13 on 2026-10-18 14:22
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gem', '0015_gemcommentreport_unique'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='gemcommentreportcount',
+            name='last_reported_at',
+            field=models.DateTimeField(null=True),
+        ),
+        migrations.AlterIndexTogether(
+            name='gemcommentreportcount',
+            index_together=set([('count', 'last_reported_at')]),
+        ),
+    ]
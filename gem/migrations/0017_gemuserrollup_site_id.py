@@ -0,0 +1,64 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.9.13 on 2026-10-18 16:40
+from __future__ import unicode_literals
+
+from collections import Counter
+
+from django.db import migrations, models
+from django.utils import timezone
+
+
+NO_SITE = 0
+
+
+def local_date(value):
+    if timezone.is_aware(value):
+        value = timezone.localtime(value)
+    return value.date()
+
+
+def rebuild_rollups(apps, schema_editor):
+    # the site was dropped with the old column, so the rollups are counted
+    # again from the profiles
+    GemUserProfile = apps.get_model('gem', 'GemUserProfile')
+    GemUserRollup = apps.get_model('gem', 'GemUserRollup')
+    counts = Counter(
+        (local_date(date_joined), site_id or NO_SITE, language or '',
+         gender or '')
+        for site_id, language, gender, date_joined
+        in GemUserProfile.objects.values_list(
+            'site_id', 'language', 'gender', 'user__date_joined').iterator())
+    GemUserRollup.objects.all().delete()
+    GemUserRollup.objects.bulk_create(
+        (GemUserRollup(date=date, site_id=site_id, language=language,
+                       gender=gender, count=count)
+         for (date, site_id, language, gender), count in counts.items()),
+        batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gem', '0016_gemcommentreportcount_queue'),
+    ]
+
+    operations = [
+        migrations.AlterUniqueTogether(
+            name='gemuserrollup',
+            unique_together=set([]),
+        ),
+        migrations.RemoveField(
+            model_name='gemuserrollup',
+            name='site',
+        ),
+        migrations.AddField(
+            model_name='gemuserrollup',
+            name='site_id',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.RunPython(rebuild_rollups, migrations.RunPython.noop),
+        migrations.AlterUniqueTogether(
+            name='gemuserrollup',
+            unique_together=set([('date', 'site_id', 'language', 'gender')]),
+        ),
+    ]
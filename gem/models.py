@@ -1,13 +1,36 @@
+from collections import Counter
+
+from django.conf import settings
 from django.contrib.auth.hashers import make_password, check_password
 from django.contrib.auth.models import User
-from django.db import models
-from django.db.models.signals import post_save
+from django.core.cache import cache
+from django.core.urlresolvers import reverse
+from django.db import DEFAULT_DB_ALIAS, models, transaction, IntegrityError
+from django.db.models import F
+from django.db.models.signals import (
+    pre_save, post_save, pre_delete, post_delete)
 from django.dispatch import receiver
+from django.utils import timezone
+from django_comments.models import CommentFlag
+from gem.caching import get_cache_version, bump_cache_version
 from gem.constants import GENDERS
+from gem.homepage import clear_homepage
+from gem.listings import clear_listings
+from gem.moderation import clear_matchers
+from gem.navigation import clear_navigation
+from gem.pagecache import clear_pages, clear_paths
+from gem.sites import clear_sites, get_site_for_page, is_site_root
+from gem.utils import local_date
 from molo.commenting.models import MoloComment
+from molo.core.models import (
+    LanguageRelation, PageTranslation, SectionPage, SiteLanguage,
+    SiteSettings)
+from molo.profiles.models import UserProfile
 from wagtail.contrib.settings.models import BaseSetting
 from wagtail.contrib.settings.registry import register_setting
 from wagtail.wagtailadmin.edit_handlers import FieldPanel, MultiFieldPanel
+from wagtail.wagtailcore.models import Page, PageViewRestriction, Site
+from wagtail.wagtailcore.signals import page_published, page_unpublished
 
 
 class GemUserProfile(models.Model):
@@ -15,21 +38,27 @@ class GemUserProfile(models.Model):
         User, related_name="gem_profile", primary_key=True)
 
     gender = models.CharField(
-        max_length=1, choices=GENDERS, blank=True, null=True)
+        max_length=1, choices=GENDERS, blank=True, null=True, db_index=True)
 
     security_question_1_answer = models.CharField(max_length=128, null=True)
     security_question_2_answer = models.CharField(max_length=128, null=True)
 
+    # where the user registered, for GemUserRollup
+    site = models.ForeignKey(
+        Site, null=True, blank=True, on_delete=models.SET_NULL,
+        related_name='+')
+    language = models.CharField(max_length=32, blank=True, default='')
+
     # based on django.contrib.auth.models.AbstractBaseUser set_password &
-    # check_password functions
+    # check_password functions, using the SECURITY_ANSWER_HASHER
     def set_security_question_1_answer(self, raw_answer):
         self.security_question_1_answer = make_password(
-            raw_answer.strip().lower()
+            raw_answer.strip().lower(), hasher=settings.SECURITY_ANSWER_HASHER
         )
 
     def set_security_question_2_answer(self, raw_answer):
         self.security_question_2_answer = make_password(
-            raw_answer.strip().lower()
+            raw_answer.strip().lower(), hasher=settings.SECURITY_ANSWER_HASHER
         )
 
     def check_security_question_1_answer(self, raw_answer):
@@ -38,7 +67,8 @@ class GemUserProfile(models.Model):
             self.save(update_fields=["security_question_1_answer"])
 
         return check_password(
-            raw_answer.strip().lower(), self.security_question_1_answer, setter
+            raw_answer.strip().lower(), self.security_question_1_answer,
+            setter, preferred=settings.SECURITY_ANSWER_HASHER
         )
 
     def check_security_question_2_answer(self, raw_answer):
@@ -47,15 +77,351 @@ class GemUserProfile(models.Model):
             self.save(update_fields=["security_question_2_answer"])
 
         return check_password(
-            raw_answer.strip().lower(), self.security_question_2_answer, setter
+            raw_answer.strip().lower(), self.security_question_2_answer,
+            setter, preferred=settings.SECURITY_ANSWER_HASHER
         )
 
+    def get_rollup_fields(self):
+        return (self.site_id or GemUserRollup.NO_SITE, self.language or '',
+                self.gender or '')
+
+    def get_rollup_date(self):
+        return local_date(self.user.date_joined)
+
 
 @receiver(post_save, sender=User)
 def gem_user_profile_handler(sender, instance, created, **kwargs):
     if created:
-        profile = GemUserProfile(user=instance)
-        profile.save()
+        # create_user passes the profile to create along with the user
+        profile = getattr(instance, '_gem_profile', None) or GemUserProfile()
+        profile.user = instance
+        profile.save(force_insert=True)
+
+
+@receiver(pre_save, sender=UserProfile)
+def user_profile_fields_handler(sender, instance, **kwargs):
+    # create_user passes the fields for the UserProfile molo creates
+    if instance._state.adding:
+        fields = getattr(instance.user, '_profile_fields', {})
+        for name, value in fields.items():
+            setattr(instance, name, value)
+
+
+@receiver(pre_save, sender=GemUserProfile)
+def gem_user_profile_rollup_fields_handler(sender, instance, raw,
+                                           update_fields, **kwargs):
+    # The fields are read from the stored profile rather than when the
+    # instance is loaded, so loading profiles with the fields deferred
+    # doesn't fetch them.
+    instance._rollup_fields = None
+    if raw or instance._state.adding:
+        return
+    if update_fields is not None and not set(update_fields) & set(
+            ['site', 'site_id', 'language', 'gender']):
+        return
+    stored = GemUserProfile.objects.filter(pk=instance.pk).values_list(
+        'site_id', 'language', 'gender').first()
+    if stored is not None:
+        site_id, language, gender = stored
+        instance._rollup_fields = (
+            site_id or GemUserRollup.NO_SITE, language or '', gender or '')
+
+
+@receiver(post_save, sender=GemUserProfile)
+def gem_user_profile_rollup_handler(sender, instance, created, raw,
+                                    **kwargs):
+    if raw:
+        return
+    if created:
+        GemUserRollup.add(
+            instance.get_rollup_date(), instance.get_rollup_fields(), 1)
+        return
+    old_fields = instance._rollup_fields
+    if old_fields is None:
+        return
+    fields = instance.get_rollup_fields()
+    if fields != old_fields:
+        date = instance.get_rollup_date()
+        GemUserRollup.add(date, old_fields, -1)
+        GemUserRollup.add(date, fields, 1)
+
+
+@receiver(pre_delete, sender=GemUserProfile)
+def gem_user_profile_pre_delete_handler(sender, instance, **kwargs):
+    instance._rollup_fields = instance.get_rollup_fields()
+
+
+@receiver(post_delete, sender=GemUserProfile)
+def gem_user_profile_delete_handler(sender, instance, **kwargs):
+    try:
+        date = instance.get_rollup_date()
+    except User.DoesNotExist:
+        return
+    GemUserRollup.add(date, instance._rollup_fields, -1)
+
+
+class GemUserRollup(models.Model):
+    """
+    The number of users that joined on a day, by the site and language they
+    registered with and their gender. Kept up to date as profiles are saved
+    and deleted, and rebuilt every night by reconcile_user_rollups.
+
+    The site is kept as its id rather than a foreign key, with NO_SITE for
+    profiles without a site, so that those rows are unique too.
+    """
+    NO_SITE = 0
+
+    date = models.DateField()
+    site_id = models.IntegerField(default=NO_SITE)
+    language = models.CharField(max_length=32, blank=True)
+    gender = models.CharField(max_length=1, choices=GENDERS, blank=True)
+    count = models.IntegerField(default=0)
+
+    class Meta:
+        unique_together = ('date', 'site_id', 'language', 'gender')
+
+    @classmethod
+    def add(cls, date, fields, count):
+        site_id, language, gender = fields
+        rollup = cls.objects.filter(
+            date=date, site_id=site_id, language=language, gender=gender)
+        if rollup.update(count=F('count') + count):
+            return
+        try:
+            with transaction.atomic():
+                cls.objects.create(
+                    date=date, site_id=site_id, language=language,
+                    gender=gender, count=count)
+        except IntegrityError:
+            # created by another process in the meantime
+            rollup.update(count=F('count') + count)
+
+    @classmethod
+    def count_users(cls, chunk_size=10000):
+        counts = Counter()
+        profiles = GemUserProfile.objects.order_by('pk').values_list(
+            'pk', 'site_id', 'language', 'gender', 'user__date_joined')
+        last_pk = None
+        while True:
+            chunk = profiles if last_pk is None else profiles.filter(
+                pk__gt=last_pk)
+            chunk = list(chunk[:chunk_size])
+            if not chunk:
+                return counts
+            for pk, site_id, language, gender, date_joined in chunk:
+                counts[(local_date(date_joined),
+                        (site_id or cls.NO_SITE, language or '',
+                         gender or ''))] += 1
+            last_pk = chunk[-1][0]
+
+    @classmethod
+    @transaction.atomic
+    def rebuild(cls):
+        # Lock the rollups while the profiles are counted, so profiles
+        # saved meanwhile are added once the rebuild commits, instead of
+        # being lost with a deleted row or counted twice
+        rollups = dict(
+            ((date, (site_id, language, gender)), (pk, count))
+            for pk, date, site_id, language, gender, count
+            in cls.objects.select_for_update().values_list(
+                'pk', 'date', 'site_id', 'language', 'gender', 'count'))
+        counts = cls.count_users()
+
+        stale = []
+        for key, (pk, count) in rollups.items():
+            expected = counts.pop(key, 0)
+            if not expected:
+                stale.append(pk)
+            elif count != expected:
+                cls.objects.filter(pk=pk).update(count=expected)
+        cls.objects.filter(pk__in=stale).delete()
+        for (date, fields), count in counts.items():
+            cls.add(date, fields, count)
+
+
+# (settings model label, site id) -> (version, field values)
+_site_settings = {}
+
+
+def get_settings_version_name(model, site_id):
+    return 'settings:%s:%s' % (model._meta.label_lower, site_id)
+
+
+def get_settings_for_site(cls, site):
+    """
+    Get a settings model's instance for a site, cached in the process and
+    in the shared cache until the settings are saved. The field values are
+    cached rather than the instance, so each call returns a new instance
+    and changes to it, saved or not, don't leak to other callers.
+    """
+    site_id = getattr(site, 'pk', site)
+    name = get_settings_version_name(cls, site_id)
+    version = get_cache_version(name)
+    fields = cls._meta.concrete_fields
+    field_names = [field.attname for field in fields]
+
+    cached = _site_settings.get((cls._meta.label_lower, site_id))
+    if cached is not None and cached[0] == version:
+        return cls.from_db(DEFAULT_DB_ALIAS, field_names, cached[1])
+
+    values = cache.get('gem:%s:%s' % (name, version))
+    if values is None:
+        instance, created = cls.objects.get_or_create(site_id=site_id)
+        if created:
+            # saving the new settings bumped the version
+            version = get_cache_version(name)
+        # prepared for the database, like the JSON of stream fields, so
+        # that they can be pickled
+        values = [
+            field.get_prep_value(field.value_from_object(instance))
+            for field in fields]
+        cache.set('gem:%s:%s' % (name, version), values, None)
+
+    _site_settings[(cls._meta.label_lower, site_id)] = (version, values)
+    return cls.from_db(DEFAULT_DB_ALIAS, field_names, values)
+
+
+# SiteSettings are read by molo's GA middleware and tags and by the
+# settings context processor, each looking them up again
+SiteSettings.for_site = classmethod(get_settings_for_site)
+
+
+@receiver(post_save, sender=Site)
+@receiver(post_delete, sender=Site)
+def site_handler(sender, instance, **kwargs):
+    clear_sites()
+
+
+@receiver(page_published)
+def site_root_page_handler(sender, instance, **kwargs):
+    # the sites keep their root page, whose slug changes when it's published
+    if is_site_root(instance):
+        clear_sites()
+
+
+@receiver(page_published)
+@receiver(page_unpublished)
+def page_feed_handler(sender, instance, **kwargs):
+    site = get_site_for_page(instance)
+    if site is not None:
+        bump_cache_version('feeds:%s' % site.pk)
+
+
+# Saving a draft of a live page only saves these, the live page is the same
+DRAFT_FIELDS = frozenset(['latest_revision_created_at',
+                          'has_unpublished_changes'])
+
+
+def is_live_page_change(instance, **kwargs):
+    """
+    Return whether a page's signal changes what its site shows: a live page
+    saved when it is published or moved, a live page deleted, or a page
+    unpublished. Saving a draft doesn't.
+    """
+    if not isinstance(instance, Page):
+        return False
+    if kwargs.get('signal') is page_unpublished:
+        return True
+    update_fields = kwargs.get('update_fields')
+    if update_fields and DRAFT_FIELDS.issuperset(update_fields):
+        return False
+    return instance.live
+
+
+@receiver(post_save)
+@receiver(post_delete)
+@receiver(page_unpublished)
+def page_cache_handler(sender, instance, **kwargs):
+    if is_live_page_change(instance, **kwargs):
+        site = get_site_for_page(instance)
+        if site is not None:
+            clear_pages(site.pk)
+            clear_homepage(site.pk)
+            clear_listings(site.pk)
+
+
+def clear_pages_for_page(page):
+    site = get_site_for_page(page) if isinstance(page, Page) else None
+    if site is not None:
+        clear_pages(site.pk)
+
+
+def clear_comment_pages(page):
+    """
+    Drop the cached pages showing a page's comments, the page itself and
+    its "view more comments" page, leaving the rest of the site cached.
+    """
+    site = get_site_for_page(page) if isinstance(page, Page) else None
+    if site is None:
+        return
+    paths = [reverse('molo.commenting:more-comments', args=[page.pk])]
+    root_path = site.root_page.url_path
+    if page.url_path.startswith(root_path):
+        paths.append('/' + page.url_path[len(root_path):])
+    clear_paths(site.pk, paths)
+
+
+@receiver(post_save, sender=PageViewRestriction)
+@receiver(post_delete, sender=PageViewRestriction)
+def page_view_restriction_handler(sender, instance, **kwargs):
+    # Restricted pages aren't cached, so the pages of the site are dropped
+    # when a page (and the pages under it) becomes restricted.
+    clear_pages_for_page(Page.objects.filter(pk=instance.page_id).first())
+
+
+@receiver(post_save, sender=MoloComment)
+@receiver(post_delete, sender=MoloComment)
+def comment_page_cache_handler(sender, instance, **kwargs):
+    # comments are shown on the page they were made on
+    clear_comment_pages(instance.content_object)
+
+
+@receiver(post_save)
+@receiver(post_delete)
+@receiver(page_unpublished)
+def section_navigation_handler(sender, instance, **kwargs):
+    if is_live_page_change(instance, **kwargs):
+        clear_navigation_for_page(instance)
+
+
+def clear_navigation_for_page(page):
+    if page is None or \
+            not issubclass(page.specific_class or Page, SectionPage):
+        return
+    site = get_site_for_page(page)
+    if site is not None:
+        clear_navigation(site.pk)
+
+
+@receiver(post_save, sender=PageTranslation)
+@receiver(post_delete, sender=PageTranslation)
+@receiver(post_save, sender=LanguageRelation)
+@receiver(post_delete, sender=LanguageRelation)
+def section_translation_handler(sender, instance, **kwargs):
+    # the page may be being deleted along with its translations
+    clear_navigation_for_page(
+        Page.objects.filter(pk=instance.page_id).first())
+
+
+@receiver(post_save, sender=SiteSettings)
+@receiver(post_delete, sender=SiteSettings)
+def site_settings_handler(sender, instance, **kwargs):
+    bump_cache_version(get_settings_version_name(sender, instance.site_id))
+    clear_pages(instance.site_id)
+    clear_navigation(instance.site_id)
+    clear_homepage(instance.site_id)
+    clear_listings(instance.site_id)
+
+
+@receiver(post_save, sender=SiteLanguage)
+@receiver(post_delete, sender=SiteLanguage)
+def site_language_handler(sender, instance, **kwargs):
+    # languages are shared by the sites
+    for site_id in Site.objects.values_list('pk', flat=True):
+        clear_pages(site_id)
+        clear_navigation(site_id)
+        clear_homepage(site_id)
+        clear_listings(site_id)
 
 
 @register_setting
@@ -103,6 +469,16 @@ class GemSettings(BaseSetting):
         FieldPanel('banned_names_with_offensive_language'),
     ]
 
+    for_site = classmethod(get_settings_for_site)
+
+
+@receiver(post_save, sender=GemSettings)
+@receiver(post_delete, sender=GemSettings)
+def gem_settings_handler(sender, instance, **kwargs):
+    bump_cache_version(get_settings_version_name(sender, instance.site_id))
+    clear_matchers(instance.site_id)
+    clear_pages(instance.site_id)
+
 
 class GemCommentReport(models.Model):
     user = models.ForeignKey(User)
@@ -111,3 +487,88 @@ class GemCommentReport(models.Model):
 
     reported_reason = models.CharField(
         max_length=128, blank=False)
+
+    class Meta:
+        unique_together = ('comment', 'user')
+
+    @classmethod
+    def report(cls, comment, user, reported_reason):
+        """
+        Record a user's report of a comment, returning (report, created).
+        Reporting a comment again, or twice at once, keeps the first report.
+        """
+        try:
+            with transaction.atomic():
+                return cls.objects.create(
+                    comment=comment, user=user,
+                    reported_reason=reported_reason), True
+        except IntegrityError:
+            return cls.objects.get(comment=comment, user=user), False
+
+
+class GemCommentReportCount(models.Model):
+    """
+    The number of times a comment has been reported, kept as reports are
+    created and deleted so moderation screens don't count them. The
+    moderation queue lists comments from here, most reported first.
+    """
+    comment = models.OneToOneField(
+        MoloComment, primary_key=True, related_name='gem_report_count')
+    count = models.IntegerField(default=0)
+    last_reported_at = models.DateTimeField(null=True)
+
+    class Meta:
+        index_together = ('count', 'last_reported_at')
+
+    @classmethod
+    def add(cls, comment_id, count, last_reported_at=None):
+        fields = {'count': F('count') + count}
+        if last_reported_at is not None:
+            fields['last_reported_at'] = last_reported_at
+        report_count = cls.objects.filter(comment_id=comment_id)
+        if report_count.update(**fields):
+            return
+        try:
+            with transaction.atomic():
+                cls.objects.create(
+                    comment_id=comment_id, count=count,
+                    last_reported_at=last_reported_at)
+        except IntegrityError:
+            # created by another process in the meantime
+            report_count.update(**fields)
+
+
+def hide_reported_comment(comment_id, reported_reason):
+    """
+    Hide a comment once it has been reported for a reason as many times as
+    the threshold in COMMENT_REPORT_THRESHOLDS for that reason, unless a
+    moderator approved it. Returns whether the comment was hidden.
+    """
+    threshold = settings.COMMENT_REPORT_THRESHOLDS.get(
+        reported_reason, settings.COMMENTS_FLAG_THRESHHOLD)
+    reports = GemCommentReport.objects.filter(
+        comment_id=comment_id, reported_reason=reported_reason)
+    if reports.count() < threshold:
+        return False
+    hidden = MoloComment.objects.filter(
+        pk=comment_id, is_removed=False).exclude(
+        flags__flag=CommentFlag.MODERATOR_APPROVAL).update(is_removed=True)
+    if hidden:
+        clear_comment_pages(
+            MoloComment.objects.get(pk=comment_id).content_object)
+    return bool(hidden)
+
+
+@receiver(post_save, sender=GemCommentReport)
+def gem_comment_report_handler(sender, instance, created, raw, **kwargs):
+    if created and not raw:
+        GemCommentReportCount.add(
+            instance.comment_id, 1, last_reported_at=timezone.now())
+        hide_reported_comment(instance.comment_id, instance.reported_reason)
+
+
+@receiver(post_delete, sender=GemCommentReport)
+def gem_comment_report_delete_handler(sender, instance, **kwargs):
+    # only update, the count is deleted along with a deleted comment
+    GemCommentReportCount.objects.filter(
+        comment_id=instance.comment_id).update(count=F('count') - 1)
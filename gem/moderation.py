@@ -0,0 +1,227 @@
+"""
+Compiled matchers for the banned keyword and pattern lists kept in
+GemSettings.
+
+Each line of a banned list is either a plain keyword, matched as a
+substring, or a regular expression. Keywords are compiled into an
+Aho-Corasick automaton and the patterns into a combined expression, so
+checking a comment or display name is one pass over the text no matter
+how long the list grows. Compiled matchers are cached per process and
+dropped when GemSettings is saved.
+"""
+import re
+from collections import deque
+
+from gem.settings import REGEX_EMAIL, REGEX_PHONE
+
+
+REGEX_METACHARACTERS = frozenset('.^$*+?{}[]\\|()')
+
+# Backreferences are numbered per pattern, so patterns using them can't be
+# merged into a combined expression without changing their meaning.
+REGEX_BACKREFERENCE = re.compile(r'\\[1-9]|\(\?P=')
+
+DEFAULT_BANNED_PATTERNS = (REGEX_EMAIL, REGEX_PHONE)
+
+# Patterns checked along with each banned list field. Display names are
+# checked for email addresses and phone numbers separately, with their own
+# validation message.
+FIELD_EXTRA_PATTERNS = {
+    'banned_keywords_and_patterns': DEFAULT_BANNED_PATTERNS,
+    'banned_names_with_offensive_language': (),
+}
+
+_matchers = {}
+
+
+def is_literal(keyword):
+    return not REGEX_METACHARACTERS.intersection(keyword)
+
+
+def split_banned_list(text):
+    """
+    Split the contents of a banned list field into plain keywords and
+    regular expressions. Blank lines are ignored and lines that don't
+    compile as a regular expression are treated as plain keywords.
+    """
+    literals = []
+    patterns = []
+
+    for line in (text or '').split('\n'):
+        keyword = line.replace('\r', '')
+        if not keyword:
+            continue
+
+        if is_literal(keyword):
+            literals.append(keyword)
+            continue
+
+        try:
+            re.compile(keyword)
+        except re.error:
+            literals.append(keyword)
+        else:
+            patterns.append(keyword)
+
+    return literals, patterns
+
+
+def compile_patterns(patterns):
+    """
+    Compile a list of regular expressions into as few compiled expressions
+    as possible. Returns a list of compiled expressions.
+    """
+    combinable = []
+    compiled = []
+
+    for pattern in patterns:
+        if REGEX_BACKREFERENCE.search(pattern):
+            compiled.append(re.compile(pattern))
+        else:
+            combinable.append(pattern)
+
+    if combinable:
+        try:
+            compiled.append(re.compile(
+                '|'.join('(?:%s)' % pattern for pattern in combinable)))
+        except (re.error, AssertionError, OverflowError):
+            # Too many groups or too large for a single expression
+            compiled.extend(re.compile(pattern) for pattern in combinable)
+
+    return compiled
+
+
+class KeywordAutomaton(object):
+    """
+    Aho-Corasick automaton for finding any of a set of keywords in a text
+    in a single pass, in time linear in the length of the text.
+    """
+
+    def __init__(self, keywords):
+        # Node 0 is the root. For every node we keep its transitions, the
+        # node to fall back to when no transition matches, and whether a
+        # keyword ends at that node or at any of its fallbacks.
+        self.transitions = [{}]
+        self.fallbacks = [0]
+        self.terminal = [False]
+
+        for keyword in keywords:
+            self._add(keyword)
+        self._link()
+
+    def _add(self, keyword):
+        if not keyword:
+            return
+
+        node = 0
+        for char in keyword:
+            child = self.transitions[node].get(char)
+            if child is None:
+                child = len(self.transitions)
+                self.transitions[node][char] = child
+                self.transitions.append({})
+                self.fallbacks.append(0)
+                self.terminal.append(False)
+            node = child
+        self.terminal[node] = True
+
+    def _link(self):
+        transitions = self.transitions
+        fallbacks = self.fallbacks
+        terminal = self.terminal
+
+        queue = deque(transitions[0].values())
+        while queue:
+            node = queue.popleft()
+            for char, child in transitions[node].items():
+                queue.append(child)
+
+                fallback = fallbacks[node]
+                while fallback and char not in transitions[fallback]:
+                    fallback = fallbacks[fallback]
+                fallback = transitions[fallback].get(char, 0)
+                if fallback == child:
+                    fallback = 0
+
+                fallbacks[child] = fallback
+                terminal[child] = terminal[child] or terminal[fallback]
+
+    def search(self, text):
+        transitions = self.transitions
+        fallbacks = self.fallbacks
+        terminal = self.terminal
+
+        node = 0
+        for char in text:
+            while node and char not in transitions[node]:
+                node = fallbacks[node]
+            node = transitions[node].get(char, 0)
+            if terminal[node]:
+                return True
+
+        return False
+
+
+class BannedMatcher(object):
+
+    def __init__(self, literals=(), patterns=()):
+        self.literals = list(literals)
+        self.patterns = list(patterns)
+
+        self.automaton = KeywordAutomaton(self.literals) \
+            if self.literals else None
+        self.pattern_regexes = compile_patterns(self.patterns)
+
+    @classmethod
+    def from_text(cls, text, extra_patterns=DEFAULT_BANNED_PATTERNS):
+        literals, patterns = split_banned_list(text)
+        return cls(literals, list(extra_patterns) + patterns)
+
+    def search(self, text):
+        """
+        Return True if the lowercased text contains a banned keyword or
+        matches a banned pattern.
+        """
+        text = text.lower()
+
+        if self.automaton is not None and self.automaton.search(text):
+            return True
+
+        for regex in self.pattern_regexes:
+            if regex.search(text):
+                return True
+
+        return False
+
+
+def get_matcher(gem_settings, field_name):
+    """
+    Return the compiled BannedMatcher for a banned list field of a
+    GemSettings instance, compiling it on first use.
+    """
+    text = getattr(gem_settings, field_name) or ''
+    key = (gem_settings.site_id, field_name)
+
+    cached = _matchers.get(key)
+    if cached is not None and cached[0] is not text:
+        if cached[0] == text:
+            # the same list loaded again, compare by identity from now on
+            cached = _matchers[key] = (text, cached[1])
+        else:
+            cached = None
+
+    if cached is None:
+        cached = _matchers[key] = (text, BannedMatcher.from_text(
+            text, FIELD_EXTRA_PATTERNS.get(field_name, ())))
+
+    return cached[1]
+
+
+def clear_matchers(site_id=None):
+    if site_id is None:
+        _matchers.clear()
+        return
+
+    for key in list(_matchers):
+        if key[0] == site_id:
+            del _matchers[key]
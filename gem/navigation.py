@@ -0,0 +1,46 @@
+"""
+Cached section navigation.
+
+The section lists in the header and footer are rendered once per site,
+locale and template and kept in the shared cache until a section of the
+site is published, unpublished, moved, deleted or translated, or the
+site's settings or languages change. Each rendering starts with a comment
+naming the site's navigation version and when it was rendered, to check
+that a page shows the current navigation.
+"""
+from django.conf import settings
+from django.core.cache import cache
+from django.template.loader import render_to_string
+from django.utils import timezone
+
+from gem.caching import get_cache_version, bump_cache_version
+from molo.core.templatetags.core_tags import load_sections
+
+
+STAMP = '<!-- navigation %s, rendered %s -->\n'
+
+
+def get_version(site_id):
+    return get_cache_version('navigation:%s' % site_id)
+
+
+def clear_navigation(site_id):
+    bump_cache_version('navigation:%s' % site_id)
+
+
+def render_navigation(context, template_name):
+    request = context['request']
+    site_id = getattr(request.site, 'pk', None)
+    version = get_version(site_id)
+    key = 'gem:navigation:%s:%s:%s:%s' % (
+        site_id, version, context.get('locale_code'), template_name)
+
+    content = cache.get(key)
+    if content is None:
+        content = STAMP % (version, timezone.now().isoformat())
+        content += render_to_string(template_name, {
+            'request': request,
+            'sections': load_sections(context),
+        })
+        cache.set(key, content, settings.NAVIGATION_CACHE_TIMEOUT)
+    return content
@@ -0,0 +1,91 @@
+"""
+Full-page cache.
+
+Pages are cached per site, host, language and full path, which covers the
+`/?=layout2` variant, and apart for anonymous and logged in readers. They
+are dropped together when a page of the site is published, unpublished,
+moved or deleted, or the site's settings change, by bumping the site's
+version. The pages cached for a path, whatever their query string, are
+dropped on their own by bumping the path's version, for changes that
+only show on that path such as comments. Hits and misses are counted in
+the shared cache.
+
+The noscript Google Tag Manager iframe carries the reader's GA session id,
+and the Free Basics proxy's user IP for readers coming through it. These
+are left to a fragment (see gem.fragments), rendered for each reader the
+page is served to.
+"""
+import hashlib
+from uuid import uuid4
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.encoding import force_bytes
+
+from gem.caching import VERSION_KEY, get_cache_version, bump_cache_version
+
+
+STATS_KEY = 'gem:page-cache:%s'
+PATH_VERSION_KEY = 'gem:page-version:%s:%s'
+
+
+def get_path_version_key(site_id, path):
+    return PATH_VERSION_KEY % (
+        site_id, hashlib.md5(force_bytes(path)).hexdigest())
+
+
+def get_cache_key(request):
+    site_id = getattr(request.site, 'pk', None)
+    site_name = 'pages:%s' % site_id
+    path_key = get_path_version_key(site_id, request.path)
+    # both versions in one read, a path that was never cleared has none
+    versions = cache.get_many([VERSION_KEY % site_name, path_key])
+    site_version = versions.get(VERSION_KEY % site_name) or \
+        get_cache_version(site_name)
+    return 'gem:page:%s:%s:%s:%s' % (
+        site_id, site_version, versions.get(path_key, ''),
+        hashlib.md5(':'.join((
+            request.get_host(), request.LANGUAGE_CODE,
+            str(request.user.is_authenticated()),
+            request.get_full_path()))).hexdigest())
+
+
+def clear_pages(site_id):
+    bump_cache_version('pages:%s' % site_id)
+
+
+def clear_paths(site_id, paths):
+    # the pages cached for the old version expire within the timeout, so
+    # the new version doesn't need to outlive it
+    cache.set_many(dict(
+        (get_path_version_key(site_id, path), uuid4().hex)
+        for path in paths), settings.PAGE_CACHE_TIMEOUT)
+
+
+def get_page(request):
+    return cache.get(get_cache_key(request))
+
+
+def set_page(request, response):
+    cache.set(get_cache_key(request), {
+        'content': response.content,
+        'content_type': response['Content-Type'],
+    }, settings.PAGE_CACHE_TIMEOUT)
+
+
+def count(name):
+    key = STATS_KEY % name
+    try:
+        cache.incr(key)
+    except ValueError:
+        # the first hit or miss, or the count was evicted
+        if not cache.add(key, 1, None):
+            cache.incr(key)
+
+
+def get_stats():
+    stats = cache.get_many([STATS_KEY % 'hit', STATS_KEY % 'miss'])
+    return {
+        'hits': stats.get(STATS_KEY % 'hit', 0),
+        'misses': stats.get(STATS_KEY % 'miss', 0),
+    }
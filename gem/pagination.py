@@ -0,0 +1,67 @@
+"""
+Pagination that avoids counting every row of very large tables.
+
+On PostgreSQL the number of rows in an unfiltered table is taken from the
+planner's statistics once it is above ESTIMATED_COUNT_THRESHOLD. Filtered
+querysets, smaller tables and other databases are counted exactly.
+"""
+from django.conf import settings
+from django.core.paginator import Paginator
+from django.db import connections
+from django.db.models.query import QuerySet
+
+
+def estimate_count(queryset):
+    connection = connections[queryset.db]
+    if connection.vendor != 'postgresql' or queryset.query.where:
+        return None
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'SELECT reltuples FROM pg_class WHERE relname = %s',
+            [queryset.model._meta.db_table])
+        row = cursor.fetchone()
+    return int(row[0]) if row else None
+
+
+def estimated_count(queryset):
+    estimate = estimate_count(queryset)
+    if estimate is not None and \
+            estimate > settings.ESTIMATED_COUNT_THRESHOLD:
+        return estimate
+    return queryset.count()
+
+
+class EstimatedCountPaginator(Paginator):
+
+    def _get_count(self):
+        if self._count is None:
+            self._count = estimated_count(self.object_list)
+        return self._count
+    count = property(_get_count)
+
+
+class EstimatedCountQuerySet(QuerySet):
+    """
+    A queryset counted like estimated_count, for views that count their
+    querysets themselves. The count is kept, so counting it twice costs
+    one query.
+    """
+    _count = None
+
+    def count(self):
+        if self._result_cache is not None:
+            return len(self._result_cache)
+        if self._count is None:
+            estimate = estimate_count(self)
+            if estimate is not None and \
+                    estimate > settings.ESTIMATED_COUNT_THRESHOLD:
+                self._count = estimate
+            else:
+                self._count = super(EstimatedCountQuerySet, self).count()
+        return self._count
+
+
+def with_estimated_count(queryset):
+    clone = queryset._clone()
+    clone.__class__ = EstimatedCountQuerySet
+    return clone
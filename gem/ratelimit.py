@@ -0,0 +1,115 @@
+"""
+Attempt limits shared by every process through the cache.
+
+The attempts are counted per key (a username, a client IP) in buckets a
+tenth of the window long, and a check adds up the buckets overlapping the
+window ending now. So a burst across the edge of two windows is still
+limited, attempts are forgotten a window to a window and a tenth after
+they were made, a check costs one cache read whatever the number of
+attempts and concurrent attempts are counted with atomic cache operations.
+"""
+import hashlib
+import math
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.encoding import force_bytes
+
+from gem.utils import in_networks, parse_address
+
+
+def get_proxy_address(request):
+    """
+    Return the address our proxy appended to X-Forwarded-For, the values
+    before it are sent by the client.
+    """
+    forwarded_for = request.META.get('HTTP_X_FORWARDED_FOR', '')
+    if forwarded_for.strip():
+        return forwarded_for.split(',')[-1].strip()
+    return request.META.get('REMOTE_ADDR', '')
+
+
+def get_free_basics_ip(request):
+    """
+    Return the client's IP address sent by Free Basics in
+    CUSTOM_UIP_HEADER, or None. It is only trusted from the Free Basics
+    proxies in FREE_BASICS_PROXY_NETWORKS, and only if it is an address.
+    """
+    header = getattr(settings, 'CUSTOM_UIP_HEADER', None)
+    address = request.META.get(header, '').strip() if header else ''
+    if address and parse_address(address) is not None and in_networks(
+            get_proxy_address(request), settings.FREE_BASICS_PROXY_NETWORKS):
+        return address
+    return None
+
+
+def get_client_ip(request):
+    """
+    Return the IP address of the client, the one Free Basics sends for
+    requests from its proxies or else the one our proxy sends.
+    """
+    return get_free_basics_ip(request) or get_proxy_address(request)
+
+
+class AttemptLimiter(object):
+    """
+    Limit attempts to ``limit`` per key in any ``window`` seconds. The
+    window defaults to SESSION_COOKIE_AGE.
+    """
+    buckets = 10
+    clock = staticmethod(time.time)
+
+    def __init__(self, name, limit, window=None):
+        self.name = name
+        self.limit = limit
+        self._window = window
+
+    @property
+    def window(self):
+        return self._window or settings.SESSION_COOKIE_AGE
+
+    def get_cache_key(self, key, bucket):
+        digest = hashlib.md5(force_bytes(key)).hexdigest()
+        return 'gem:attempts:%s:%s:%d' % (self.name, digest, bucket)
+
+    def get_buckets(self):
+        """
+        Return the buckets overlapping the window ending now, the current
+        one last.
+        """
+        current = int(self.clock() * self.buckets // self.window)
+        return range(current - self.buckets, current + 1)
+
+    def is_limited(self, *keys):
+        buckets = self.get_buckets()
+        cache_keys = [
+            [self.get_cache_key(key, bucket) for bucket in buckets]
+            for key in keys]
+        attempts = cache.get_many(
+            [cache_key for key_buckets in cache_keys
+             for cache_key in key_buckets])
+        return any(
+            sum(attempts.get(cache_key, 0) for cache_key in key_buckets) >=
+            self.limit
+            for key_buckets in cache_keys)
+
+    def add_attempt(self, *keys):
+        bucket = self.get_buckets()[-1]
+        # kept for as long as the bucket overlaps the window
+        timeout = int(math.ceil(self.window * (1 + 1.0 / self.buckets)))
+        for key in keys:
+            cache_key = self.get_cache_key(key, bucket)
+            if cache.add(cache_key, 1, timeout):
+                continue
+            try:
+                cache.incr(cache_key)
+            except ValueError:
+                # the key expired since the add
+                cache.add(cache_key, 1, timeout)
+
+
+forgot_password_username_limiter = AttemptLimiter(
+    'forgot-password:username', settings.FORGOT_PASSWORD_USERNAME_ATTEMPTS)
+forgot_password_ip_limiter = AttemptLimiter(
+    'forgot-password:ip', settings.FORGOT_PASSWORD_IP_ATTEMPTS)
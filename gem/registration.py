@@ -0,0 +1,109 @@
+"""
+Registration of users together with their molo and gem profiles.
+"""
+from collections import Counter
+
+from django.conf import settings
+from django.contrib.auth import login
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.utils import timezone
+
+from gem.models import GemUserProfile, GemUserRollup
+from gem.utils import local_date
+from molo.profiles.models import UserProfile
+
+
+@transaction.atomic
+def create_user(username, password, alias=None, mobile_number=None,
+                gender=None, security_question_1_answer=None,
+                security_question_2_answer=None, site=None, language=''):
+    """
+    Create a user with all of its profile fields set, writing each profile
+    once. The profiles are inserted by the post_save handlers of molo and gem
+    as the user is created, with the fields filled in by
+    user_profile_fields_handler and gem_user_profile_handler.
+    """
+    gem_profile = GemUserProfile(
+        gender=gender, site=site, language=language)
+    if security_question_1_answer is not None:
+        gem_profile.set_security_question_1_answer(security_question_1_answer)
+    if security_question_2_answer is not None:
+        gem_profile.set_security_question_2_answer(security_question_2_answer)
+
+    user = User(username=username)
+    user.set_password(password)
+    user._gem_profile = gem_profile
+    user._profile_fields = {'alias': alias, 'mobile_number': mobile_number}
+    user.save()
+    return user
+
+
+def bulk_create_users(users, batch_size=1000):
+    """
+    Create users with their profiles from dicts of the arguments of
+    create_user, inserting each batch of users and each of their profiles
+    with one query. Returns the number of users created.
+
+    The passwords and security question answers are stored as they are, so
+    they must already be hashed with make_password, using the
+    SECURITY_ANSWER_HASHER for the answers. bulk_create does not send
+    post_save, so the profiles are created here instead of by the signal
+    handlers and the rollups are added once for every batch.
+    """
+    created = 0
+    batch = []
+    for user in users:
+        batch.append(user)
+        if len(batch) == batch_size:
+            created += _bulk_create_batch(batch)
+            batch = []
+    if batch:
+        created += _bulk_create_batch(batch)
+    return created
+
+
+@transaction.atomic
+def _bulk_create_batch(batch):
+    date_joined = timezone.now()
+    User.objects.bulk_create(
+        User(username=fields['username'], password=fields['password'],
+             date_joined=date_joined)
+        for fields in batch)
+    # bulk_create doesn't set the primary keys of the users it inserts
+    users = dict(User.objects.filter(
+        username__in=[fields['username'] for fields in batch]).values_list(
+        'username', 'pk'))
+
+    UserProfile.objects.bulk_create(
+        UserProfile(
+            user_id=users[fields['username']],
+            alias=fields.get('alias'),
+            mobile_number=fields.get('mobile_number'))
+        for fields in batch)
+    profiles = [
+        GemUserProfile(
+            user_id=users[fields['username']],
+            gender=fields.get('gender'),
+            security_question_1_answer=fields.get(
+                'security_question_1_answer'),
+            security_question_2_answer=fields.get(
+                'security_question_2_answer'),
+            site=fields.get('site'),
+            language=fields.get('language', ''))
+        for fields in batch]
+    GemUserProfile.objects.bulk_create(profiles)
+
+    rollups = Counter(profile.get_rollup_fields() for profile in profiles)
+    for fields, count in rollups.items():
+        GemUserRollup.add(local_date(date_joined), fields, count)
+    return len(batch)
+
+
+def login_new_user(request, user):
+    """
+    Log in a user that was just created from the password in the request,
+    without checking the password again.
+    """
+    user.backend = settings.AUTHENTICATION_BACKENDS[0]
+    login(request, user)
@@ -0,0 +1,51 @@
+"""
+Cached sessions with the database written to in the background.
+
+Sessions are read from the cache, falling back to the database, like the
+cached_db backend. New sessions are inserted straight away so session
+keys stay unique; after that changes go to the cache immediately and are
+copied to the database by a celery task, off the request path.
+
+The tasks can run in any order, so each write carries a version stored
+in the session itself and the task drops writes older than the stored
+one. A deleted session is marked in the cache so a later save of the
+same key doesn't bring it back.
+"""
+from django.conf import settings
+from django.contrib.sessions.backends.cached_db import (
+    SessionStore as CachedDBStore)
+
+from gem.tasks import save_session
+
+VERSION_KEY = '_session_version'
+DELETED_KEY_PREFIX = 'gem.sessions.deleted'
+
+
+class SessionStore(CachedDBStore):
+
+    def get_deleted_key(self, session_key):
+        return '%s:%s' % (DELETED_KEY_PREFIX, session_key)
+
+    def save(self, must_create=False):
+        if self.session_key is None or must_create:
+            return super(SessionStore, self).save(must_create)
+
+        if self._cache.get(self.get_deleted_key(self.session_key)):
+            return
+
+        data = self._get_session()
+        data[VERSION_KEY] = data.get(VERSION_KEY, 0) + 1
+        expiry_age = self.get_expiry_age()
+        self._cache.set(self.cache_key, data, expiry_age)
+        save_session.delay(
+            self.session_key, self.encode(data), expiry_age,
+            data[VERSION_KEY])
+
+    def delete(self, session_key=None):
+        if session_key is None:
+            session_key = self.session_key
+        if session_key is not None:
+            self._cache.set(
+                self.get_deleted_key(session_key), True,
+                settings.SESSION_COOKIE_AGE)
+        super(SessionStore, self).delete(session_key)
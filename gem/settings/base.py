@@ -17,6 +17,7 @@ from django.utils.translation import ugettext_lazy as _
 import dj_database_url
 import djcelery
 from celery.schedules import crontab
+from gem.utils import parse_networks
 djcelery.setup_loader()
 
 # Absolute filesystem path to the Django project directory:
@@ -95,14 +96,43 @@ INSTALLED_APPS = [
 
 ]
 
+# How long a page is cached when no pages are published, unpublished or
+# moved, and the paths that are never cached
+PAGE_CACHE_TIMEOUT = 60 * 60
+PAGE_CACHE_IGNORE_PATHS = ('/admin/', '/django-admin/')
+
+# How long a snapshot of a homepage block is kept when the content rotation
+# tasks don't change it and no pages are published, unpublished or moved
+HOMEPAGE_CACHE_TIMEOUT = 60 * 60 * 24
+
+# How long the article listing of a section page is cached when no pages
+# are published, unpublished or moved
+LISTING_CACHE_TIMEOUT = 60 * 60 * 24
+
+# How long the section navigation is cached when no sections change
+NAVIGATION_CACHE_TIMEOUT = 60 * 60 * 24
+
+# How long a feed is cached for when no pages are published or unpublished
+FEED_CACHE_TIMEOUT = 60 * 60 * 24
+# The number of articles in each page of a section feed
+FEED_PAGE_SIZE = 20
+
 COMMENTS_APP = 'molo.commenting'
 COMMENTS_FLAG_THRESHHOLD = 3
+# The number of reports for a reason that hide a comment until a moderator
+# looks at it, COMMENTS_FLAG_THRESHHOLD for reasons that aren't listed
+COMMENT_REPORT_THRESHOLDS = {
+    'Spam': 3,
+    'Offensive Language': 3,
+    'Bullying': 2,
+    'Other': 5,
+}
 COMMENTS_HIDE_REMOVED = False
 
 SITE_ID = 1
 
 MIDDLEWARE_CLASSES = [
-    'django.contrib.sessions.middleware.SessionMiddleware',
+    'gem.middleware.SlidingSessionMiddleware',
     'molo.core.middleware.ForceDefaultLanguageMiddleware',
     'django.middleware.locale.LocaleMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -111,13 +141,16 @@ MIDDLEWARE_CLASSES = [
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 
-    'wagtail.wagtailcore.middleware.SiteMiddleware',
+    'gem.middleware.CachedSiteMiddleware',
     'wagtail.wagtailredirects.middleware.RedirectMiddleware',
 
     'molo.core.middleware.AdminLocaleMiddleware',
     'molo.core.middleware.NoScriptGASessionMiddleware',
+    'gem.middleware.PageCacheMiddleware',
 
     'molo.core.middleware.MoloGoogleAnalyticsMiddleware',
+
+    'gem.middleware.DefaultFormsCounterMiddleware',
 ]
 
 # Template configuration
@@ -149,7 +182,12 @@ WSGI_APPLICATION = 'gem.wsgi.application'
 # Automatically log users out after 10 mins of inactivity
 # Closing the browser window/tab will NOT end the session
 SESSION_COOKIE_AGE = 60 * 10  # 10 minutes
-SESSION_SAVE_EVERY_REQUEST = True
+# Instead of saving the session on every request, SlidingSessionMiddleware
+# saves an unmodified session again once this fraction of SESSION_COOKIE_AGE
+# has passed since it was last saved
+SESSION_REFRESH_RATIO = 0.1
+SESSION_ENGINE = environ.get(
+    'SESSION_ENGINE', 'django.contrib.sessions.backends.cached_db')
 
 # Database
 # https://docs.djangoproject.com/en/1.7/ref/settings/#databases
@@ -183,21 +221,25 @@ CELERY_RESULT_BACKEND = environ.get(
     'CELERY_RESULT_BACKEND', 'redis://localhost:6379/0')
 CELERYBEAT_SCHEDULE = {
     'rotate_content': {
-        'task': 'molo.core.tasks.rotate_content',
+        'task': 'gem.tasks.rotate_content',
         'schedule': crontab(minute=0),
     },
     'demote_articles': {
-        'task': 'molo.core.tasks.demote_articles',
+        'task': 'gem.tasks.demote_articles',
         'schedule': crontab(minute="*"),
     },
     'promote_articles': {
-        'task': 'molo.core.tasks.promote_articles',
+        'task': 'gem.tasks.promote_articles',
         'schedule': crontab(minute="*"),
     },
     'publish_pages': {
         'task': 'molo.core.tasks.publish_scheduled_pages',
         'schedule': crontab(minute='*'),
     },
+    'reconcile_user_rollups': {
+        'task': 'gem.tasks.reconcile_user_rollups',
+        'schedule': crontab(hour=2, minute=0),
+    },
 }
 
 # Internationalization
@@ -326,6 +368,54 @@ SITE_STATIC_PREFIX = environ.get('SITE_STATIC_PREFIX', '').lower()
 GOOGLE_TAG_MANAGER_ACCOUNT = environ.get('GOOGLE_TAG_MANAGER_ACCOUNT')
 CUSTOM_UIP_HEADER = 'HTTP_X_IORG_FBS_UIP'
 
+# The addresses of the Free Basics proxies, as addresses or in CIDR
+# notation separated by commas. The client IP in CUSTOM_UIP_HEADER is only
+# trusted on requests coming from them. They are parsed here so that an
+# invalid network stops the site from starting.
+FREE_BASICS_PROXY_NETWORKS = parse_networks([
+    network.strip() for network in
+    environ.get('FREE_BASICS_PROXY_NETWORKS', '').split(',')
+    if network.strip()])
+
+# Security question answers are hashed with SECURITY_ANSWER_HASHER, which
+# must also be listed in PASSWORD_HASHERS. Answers hashed any other way are
+# rehashed the next time they are checked.
+PASSWORD_HASHERS = [
+    'django.contrib.auth.hashers.PBKDF2PasswordHasher',
+    'django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher',
+    'django.contrib.auth.hashers.BCryptSHA256PasswordHasher',
+    'django.contrib.auth.hashers.BCryptPasswordHasher',
+    'django.contrib.auth.hashers.SHA1PasswordHasher',
+    'django.contrib.auth.hashers.MD5PasswordHasher',
+    'django.contrib.auth.hashers.UnsaltedSHA1PasswordHasher',
+    'django.contrib.auth.hashers.UnsaltedMD5PasswordHasher',
+    'django.contrib.auth.hashers.CryptPasswordHasher',
+    'gem.hashers.SecurityAnswerHasher',
+]
+SECURITY_ANSWER_HASHER = 'gem_answer_pbkdf2_sha256'
+SECURITY_ANSWER_HASH_ITERATIONS = int(environ.get(
+    'SECURITY_ANSWER_HASH_ITERATIONS', 10000))
+
+# Admin lists of tables with more rows than this use the row count estimated
+# by PostgreSQL
+ESTIMATED_COUNT_THRESHOLD = 100000
+
+# User exports are written here by celery and downloaded from here by the
+# web processes, so it has to be shared between them
+EXPORT_ROOT = environ.get('EXPORT_ROOT', join(PROJECT_ROOT, 'exports'))
+EXPORT_CHUNK_SIZE = 2000
+# larger exports are emailed as a download link
+EXPORT_EMAIL_MAX_ATTACHMENT_SIZE = int(environ.get(
+    'EXPORT_EMAIL_MAX_ATTACHMENT_SIZE', 5 * 1024 * 1024))
+EXPORT_MAX_AGE = 60 * 60 * 24 * 7  # 7 days
+
+# Password reset - failed attempts allowed per username and per client IP
+# within SESSION_COOKIE_AGE
+FORGOT_PASSWORD_USERNAME_ATTEMPTS = int(environ.get(
+    'FORGOT_PASSWORD_USERNAME_ATTEMPTS', 5))
+FORGOT_PASSWORD_IP_ATTEMPTS = int(environ.get(
+    'FORGOT_PASSWORD_IP_ATTEMPTS', 20))
+
 # Password reset - security questions
 SECURITY_QUESTION_1 = environ.get(
     'SECURITY_QUESTION_1', 'Name of the city you were born in')
@@ -29,17 +29,25 @@ COMPRESS_OFFLINE = True
 # Use Redis as the cache backend for extra performance
 # (requires the django-redis-cache package):
 # http://wagtail.readthedocs.org/en/latest/howto/performance.html#cache
-
-# CACHES = {
-#     'default': {
-#         'BACKEND': 'redis_cache.cache.RedisCache',
-#         'LOCATION': '127.0.0.1:6379',
-#         'KEY_PREFIX': 'base',
-#         'OPTIONS': {
-#             'CLIENT_CLASS': 'redis_cache.client.DefaultClient',
-#         }
-#     }
-# }
+# Cached settings are invalidated through this cache, so it needs to be
+# shared by all the web and celery processes.
+
+CACHES = {
+    'default': {
+        'BACKEND': 'redis_cache.cache.RedisCache',
+        'LOCATION': os.environ.get('CACHE_LOCATION', '127.0.0.1:6379'),
+        'KEY_PREFIX': os.environ.get('CACHE_KEY_PREFIX', 'gem'),
+        'OPTIONS': {
+            'DB': int(os.environ.get('CACHE_DB', 1)),
+        }
+    }
+}
+
+
+# Keep sessions in the cache and write them to the database from celery.
+# Use 'django.contrib.sessions.backends.signed_cookies' to keep them in the
+# session cookie instead.
+SESSION_ENGINE = os.environ.get('SESSION_ENGINE', 'gem.sessions')
 
 
 # service-directory settings
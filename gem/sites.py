@@ -0,0 +1,103 @@
+"""
+Cached resolution of Wagtail sites.
+
+All sites are loaded once per process and resolved in memory with the same
+hostname and port rules as ``Site.find_for_request``. The list is reloaded
+when a site is saved or deleted, or a site's root page is published.
+"""
+from wagtail.wagtailcore.models import Site
+
+from gem.caching import get_cache_version, bump_cache_version
+
+
+# (version, sites)
+_sites = (None, [])
+
+
+def get_sites():
+    global _sites
+    version = get_cache_version('sites')
+    if _sites[0] != version:
+        _sites = (version, list(Site.objects.select_related('root_page')))
+    return _sites[1]
+
+
+def clear_sites():
+    bump_cache_version('sites')
+
+
+def find_site(hostname, port):
+    """
+    Find the site for a hostname and port, falling back to the default
+    site like ``Site.find_for_request`` does.
+    """
+    try:
+        port = int(port)
+    except (TypeError, ValueError):
+        port = None
+
+    sites = get_sites()
+
+    for site in sites:
+        if site.hostname == hostname and site.port == port:
+            return site
+
+    matches = [site for site in sites if site.hostname == hostname]
+    default = get_default_site(sites)
+
+    if default is not None and default in matches:
+        return default
+    if len(matches) == 1:
+        return matches[0]
+    if default is not None:
+        return default
+
+    raise Site.DoesNotExist()
+
+
+def find_site_for_request(request):
+    try:
+        hostname = request.get_host().split(':')[0]
+    except KeyError:
+        hostname = None
+
+    try:
+        port = request.get_port()
+    except (AttributeError, KeyError):
+        port = request.META.get('SERVER_PORT')
+
+    return find_site(hostname, port)
+
+
+def get_default_site(sites=None):
+    for site in get_sites() if sites is None else sites:
+        if site.is_default_site:
+            return site
+    return None
+
+
+def get_site_for_request(request):
+    """
+    Return the site SiteMiddleware found for the request, or the default
+    site if there is no request or no site was found.
+    """
+    site = getattr(request, 'site', None)
+    return site if site is not None else get_default_site()
+
+
+def get_site_for_page(page):
+    """
+    Return the site the page belongs to, or the default site if it isn't
+    under any site's root page.
+    """
+    site = None
+    for candidate in get_sites():
+        root_path = candidate.root_page.path
+        if page.path.startswith(root_path) and (
+                site is None or len(root_path) > len(site.root_page.path)):
+            site = candidate
+    return site if site is not None else get_default_site()
+
+
+def is_site_root(page):
+    return any(site.root_page_id == page.pk for site in get_sites())
@@ -1,18 +1,114 @@
-from django.contrib.auth.models import User
+import os
+from datetime import timedelta
+from uuid import uuid4
+
+from django.contrib.sessions.models import Session
 from django.conf import settings
+from django.core.cache import cache
 from django.core.mail import EmailMultiAlternatives
+from django.db import transaction
+from django.utils import timezone
+from gem.exports import UserExport, remove_expired_exports
+from gem.homepage import refresh_homepages
+from gem.models import GemUserRollup
+from molo.core import tasks as molo_tasks
+from molo.core.models import ArticlePage
 from .celery import app
 
 
-@app.task(ignore_result=True)
-def send_export_email_gem(recipient, arguments):
-    from gem.admin import GemFrontendUsersResource
-    csvfile = GemFrontendUsersResource().export(
-        User.objects.filter(is_staff=False, **arguments)).csv
+@app.task(bind=True, ignore_result=True, acks_late=True)
+def send_export_email_gem(self, recipient, arguments):
+    # a redelivered task has the same id, so it resumes the same export
+    export = UserExport(self.request.id or uuid4().hex, arguments)
+    remove_expired_exports()
+    path = export.write()
+
     subject = 'Molo export: %s' % settings.SITE_NAME
     from_email = settings.DEFAULT_FROM_EMAIL
     msg = EmailMultiAlternatives(subject, '', from_email, (recipient,))
-    msg.attach(
-        'Molo_export_%s.csv' % settings.SITE_NAME,
-        csvfile, 'text/csv')
-    msg.send()
+    if os.path.getsize(path) <= settings.EXPORT_EMAIL_MAX_ATTACHMENT_SIZE:
+        with open(path, 'rb') as f:
+            msg.attach(
+                'Molo_export_%s.csv.gz' % settings.SITE_NAME,
+                f.read(), 'application/gzip')
+        msg.send()
+        export.delete()
+    else:
+        msg.body = (
+            'The export is too large to attach. Download it within %d days '
+            'from %s' % (
+                settings.EXPORT_MAX_AGE // (60 * 60 * 24),
+                export.get_download_url()))
+        msg.send()
+        cache.delete(export.progress_key)
+
+
+@app.task(ignore_result=True)
+def save_session(session_key, session_data, expiry_age, version):
+    from gem.sessions import VERSION_KEY
+
+    with transaction.atomic():
+        # Only update, so a session deleted before this runs stays deleted
+        session = Session.objects.select_for_update().filter(
+            session_key=session_key).first()
+        if session is None:
+            return
+        # The tasks aren't ordered, so drop writes older than the stored one
+        if session.get_decoded().get(VERSION_KEY, 0) >= version:
+            return
+        session.session_data = session_data
+        session.expire_date = timezone.now() + timedelta(seconds=expiry_age)
+        session.save(update_fields=['session_data', 'expire_date'])
+
+
+@app.task(ignore_result=True)
+def reconcile_user_rollups():
+    # Recount the rollups from the profiles, correcting any drift from
+    # profiles changed without their signals being sent
+    GemUserRollup.rebuild()
+
+
+# The content rotation tasks change what the homepage lists, without
+# sending signals for articles promoted or demoted by date.
+
+FEATURES = ('latest', 'section', 'homepage')
+
+
+@app.task(ignore_result=True)
+def rotate_content(day=None):
+    molo_tasks.rotate_content(day)
+    refresh_homepages()
+
+
+# promote_articles and demote_articles run every minute, so they make
+# molo's updates here, counting the articles changed, and only refresh the
+# homepages when there were some.
+
+@app.task(ignore_result=True)
+def demote_articles():
+    now = timezone.now()
+    demoted = 0
+    for feature in FEATURES:
+        demoted += ArticlePage.objects.live().filter(**{
+            'featured_in_%s_end_date__lte' % feature: now,
+        }).update(**{
+            'featured_in_%s' % feature: False,
+            'featured_in_%s_start_date' % feature: None,
+            'featured_in_%s_end_date' % feature: None,
+        })
+    if demoted:
+        refresh_homepages()
+
+
+@app.task(ignore_result=True)
+def promote_articles():
+    now = timezone.now()
+    promoted = 0
+    for feature in FEATURES:
+        # molo updates the articles already featured too
+        promoted += ArticlePage.objects.live().filter(**{
+            'featured_in_%s_start_date__lte' % feature: now,
+            'featured_in_%s' % feature: False,
+        }).update(**{'featured_in_%s' % feature: True})
+    if promoted:
+        refresh_homepages()
@@ -1,5 +1,15 @@
+from django.contrib.contenttypes.models import ContentType
 from django.template import Library
 from django.conf import settings
+from django.utils.safestring import mark_safe
+
+from gem.fragments import get_marker, render_fragment, render_fragments
+from gem.homepage import get_block
+from gem.listings import get_listing
+from gem.navigation import render_navigation
+from gem.ratelimit import get_free_basics_ip
+from wagtail.wagtailadmin.templatetags.wagtailuserbar import wagtailuserbar
+from wagtail.wagtailcore.models import Page
 
 register = Library()
 
@@ -12,3 +22,84 @@ def get_site_static_prefix():
 @register.filter('fieldtype')
 def fieldtype(field):
     return field.field.widget.__class__.__name__
+
+
+@register.simple_tag(takes_context=True)
+def section_navigation(context, template_name):
+    """
+    Render the site's sections with the given template, from the cache if
+    they were rendered before.
+    """
+    return mark_safe(render_navigation(context, template_name))
+
+
+@register.simple_tag(takes_context=True)
+def homepage_block(context, name):
+    """
+    Render a block of the homepage from its snapshot in gem.homepage.
+    """
+    request = context['request']
+    content = get_block(request.site, context.get('locale_code'), name)
+    if not getattr(request, 'page_fragments', False):
+        content = render_fragments(request, content)
+    return mark_safe(content)
+
+
+@register.assignment_tag(takes_context=True)
+def load_section_listing(context, section):
+    """
+    Return a section page's rendered articles and pagination, from the
+    cache if they were rendered before.
+    """
+    listing = get_listing(context, section)
+    return {
+        'articles': mark_safe(listing['articles']),
+        'pagination': mark_safe(listing['pagination']),
+    }
+
+
+@register.simple_tag(takes_context=True)
+def fragment(context, template_name, **kwargs):
+    """
+    Render a part of the page that is particular to the reader, or mark it
+    to be rendered for each reader when the page is cached. The arguments
+    are the fragment's context and must be JSON serializable.
+    """
+    request = context['request']
+    if getattr(request, 'page_fragments', False):
+        return mark_safe(get_marker(template_name, kwargs))
+    return render_fragment(request, template_name, kwargs)
+
+
+@register.assignment_tag(takes_context=True)
+def free_basics_ip(context):
+    """
+    Return the reader's IP address sent by the Free Basics proxy, if the
+    request came through it.
+    """
+    return get_free_basics_ip(context['request'])
+
+
+@register.assignment_tag()
+def get_comment_target(content_type_id, object_pk):
+    # The comment form only needs the model and the primary key of the
+    # object, so this doesn't fetch it.
+    model = ContentType.objects.get_for_id(content_type_id).model_class()
+    return model(pk=object_pk)
+
+
+@register.assignment_tag()
+def get_specific_page(page_id):
+    page = Page.objects.filter(pk=page_id).first()
+    return page and page.specific
+
+
+@register.simple_tag(takes_context=True)
+def page_userbar(context, page_id):
+    request = context['request']
+    if not page_id or not request.user.has_perm('wagtailadmin.access_admin'):
+        return ''
+    return wagtailuserbar({
+        'request': request,
+        'page': Page.objects.filter(pk=page_id).first(),
+    })
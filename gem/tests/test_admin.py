@@ -1,14 +1,25 @@
 # -*- coding: utf-8 -*-
+import gzip
 from datetime import date
+from StringIO import StringIO
 
+from django.db import connection
 from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.contrib.auth.models import User
+from django.contrib.contenttypes.models import ContentType
+from django.contrib.sites.models import Site
+from django.utils import timezone
 from django.test.client import Client
+from django_comments.models import CommentFlag
+from molo.commenting.models import MoloComment
 from molo.core.tests.base import MoloTestCaseMixin
 
 from molo.profiles.models import UserProfile
-from gem.admin import GemUserAdmin, download_as_csv_gem
-from gem.models import GemUserProfile
+from gem.admin import GemUserAdmin, GemFrontendUsersResource, \
+    download_as_csv_gem
+from gem.models import GemCommentReport, GemUserProfile
+from gem.pagination import EstimatedCountPaginator, with_estimated_count
 from molo.profiles.task import send_export_email
 from django.conf import settings
 from django.core import mail
@@ -41,6 +52,57 @@ class TestFrontendUsersAdminView(TestCase, MoloTestCaseMixin):
         self.assertContains(response, self.user.username)
         self.assertNotContains(response, self.superuser.email)
 
+    def count_queries(self, url):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(queries.captured_queries)
+
+    def assert_queries_do_not_grow_with_users(self, url):
+        self.user.gem_profile.gender = 'f'
+        self.user.gem_profile.save()
+        self.client.get(url)
+        queries = self.count_queries(url)
+
+        for i in range(10):
+            user = User.objects.create_user(username='tester%s' % i)
+            user.gem_profile.gender = 'm'
+            user.gem_profile.save()
+
+        self.assertEqual(self.count_queries(url), queries)
+
+    def test_user_admin_queries_do_not_grow_with_users(self):
+        self.assert_queries_do_not_grow_with_users('/django-admin/auth/user/')
+        response = self.client.get('/django-admin/auth/user/')
+        self.assertContains(response, '<td class="field-gender">male</td>')
+
+    def test_frontend_users_queries_do_not_grow_with_users(self):
+        self.assert_queries_do_not_grow_with_users('/admin/auth/user/')
+        response = self.client.get('/admin/auth/user/')
+        self.assertContains(response, 'female')
+
+    def test_paginator_counts_exactly_without_an_estimate(self):
+        paginator = EstimatedCountPaginator(User.objects.all(), 1)
+        with self.assertNumQueries(1):
+            self.assertEqual(paginator.count, 2)
+            self.assertEqual(paginator.num_pages, 2)
+
+    def test_frontend_users_are_counted_once(self):
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get('/admin/auth/user/')
+        counts = [
+            query for query in queries.captured_queries
+            if 'COUNT(' in query['sql'] and 'auth_user' in query['sql']]
+        # the users and the frontend users, each counted once
+        self.assertEqual(len(counts), 2)
+
+    def test_queryset_counts_exactly_without_an_estimate(self):
+        queryset = with_estimated_count(User.objects.all())
+        with self.assertNumQueries(1):
+            self.assertEqual(queryset.count(), 2)
+            self.assertEqual(queryset.count(), 2)
+        self.assertEqual(queryset.filter(username='tester').count(), 1)
+
     def test_export_csv(self):
         profile = self.user.profile
         profile.alias = 'The Alias'
@@ -60,15 +122,31 @@ class TestFrontendUsersAdminView(TestCase, MoloTestCaseMixin):
         self.assertEquals(message.to, [self.user.email])
         self.assertEquals(
             message.subject, 'Molo export: ' + settings.SITE_NAME)
+        filename, content, mimetype = message.attachments[0]
+        self.assertEquals(filename, 'Molo_export_GEM.csv.gz')
+        self.assertEquals(mimetype, 'application/gzip')
         self.assertEquals(
-            message.attachments[0],
-            ('Molo_export_GEM.csv',
-             'username,alias,first_name,last_name,date_of_birth,email,mobile_'
-             'number,is_active,date_joined,last_login,gender\r\ntester,,,,,t'
-             'ester@example.com,,1,' + str(
-                 self.user.date_joined.strftime("%Y-%m-%d %H:%M:%S")) +
-             ',,\r\n',
-             'text/csv'))
+            gzip.GzipFile(fileobj=StringIO(content)).read(),
+            'username,alias,first_name,last_name,date_of_birth,email,mobile_'
+            'number,is_active,date_joined,last_login,gender\r\ntester,,,,,t'
+            'ester@example.com,,1,' + str(
+                self.user.date_joined.strftime("%Y-%m-%d %H:%M:%S")) +
+            ',,\r\n')
+
+    def test_export_queries_do_not_grow_with_users(self):
+        resource = GemFrontendUsersResource()
+        with self.assertNumQueries(1):
+            resource.export(User.objects.all())
+
+        for i in range(10):
+            user = User.objects.create_user(username='tester%s' % i)
+            user.gem_profile.gender = 'm'
+            user.gem_profile.save()
+
+        with self.assertNumQueries(1):
+            dataset = resource.export(User.objects.filter(is_staff=False))
+        self.assertEqual(len(dataset), 11)
+        self.assertEqual(dataset['gender'][-1], 'male')
 
     def test_export_csv_no_gem_profile(self):
         GemUserProfile.objects.all().delete()
@@ -101,12 +179,14 @@ class ModelsTestCase(TestCase, MoloTestCaseMixin):
                                        None,
                                        User.objects.all())
         expected_output = (
-            'Content-Type: text/csv\r\nContent-Disposition: attachment;filen'
-            'ame=export.csv\r\n\r\nusername,email,first_name,last_name,is_sta'
-            'ff,date_joined,alias,mobile_number,date_of_birth,gender\r\nte'
-            'ster,tester@example.com,,,False,' + date + ',The Alias,+277'
-            '84667723,,f\r\n')
-        self.assertEquals(str(response), expected_output)
+            'username,email,first_name,last_name,is_staff,date_joined,alias,'
+            'mobile_number,date_of_birth,gender\r\ntester,tester@example.com'
+            ',,,False,' + date + ',The Alias,+27784667723,,f\r\n')
+        self.assertEquals(response['Content-Type'], 'text/csv')
+        self.assertEquals(
+            response['Content-Disposition'], 'attachment;filename=export.csv')
+        self.assertEquals(
+            ''.join(response.streaming_content), expected_output)
 
     @override_settings(CELERY_ALWAYS_EAGER=True)
     def test_download_csv_no_gem_profile(self):
@@ -116,7 +196,70 @@ class ModelsTestCase(TestCase, MoloTestCaseMixin):
                                        None,
                                        User.objects.all())
         expected_output = (
-            'Content-Type: text/csv\r\nContent-Disposition: attachment;file'
-            'name=export.csv\r\n\r\nusername,email,first_name,last_name,is_st'
-            'aff,date_joined,alias,mobile_number,date_of_birth,gender\r\n')
-        self.assertEquals(str(response), expected_output)
+            'username,email,first_name,last_name,is_staff,date_joined,alias,'
+            'mobile_number,date_of_birth,gender\r\n')
+        self.assertEquals(
+            ''.join(response.streaming_content), expected_output)
+
+    def test_download_csv_queries_do_not_grow_with_users(self):
+        for i in range(5):
+            User.objects.create_user(username=u'tester\u00e9%s' % i)
+
+        with self.assertNumQueries(2):
+            response = download_as_csv_gem(
+                GemUserAdmin(UserProfile, self.site), None,
+                User.objects.all())
+            rows = ''.join(response.streaming_content).splitlines()
+
+        self.assertEqual(len(rows), 7)
+        self.assertIn('tester\xc3\xa90', rows[2])
+
+
+class TestCommentReportAdmin(TestCase, MoloTestCaseMixin):
+    def setUp(self):
+        self.mk_main()
+        self.superuser = User.objects.create_superuser(
+            username='superuser', email='admin@example.com', password='0000')
+        self.client.login(username='superuser', password='0000')
+        article = self.mk_article(self.mk_section(self.section_index))
+        self.comment = MoloComment.objects.create(
+            content_type=ContentType.objects.get_for_model(article),
+            object_pk=article.pk, site=Site.objects.get_current(),
+            user=self.superuser, comment='report me',
+            submit_date=timezone.now())
+
+    def test_report_counts_are_not_counted_per_comment(self):
+        for i in range(3):
+            GemCommentReport.report(
+                self.comment, User.objects.create_user(username='u%s' % i),
+                'Spam')
+        CommentFlag.objects.create(
+            comment=self.comment, user=self.superuser,
+            flag=CommentFlag.SUGGEST_REMOVAL)
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(
+                '/django-admin/commenting/molocomment/')
+        comment = response.context['cl'].result_list[0]
+        self.assertEqual(comment.gem_reports, 3)
+        self.assertEqual(comment.removal_flags, 1)
+        # only the listing reads the flags and the report counts
+        self.assertEqual(len([
+            query for query in queries.captured_queries
+            if 'django_comment_flags' in query['sql'] or
+            'gem_gemcommentreport' in query['sql']]), 1)
+
+    def test_flags_and_reports_are_listed_separately(self):
+        GemCommentReport.report(
+            self.comment, User.objects.create_user(username='u0'), 'Spam')
+        for i in range(2):
+            CommentFlag.objects.create(
+                comment=self.comment,
+                user=User.objects.create_user(username='f%s' % i),
+                flag=CommentFlag.SUGGEST_REMOVAL)
+
+        response = self.client.get('/django-admin/commenting/molocomment/')
+        self.assertContains(response, 'column-reported_count')
+        self.assertContains(response, 'column-reports')
+        # the flags, then the reports
+        self.assertContains(response, '<td>2</td><td>1</td>')
@@ -0,0 +1,83 @@
+from django.contrib.auth.models import User
+from django.contrib.contenttypes.models import ContentType
+from django.contrib.sites.models import Site
+from django.core.urlresolvers import reverse
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.utils import timezone
+from django_comments.models import CommentFlag
+
+from gem.models import GemCommentReport
+from molo.commenting.models import MoloComment
+from molo.core.tests.base import MoloTestCaseMixin
+
+
+@override_settings(COMMENT_REPORT_THRESHOLDS={'Bullying': 2, 'Spam': 3})
+class CommentReportQueueTest(TestCase, MoloTestCaseMixin):
+
+    def setUp(self):
+        self.mk_main()
+        self.article = self.mk_article(self.mk_section(self.section_index))
+        self.users = [
+            User.objects.create_user(username='user%s' % i)
+            for i in range(4)]
+
+    def create_comment(self, comment='report me'):
+        return MoloComment.objects.create(
+            content_type=ContentType.objects.get_for_model(self.article),
+            object_pk=self.article.pk, site=Site.objects.get_current(),
+            user=self.users[0], comment=comment, submit_date=timezone.now())
+
+    def report(self, comment, reasons):
+        for user, reason in zip(self.users, reasons):
+            GemCommentReport.report(comment, user, reason)
+        return MoloComment.objects.get(pk=comment.pk)
+
+    def test_comment_is_hidden_at_the_threshold_for_a_reason(self):
+        comment = self.report(self.create_comment(), ['Bullying'])
+        self.assertFalse(comment.is_removed)
+        comment = self.report(comment, ['Spam', 'Bullying'])
+        self.assertTrue(comment.is_removed)
+
+    def test_reasons_are_counted_separately(self):
+        comment = self.report(self.create_comment(), ['Spam', 'Bullying'])
+        self.assertFalse(comment.is_removed)
+        self.assertEqual(comment.gem_report_count.count, 2)
+
+    def test_unlisted_reasons_use_the_flag_threshold(self):
+        comment = self.report(
+            self.create_comment(), ['Other', 'Other', 'Other'])
+        self.assertTrue(comment.is_removed)
+
+    def test_approved_comment_is_not_hidden(self):
+        comment = self.create_comment()
+        CommentFlag.objects.create(
+            comment=comment, user=self.users[3],
+            flag=CommentFlag.MODERATOR_APPROVAL)
+        comment = self.report(comment, ['Bullying', 'Bullying'])
+        self.assertFalse(comment.is_removed)
+
+    def test_queue_is_sorted_by_report_count_and_recency(self):
+        User.objects.create_superuser(
+            username='superuser', email='admin@example.com', password='0000')
+        self.client.login(username='superuser', password='0000')
+        once = self.create_comment('once')
+        twice = self.create_comment('twice')
+        once_later = self.create_comment('once later')
+        self.create_comment('never')
+        self.report(once, ['Spam'])
+        self.report(twice, ['Spam', 'Spam'])
+        self.report(once_later, ['Spam'])
+
+        self.client.get(reverse('comment_report_queue'))
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('comment_report_queue'))
+        self.assertEqual(
+            [report_count.comment for report_count
+             in response.context['report_counts']],
+            [twice, once_later, once])
+        self.assertFalse([
+            query for query in queries.captured_queries
+            if query['sql'].startswith('SELECT') and
+            'FROM "commenting_molocomment"' in query['sql']])
@@ -0,0 +1,39 @@
+from django.contrib.auth.models import User
+from django.core.urlresolvers import reverse
+from django.test import TestCase, RequestFactory, override_settings
+
+from gem.context_processors import default_forms
+from molo.core.tests.base import MoloTestCaseMixin
+from molo.profiles.forms import ProfilePasswordChangeForm
+
+
+class DefaultFormsTestCase(TestCase, MoloTestCaseMixin):
+
+    def setUp(self):
+        self.mk_main()
+        self.factory = RequestFactory()
+
+    def test_forms_are_built_when_used(self):
+        request = self.factory.get('/')
+        context = default_forms(request)
+
+        self.assertEqual(request.default_forms_counter.built, 0)
+        self.assertIn('old_password', context['password_change_form'].fields)
+        self.assertIsInstance(
+            context['password_change_form'], ProfilePasswordChangeForm)
+        self.assertEqual(request.default_forms_counter.built, 1)
+        self.assertEqual(request.default_forms_counter.avoided, 2)
+
+    @override_settings(DEBUG=True)
+    def test_unused_forms_are_not_built(self):
+        response = self.client.get('/')
+        self.assertEqual(response['X-Default-Forms-Avoided'], '3')
+
+    @override_settings(DEBUG=True)
+    def test_profile_page_builds_password_change_form(self):
+        User.objects.create_user(username='tester', password='tester')
+        self.client.login(username='tester', password='tester')
+
+        response = self.client.get(reverse('molo.profiles:view_my_profile'))
+        self.assertContains(response, 'id_old_password')
+        self.assertEqual(response['X-Default-Forms-Avoided'], '2')
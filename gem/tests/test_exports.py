@@ -0,0 +1,150 @@
+import asyncore
+import email
+import gc
+import gzip
+import shutil
+import smtpd
+import threading
+import weakref
+from StringIO import StringIO
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.urlresolvers import reverse
+from django.db.models.signals import post_init
+from django.test import TestCase
+from django.test.utils import override_settings
+
+from gem.exports import UserExport
+from gem.models import GemUserProfile
+from gem.tasks import send_export_email_gem
+from molo.core.tests.base import MoloTestCaseMixin
+from molo.profiles.models import UserProfile
+
+
+class SMTPStandIn(smtpd.SMTPServer):
+    """
+    An SMTP server on a free local port that keeps the messages it
+    receives, run in a thread while the test sends email.
+    """
+
+    def __init__(self):
+        smtpd.SMTPServer.__init__(self, ('127.0.0.1', 0), None)
+        self.port = self.socket.getsockname()[1]
+        self.messages = []
+
+    def process_message(self, peer, mailfrom, rcpttos, data):
+        self.messages.append(data)
+
+    def __enter__(self):
+        self.thread = threading.Thread(
+            target=asyncore.loop, kwargs={'timeout': 0.1})
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+        self.thread.join()
+
+
+def create_users(count):
+    User.objects.bulk_create(
+        User(username='user%04d' % i, email='user%04d@example.com' % i)
+        for i in range(count))
+    user_ids = list(User.objects.values_list('pk', flat=True))
+    UserProfile.objects.bulk_create(
+        UserProfile(user_id=pk, alias='Alias %s' % pk) for pk in user_ids)
+    GemUserProfile.objects.bulk_create(
+        GemUserProfile(user_id=pk, gender='f') for pk in user_ids)
+
+
+def read_export(path):
+    with gzip.open(path, 'rb') as f:
+        return f.read().splitlines()
+
+
+@override_settings(EXPORT_CHUNK_SIZE=50)
+class UserExportTest(TestCase, MoloTestCaseMixin):
+
+    def setUp(self):
+        self.mk_main()
+        create_users(400)
+        self.addCleanup(shutil.rmtree, settings.EXPORT_ROOT, True)
+
+    def send_export_email(self, smtp):
+        with override_settings(
+                EMAIL_BACKEND='django.core.mail.backends.smtp.EmailBackend',
+                EMAIL_HOST='127.0.0.1', EMAIL_PORT=smtp.port,
+                EMAIL_HOST_USER='', EMAIL_HOST_PASSWORD=''):
+            send_export_email_gem('admin@example.com', {})
+
+    def test_interrupted_export_resumes(self):
+        export = UserExport('interrupted', {})
+        chunks = export.write_chunks()
+        next(chunks)
+        next(chunks)
+        chunks.close()
+        # a chunk that was being written when the task was killed
+        with open(export.path, 'ab') as f:
+            f.write('partial')
+
+        rows = read_export(UserExport('interrupted', {}).write())
+        export.delete()
+
+        self.assertEqual(len(rows), 401)
+        self.assertEqual(rows[1].split(',')[0], 'user0000')
+        self.assertEqual(len(set(rows)), 401)
+
+    def test_export_memory_is_bounded_by_chunk_size(self):
+        live_users = weakref.WeakSet()
+        most_live_users = [0]
+
+        def track_users(sender, instance, **kwargs):
+            live_users.add(instance)
+            if len(live_users) > 2 * 50 + 1:
+                # users and their profiles refer to each other, so they are
+                # only freed by the garbage collector
+                gc.collect()
+            most_live_users[0] = max(most_live_users[0], len(live_users))
+
+        post_init.connect(track_users, sender=User)
+        self.addCleanup(post_init.disconnect, track_users, sender=User)
+
+        with SMTPStandIn() as smtp:
+            self.send_export_email(smtp)
+
+        # the previous chunk is released while the next one is fetched
+        self.assertLessEqual(most_live_users[0], 2 * 50 + 1)
+
+        message = email.message_from_string(smtp.messages[0])
+        attachment = [
+            part for part in message.walk()
+            if part.get_filename() == 'Molo_export_GEM.csv.gz'][0]
+        content = attachment.get_payload(decode=True)
+        self.assertLessEqual(len(content), 5 * 1024 * 1024)
+
+    @override_settings(EXPORT_EMAIL_MAX_ATTACHMENT_SIZE=1024)
+    def test_large_export_is_emailed_as_a_signed_link(self):
+        with SMTPStandIn() as smtp:
+            self.send_export_email(smtp)
+
+        message = email.message_from_string(smtp.messages[0])
+        self.assertFalse(message.is_multipart())
+        body = message.get_payload(decode=True)
+        url = body.split()[-1]
+        self.assertTrue(url.startswith('http://example.com/exports/'))
+        path = url[len('http://example.com'):]
+
+        User.objects.create_superuser(
+            username='superuser', email='admin@example.com', password='0000')
+        self.client.login(username='superuser', password='0000')
+
+        response = self.client.get(path)
+        self.assertEqual(response['Content-Type'], 'application/gzip')
+        content = StringIO(''.join(response.streaming_content))
+        self.assertEqual(
+            len(gzip.GzipFile(fileobj=content).read().splitlines()), 401)
+
+        response = self.client.get(
+            reverse('export_download', args=['tampered' + path[9:-1]]))
+        self.assertEqual(response.status_code, 404)
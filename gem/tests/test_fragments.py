@@ -0,0 +1,95 @@
+import re
+
+from django.contrib.auth.models import Group, User
+from django.contrib.contenttypes.models import ContentType
+from django.contrib.sites.models import Site
+from django.core.urlresolvers import reverse
+from django.test import RequestFactory, TestCase
+from django.test.utils import override_settings
+from django.utils import timezone
+
+from gem.fragments import get_marker, render_fragments
+from molo.commenting.models import MoloComment
+from molo.core import constants
+from molo.core.models import SiteLanguage
+from molo.core.tests.base import MoloTestCaseMixin
+
+
+@override_settings(DEBUG=True)
+class FragmentsTest(TestCase, MoloTestCaseMixin):
+
+    def setUp(self):
+        SiteLanguage.objects.create(locale='en')
+        self.mk_main()
+        self.article = self.mk_article(
+            self.mk_section(self.section_index),
+            commenting_state=constants.COMMENTING_OPEN)
+        self.user = User.objects.create_user(
+            username='tester', password='tester')
+        self.expert = User.objects.create_user(
+            username='expert', password='expert')
+        self.expert.groups.add(Group.objects.create(name='Expert'))
+        MoloComment.objects.create(
+            content_type=ContentType.objects.get_for_model(self.article),
+            object_pk=self.article.pk, site=Site.objects.get_current(),
+            user=self.user, comment='a comment', submit_date=timezone.now())
+
+    def get_article(self, username):
+        self.client.logout()
+        self.client.login(username=username, password=username)
+        return self.client.get(self.article.url)
+
+    def get_form_value(self, response, name):
+        return re.search(
+            r"""name=["']%s["'][^>]*value=["']([^"']*)""" % name,
+            response.content.decode('utf-8')).group(1)
+
+    def test_comment_form_is_rendered_for_each_reader(self):
+        self.assertEqual(
+            self.get_article('tester')['X-Page-Cache'], 'miss')
+        self.client = self.client_class(enforce_csrf_checks=True)
+        response = self.get_article('tester')
+        self.assertEqual(response['X-Page-Cache'], 'hit')
+        self.assertNotContains(response, '<!--gem-fragment:')
+        self.assertEqual(
+            self.get_form_value(response, 'next'), self.article.url)
+
+        data = dict(
+            (name, self.get_form_value(response, name))
+            for name in ('csrfmiddlewaretoken', 'content_type', 'object_pk',
+                         'timestamp', 'security_hash', 'next'))
+        data['comment'] = 'another comment'
+        response = self.client.post(
+            reverse('molo.commenting:molo-comments-post'), data)
+        self.assertRedirects(
+            response, '%s?c=%s' % (
+                self.article.url,
+                MoloComment.objects.get(comment='another comment').pk),
+            fetch_redirect_response=False)
+
+    def test_reply_links_are_only_shown_to_experts(self):
+        self.get_article('tester')
+        response = self.get_article('expert')
+        self.assertEqual(response['X-Page-Cache'], 'hit')
+        self.assertContains(response, 'Reply')
+        response = self.get_article('tester')
+        self.assertEqual(response['X-Page-Cache'], 'hit')
+        self.assertNotContains(response, 'Reply')
+
+    def test_userbar_is_only_shown_to_editors(self):
+        User.objects.create_superuser(
+            username='admin', email='admin@example.com', password='admin')
+        self.get_article('tester')
+        response = self.get_article('admin')
+        self.assertEqual(response['X-Page-Cache'], 'hit')
+        self.assertContains(response, 'wagtail-userbar')
+        response = self.get_article('tester')
+        self.assertNotContains(response, 'wagtail-userbar')
+
+    def test_markers_are_signed(self):
+        request = RequestFactory().get('/')
+        request.user = self.user
+        marker = get_marker('fragments/comment_reply.html', {'comment_id': 1})
+        self.assertEqual(render_fragments(request, marker).strip(), '')
+        self.assertEqual(
+            render_fragments(request, marker[:-8] + 'forged-->'), '')
@@ -0,0 +1,48 @@
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.test import TestCase
+from django.test.utils import override_settings
+
+from gem.models import GemUserProfile
+
+
+class SecurityAnswerHasherTest(TestCase):
+
+    def setUp(self):
+        user = User.objects.create_user(username='tester', password='tester')
+        self.profile = user.gem_profile
+
+    def get_stored_answer(self):
+        return GemUserProfile.objects.get(
+            pk=self.profile.pk).security_question_1_answer
+
+    def test_answers_use_the_security_answer_hasher(self):
+        self.profile.set_security_question_1_answer(' Dog ')
+
+        self.assertTrue(self.profile.security_question_1_answer.startswith(
+            'gem_answer_pbkdf2_sha256$10000$'))
+        self.assertTrue(self.profile.check_security_question_1_answer('dog'))
+        self.assertFalse(self.profile.check_security_question_1_answer('cat'))
+
+    def test_password_hashed_answers_are_rehashed_when_checked(self):
+        self.profile.security_question_1_answer = make_password('dog')
+        self.profile.save()
+
+        self.assertFalse(self.profile.check_security_question_1_answer('cat'))
+        self.assertTrue(self.get_stored_answer().startswith('pbkdf2_sha256$'))
+
+        self.assertTrue(self.profile.check_security_question_1_answer('dog'))
+        self.assertTrue(
+            self.get_stored_answer().startswith('gem_answer_pbkdf2_sha256$'))
+        self.assertTrue(self.profile.check_security_question_1_answer('dog'))
+
+    def test_answers_are_rehashed_when_iterations_change(self):
+        self.profile.set_security_question_1_answer('dog')
+        self.profile.save()
+
+        with override_settings(SECURITY_ANSWER_HASH_ITERATIONS=12000):
+            self.assertTrue(
+                self.profile.check_security_question_1_answer('dog'))
+
+        self.assertTrue(self.get_stored_answer().startswith(
+            'gem_answer_pbkdf2_sha256$12000$'))
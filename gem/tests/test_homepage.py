@@ -0,0 +1,115 @@
+import time
+from datetime import timedelta
+
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.utils import timezone
+
+from gem import tasks
+from molo.core.models import SiteLanguage
+from molo.core.tests.base import MoloTestCaseMixin
+from molo.yourwords.models import (
+    YourWordsCompetition, YourWordsCompetitionIndexPage)
+
+
+class HomepageBlocksTest(TestCase, MoloTestCaseMixin):
+
+    def setUp(self):
+        SiteLanguage.objects.create(locale='en', is_main_language=True)
+        self.mk_main()
+        self.section = self.mk_section(self.section_index, title='Your mind')
+        self.now = timezone.now()
+        # the latest listing shows the latest article
+        an_hour_ago = self.now - timedelta(hours=1)
+        self.mk_article(
+            self.section, title='Featured article', featured_in_latest=True,
+            featured_in_latest_start_date=an_hour_ago,
+            featured_in_homepage=True,
+            featured_in_homepage_start_date=an_hour_ago)
+
+    def mk_competition(self):
+        index = YourWordsCompetitionIndexPage(
+            title='Your words', slug='your-words')
+        self.main.add_child(instance=index)
+        index.save_revision().publish()
+        competition = YourWordsCompetition(
+            title='Tell your story', slug='tell-your-story')
+        index.add_child(instance=competition)
+        competition.save_revision().publish()
+
+    @override_settings(PAGE_CACHE_IGNORE_PATHS=('/',))
+    def test_blocks_are_read_from_their_snapshots(self):
+        self.assertContains(self.client.get('/'), 'Featured article')
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/')
+        self.assertContains(response, 'Featured article', count=2)
+        # the view restrictions and the languages, not the settings
+        self.assertLess(len(queries.captured_queries), 5)
+        self.assertFalse([
+            query for query in queries.captured_queries
+            if query['sql'].startswith((
+                'SELECT "wagtailcore_page"', 'SELECT "core_articlepage"'))])
+
+    @override_settings(DEBUG=True)
+    def test_promoted_articles_clear_the_homepage(self):
+        # the competition's entry link is a fragment of the snapshot
+        self.mk_competition()
+        self.mk_article(
+            self.section, title='Promoted article',
+            featured_in_latest_start_date=self.now - timedelta(minutes=1))
+        self.assertNotContains(self.client.get('/'), 'Promoted article')
+
+        tasks.promote_articles()
+        response = self.client.get('/')
+        self.assertEqual(response['X-Page-Cache'], 'miss')
+        self.assertContains(response, 'Promoted article')
+
+        # nothing else to promote, and the snapshots rendered again later
+        # have the same fragment markers
+        self.assertEqual(self.client.get('/')['X-Page-Cache'], 'hit')
+        time.sleep(1.1)
+        tasks.promote_articles()
+        self.assertEqual(self.client.get('/')['X-Page-Cache'], 'hit')
+
+    def test_homepages_are_refreshed_only_for_changed_articles(self):
+        tasks.promote_articles()
+        tasks.demote_articles()
+        # the updates, without rendering the homepages again
+        with self.assertNumQueries(3):
+            tasks.promote_articles()
+        with self.assertNumQueries(3):
+            tasks.demote_articles()
+
+        article = self.mk_article(
+            self.section, title='Demoted article', featured_in_latest=True,
+            featured_in_latest_start_date=self.now - timedelta(hours=1),
+            featured_in_latest_end_date=self.now - timedelta(minutes=1))
+        self.assertContains(self.client.get('/'), 'Demoted article')
+        tasks.demote_articles()
+        self.assertNotContains(self.client.get('/'), 'Demoted article')
+        article.refresh_from_db()
+        self.assertFalse(article.featured_in_latest)
+        self.assertIsNone(article.featured_in_latest_end_date)
+
+    def test_publishing_clears_the_snapshots(self):
+        self.client.get('/')
+        self.mk_article(
+            self.section, title='Another article', featured_in_latest=True,
+            featured_in_latest_start_date=timezone.now())
+        self.assertContains(self.client.get('/'), 'Another article')
+
+    @override_settings(DEBUG=True)
+    def test_readers_get_their_own_competition_link(self):
+        self.mk_competition()
+        response = self.client.get('/')
+        self.assertContains(response, 'Tell your story')
+        self.assertContains(response, 'Log in to Enter')
+
+        User.objects.create_user(username='tester', password='tester')
+        self.client.login(username='tester', password='tester')
+        response = self.client.get('/')
+        self.assertEqual(response['X-Page-Cache'], 'miss')
+        self.assertContains(response, 'Write your story')
+        self.assertNotContains(response, 'Log in to Enter')
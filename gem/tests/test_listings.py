@@ -0,0 +1,109 @@
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase
+from django.test.signals import template_rendered
+from django.test.utils import CaptureQueriesContext, override_settings
+
+from gem.listings import (
+    HERO_FILTER, LIST_FILTER, clear_listings, get_cache_key)
+from molo.core.models import SiteLanguage
+from molo.core.tests.base import MoloTestCaseMixin
+from wagtail.wagtailimages.models import Image
+from wagtail.wagtailimages.tests.utils import get_test_image_file
+
+
+@override_settings(PAGE_CACHE_IGNORE_PATHS=('/',))
+class SectionListingTest(TestCase, MoloTestCaseMixin):
+
+    def setUp(self):
+        SiteLanguage.objects.create(locale='en', is_main_language=True)
+        self.mk_main()
+        self.image = Image.objects.create(
+            title='Test image', file=get_test_image_file())
+        self.section = self.mk_section(
+            self.section_index, title='Your mind', image=self.image)
+
+    def count_queries(self, url):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(queries)
+
+    def test_articles_are_listed_with_their_renditions(self):
+        self.mk_articles(self.section, count=3, image=self.image)
+        response = self.client.get(self.section.url)
+        renditions = self.image.renditions.all()
+        hero = renditions.get(filter_spec=HERO_FILTER)
+        item = renditions.get(filter_spec=LIST_FILTER)
+        self.assertContains(response, hero.url, count=1)
+        self.assertContains(response, item.url, count=2)
+        self.assertContains(response, 'Test page 0')
+
+    def test_section_view_queries(self):
+        self.mk_section(self.section, title='Subsection')
+        self.mk_articles(self.section, count=4, image=self.image)
+        self.mk_articles(self.section, count=3)
+        # create the renditions before counting
+        self.client.get(self.section.url)
+        clear_listings(self.main.get_site().pk)
+
+        with self.assertNumQueries(30):
+            self.client.get(self.section.url)
+        # the listing is read from the cache
+        with self.assertNumQueries(23):
+            self.client.get(self.section.url)
+
+    def test_out_of_range_pages_share_the_last_page(self):
+        self.mk_articles(self.section, count=7)
+        self.client.get(self.section.url + '?p=2')
+
+        rendered = []
+
+        def count_listings(sender, template, **kwargs):
+            if template.name == 'core/section_articles.html':
+                rendered.append(template)
+
+        template_rendered.connect(count_listings)
+        self.addCleanup(template_rendered.disconnect, count_listings)
+
+        response = self.client.get(self.section.url + '?p=9')
+        self.assertContains(response, 'Test page 6')
+        # the page of articles is loaded, but not rendered again
+        self.assertEqual(rendered, [])
+        site_id = self.main.get_site().pk
+        self.assertTrue(
+            cache.get(get_cache_key(site_id, self.section.pk, 2, 'en')))
+        self.assertIsNone(
+            cache.get(get_cache_key(site_id, self.section.pk, 9, 'en')))
+
+    def test_queries_do_not_grow_with_the_articles(self):
+        other = self.mk_section(
+            self.section_index, title='Your body', image=self.image)
+        self.mk_articles(self.section, count=2, image=self.image)
+        self.mk_articles(other, count=5, image=self.image)
+        # create the renditions before counting
+        self.client.get(self.section.url)
+        self.client.get(other.url)
+        clear_listings(self.main.get_site().pk)
+
+        queries = self.count_queries(self.section.url)
+        self.assertEqual(self.count_queries(other.url), queries)
+        # the listing is read from the cache
+        self.assertLess(self.count_queries(self.section.url), queries)
+
+    def test_listing_is_paginated(self):
+        self.mk_articles(self.section, count=12)
+        first = self.client.get(self.section.url)
+        self.assertContains(first, 'Test page 4')
+        self.assertNotContains(first, 'Test page 5')
+        second = self.client.get(self.section.url + '?p=2')
+        self.assertContains(second, 'Test page 5')
+        self.assertNotContains(second, 'Test page 4')
+
+    def test_publishing_clears_the_listing(self):
+        self.mk_articles(self.section, count=1)
+        self.assertNotContains(
+            self.client.get(self.section.url), 'Another article')
+        self.mk_article(self.section, title='Another article')
+        self.assertContains(
+            self.client.get(self.section.url), 'Another article')
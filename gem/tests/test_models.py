@@ -38,3 +38,41 @@ class TestModels(TestCase, MoloTestCaseMixin):
         response = self.client.get('/')
         self.assertContains(response, 'Thank You')
         self.assertContains(response, 'https://www.google.co.za/')
+
+    def test_settings_are_cached_until_saved(self):
+        default_site = Site.objects.get(is_default_site=True)
+        setting = GemSettings.for_site(default_site)
+
+        with self.assertNumQueries(0):
+            self.assertEqual(GemSettings.for_site(default_site), setting)
+
+        GemSettings.objects.filter(pk=setting.pk).update(
+            partner_credit_description="Thank You")
+        self.assertEqual(
+            GemSettings.for_site(default_site).partner_credit_description,
+            None)
+
+        GemSettings.objects.get(pk=setting.pk).save()
+        self.assertEqual(
+            GemSettings.for_site(default_site).partner_credit_description,
+            "Thank You")
+
+    def test_unsaved_changes_are_not_shared(self):
+        default_site = Site.objects.get(is_default_site=True)
+        setting = GemSettings.for_site(default_site)
+        # e.g. the settings form bound to it failing validation
+        setting.partner_credit_description = 'Not saved'
+
+        with self.assertNumQueries(0):
+            other = GemSettings.for_site(default_site)
+        self.assertIsNot(other, setting)
+        self.assertIsNone(other.partner_credit_description)
+        self.assertEqual(other.pk, setting.pk)
+        self.assertFalse(other._state.adding)
+
+    def test_settings_are_not_queried_once_warm(self):
+        default_site = Site.objects.get(is_default_site=True)
+        self.client.get('/')
+
+        with self.assertNumQueries(0):
+            GemSettings.for_site(default_site)
@@ -0,0 +1,119 @@
+from django.test import TestCase
+
+from wagtail.wagtailcore.models import Site
+
+from gem.models import GemSettings
+from gem.moderation import (
+    BannedMatcher, KeywordAutomaton, split_banned_list, get_matcher)
+from molo.core.tests.base import MoloTestCaseMixin
+
+
+class KeywordAutomatonTestCase(TestCase):
+
+    def test_search(self):
+        automaton = KeywordAutomaton(['he', 'she', 'his', 'hers'])
+        self.assertTrue(automaton.search('ushers'))
+        self.assertTrue(automaton.search('this'))
+        self.assertFalse(automaton.search('hi ser'))
+
+    def test_keyword_found_through_fallback(self):
+        automaton = KeywordAutomaton(['abcd', 'bce'])
+        self.assertTrue(automaton.search('abce'))
+        self.assertFalse(automaton.search('abcx'))
+
+    def test_keyword_inside_longer_keyword(self):
+        automaton = KeywordAutomaton(['xabcx', 'bc'])
+        self.assertTrue(automaton.search('xabd abc'))
+
+    def test_unicode_keywords(self):
+        automaton = KeywordAutomaton([u'b\xe4d'])
+        self.assertTrue(automaton.search(u'so b\xe4d'))
+        self.assertFalse(automaton.search(u'so bad'))
+
+    def test_no_keywords(self):
+        automaton = KeywordAutomaton(['', ''])
+        self.assertFalse(automaton.search('anything'))
+
+
+class BannedMatcherTestCase(TestCase):
+
+    def test_split_banned_list(self):
+        literals, patterns = split_banned_list(
+            'naughty\r\n\r\nbad word\nn[a@]sty\n(unbalanced\n')
+        self.assertEqual(literals, ['naughty', 'bad word', '(unbalanced'])
+        self.assertEqual(patterns, ['n[a@]sty'])
+
+    def test_split_empty_banned_list(self):
+        self.assertEqual(split_banned_list(None), ([], []))
+        self.assertEqual(split_banned_list(''), ([], []))
+
+    def test_literal_keywords(self):
+        matcher = BannedMatcher.from_text('naughty\nbad word')
+        self.assertTrue(matcher.search('You are NAUGHTY'))
+        self.assertTrue(matcher.search('what a bad word'))
+        self.assertFalse(matcher.search('what a bad, bad day'))
+
+    def test_patterns(self):
+        matcher = BannedMatcher.from_text('n[a@]sty\n(\\w)\\1{3}')
+        self.assertTrue(matcher.search('so n@sty'))
+        self.assertTrue(matcher.search('zzzz'))
+        self.assertFalse(matcher.search('nice'))
+
+    def test_unbalanced_pattern_is_matched_literally(self):
+        matcher = BannedMatcher.from_text('(unbalanced')
+        self.assertTrue(matcher.search('an (unbalanced comment'))
+        self.assertFalse(matcher.search('an unbalanced comment'))
+
+    def test_email_and_phone_are_always_banned(self):
+        matcher = BannedMatcher.from_text('')
+        self.assertTrue(matcher.search('test@test.com'))
+        self.assertTrue(matcher.search('0821111111'))
+        self.assertFalse(matcher.search('hello'))
+
+    def test_display_names_are_not_checked_for_email_and_phone(self):
+        settings = GemSettings(
+            site_id=1, banned_names_with_offensive_language='naughty')
+        matcher = get_matcher(
+            settings, 'banned_names_with_offensive_language')
+        self.assertTrue(matcher.search('naughty'))
+        self.assertFalse(matcher.search('test@test.com'))
+
+    def test_many_grouped_patterns(self):
+        matcher = BannedMatcher.from_text(
+            '\n'.join('(x%d)+y' % i for i in range(200)))
+        self.assertTrue(matcher.search('x199x199y'))
+        self.assertFalse(matcher.search('x200y'))
+
+
+class GemSettingsMatcherTestCase(TestCase, MoloTestCaseMixin):
+
+    def setUp(self):
+        self.mk_main()
+        self.site = Site.objects.get(is_default_site=True)
+
+    def test_matcher_is_compiled_once(self):
+        settings = GemSettings.for_site(self.site)
+        settings.banned_keywords_and_patterns = 'naughty'
+        settings.save()
+
+        matcher = get_matcher(settings, 'banned_keywords_and_patterns')
+        self.assertIs(
+            get_matcher(GemSettings.for_site(self.site),
+                        'banned_keywords_and_patterns'),
+            matcher)
+
+    def test_matcher_is_recompiled_when_settings_change(self):
+        settings = GemSettings.for_site(self.site)
+        settings.banned_keywords_and_patterns = 'naughty'
+        settings.save()
+
+        matcher = get_matcher(settings, 'banned_keywords_and_patterns')
+        self.assertTrue(matcher.search('naughty'))
+
+        settings.banned_keywords_and_patterns = 'nasty'
+        settings.save()
+
+        matcher = get_matcher(GemSettings.for_site(self.site),
+                              'banned_keywords_and_patterns')
+        self.assertFalse(matcher.search('naughty'))
+        self.assertTrue(matcher.search('nasty'))
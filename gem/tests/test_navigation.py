@@ -0,0 +1,76 @@
+from django.template import Context, Template
+from django.test import RequestFactory, TestCase
+
+from gem.navigation import get_version
+from molo.core.models import SiteLanguage, SiteSettings
+from molo.core.tests.base import MoloTestCaseMixin
+
+
+class SectionNavigationTest(TestCase, MoloTestCaseMixin):
+
+    def setUp(self):
+        self.english = SiteLanguage.objects.create(locale='en')
+        self.mk_main()
+        self.site = self.main.get_site()
+        # creating the settings clears the navigation
+        SiteSettings.for_site(self.site)
+        self.section = self.mk_section(self.section_index, title='Your mind')
+        self.template = Template(
+            '{% load gem_tags %}'
+            '{% section_navigation "core/section_nav.html" %}')
+
+    def render(self, locale='en'):
+        request = RequestFactory().get('/')
+        request.site = self.site
+        return self.template.render(Context({
+            'request': request,
+            'locale_code': locale,
+        }))
+
+    def assertCleared(self, change):
+        version = get_version(self.site.pk)
+        self.render()
+        change()
+        self.assertNotEqual(get_version(self.site.pk), version)
+
+    def test_navigation_is_rendered_once(self):
+        content = self.render()
+        self.assertIn('Your mind', content)
+        self.assertIn(self.section.url, content)
+        self.assertIn('<!-- navigation %s, rendered ' % (
+            get_version(self.site.pk)), content)
+        with self.assertNumQueries(0):
+            self.assertEqual(self.render(), content)
+
+    def test_publishing_a_section_clears_the_navigation(self):
+        self.render()
+        self.section.title = 'Your body'
+        self.section.save_revision().publish()
+        self.assertIn('Your body', self.render())
+
+    def test_moving_and_unpublishing_a_section_clear_the_navigation(self):
+        other_section = self.mk_section(self.section_index, title='Body')
+        self.assertCleared(
+            lambda: other_section.move(self.section, pos='last-child'))
+        self.assertCleared(lambda: self.section.unpublish())
+        self.assertNotIn('Your mind', self.render())
+
+    def test_translating_a_section_clears_the_navigation(self):
+        french = SiteLanguage.objects.create(locale='fr')
+        self.render(locale='fr')
+        self.assertCleared(lambda: self.mk_section_translation(
+            self.section, french, title='Ton esprit'))
+        self.assertIn('Ton esprit', self.render(locale='fr'))
+        self.assertNotIn('Ton esprit', self.render())
+
+    def test_settings_and_languages_clear_the_navigation(self):
+        self.assertCleared(
+            lambda: SiteSettings.for_site(self.site).save())
+        self.assertCleared(
+            lambda: SiteLanguage.objects.create(locale='fr'))
+
+    def test_articles_leave_the_navigation(self):
+        self.render()
+        version = get_version(self.site.pk)
+        self.mk_article(self.section)
+        self.assertEqual(get_version(self.site.pk), version)
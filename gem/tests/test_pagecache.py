@@ -0,0 +1,226 @@
+from django.contrib.auth.models import Group, User
+from django.contrib.contenttypes.models import ContentType
+from django.contrib.sites.models import Site
+from django.core.management import call_command
+from django.core.urlresolvers import reverse
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.utils import timezone
+from django.utils.six import StringIO
+
+from gem.pagecache import get_stats
+from gem.utils import parse_networks
+from molo.commenting.models import MoloComment
+from molo.core.models import SiteLanguage, SiteSettings
+from molo.core.tests.base import MoloTestCaseMixin
+from wagtail.wagtailcore.models import PageViewRestriction
+
+NOSCRIPT_SESSION_KEY = 'MOLO_GA_SESSION_FOR_NOSCRIPT'
+
+
+@override_settings(DEBUG=True)
+class PageCacheTest(TestCase, MoloTestCaseMixin):
+
+    def setUp(self):
+        SiteLanguage.objects.create(locale='en')
+        self.mk_main()
+        self.section = self.mk_section(self.section_index, title='Your mind')
+        self.article = self.mk_article(self.section, title='Article 1')
+
+    def get(self, path='/', **extra):
+        return self.client.get(path, **extra)
+
+    def test_pages_are_served_from_the_cache(self):
+        response = self.get()
+        self.assertEqual(response['X-Page-Cache'], 'miss')
+        with CaptureQueriesContext(connection) as queries:
+            cached = self.get()
+        self.assertEqual(cached['X-Page-Cache'], 'hit')
+        self.assertEqual(cached.content, response.content)
+        self.assertFalse([
+            query for query in queries.captured_queries
+            if 'wagtailcore_page' in query['sql']])
+        self.assertEqual(get_stats(), {'hits': 1, 'misses': 1})
+
+        out = StringIO()
+        call_command('page_cache_stats', stdout=out)
+        self.assertIn('hit rate: 50.0%', out.getvalue())
+
+    def test_pages_vary_by_host_language_and_layout(self):
+        self.get()
+        self.assertEqual(self.get()['X-Page-Cache'], 'hit')
+        self.assertEqual(
+            self.get('/?=layout2')['X-Page-Cache'], 'miss')
+        self.assertEqual(
+            self.get(HTTP_HOST='127.0.0.1')['X-Page-Cache'], 'miss')
+
+        SiteLanguage.objects.create(locale='fr')
+        self.client.get('/locale/fr/')
+        self.assertEqual(self.get()['X-Page-Cache'], 'miss')
+        self.assertEqual(self.get()['X-Page-Cache'], 'hit')
+
+    def test_publishing_unpublishing_and_moving_clear_the_cache(self):
+        path = self.article.url
+        self.get(path)
+        self.assertEqual(self.get(path)['X-Page-Cache'], 'hit')
+
+        self.article.title = 'Article 2'
+        self.article.save_revision().publish()
+        response = self.get(path)
+        self.assertEqual(response['X-Page-Cache'], 'miss')
+        self.assertContains(response, 'Article 2')
+
+        other_section = self.mk_section(self.section_index, title='Body')
+        self.get('/')
+        self.article.move(other_section, pos='last-child')
+        self.assertEqual(self.get('/')['X-Page-Cache'], 'miss')
+
+        self.article.specific.unpublish()
+        self.assertEqual(self.get('/')['X-Page-Cache'], 'miss')
+
+    def test_saving_a_draft_keeps_the_cache(self):
+        self.get()
+        self.article.title = 'Article 2'
+        self.article.save_revision()
+        self.assertEqual(self.get()['X-Page-Cache'], 'hit')
+
+    def test_comments_clear_only_their_pages(self):
+        paths = [
+            self.article.url,
+            self.article.url + '?p=2',
+            reverse('molo.commenting:more-comments', args=[self.article.pk]),
+        ]
+        for path in paths + ['/']:
+            self.get(path)
+
+        comment = MoloComment.objects.create(
+            content_type=ContentType.objects.get_for_model(self.article),
+            object_pk=self.article.pk, site=Site.objects.get_current(),
+            comment='a comment', submit_date=timezone.now())
+        for path in paths:
+            self.assertEqual(self.get(path)['X-Page-Cache'], 'miss')
+        self.assertEqual(self.get()['X-Page-Cache'], 'hit')
+
+        comment.delete()
+        self.assertEqual(self.get(paths[0])['X-Page-Cache'], 'miss')
+        self.assertEqual(self.get()['X-Page-Cache'], 'hit')
+
+    def test_settings_changes_clear_the_cache(self):
+        self.get()
+        SiteSettings.for_site(self.main.get_site()).save()
+        self.assertEqual(self.get()['X-Page-Cache'], 'miss')
+
+    def test_password_restricted_pages_are_not_cached(self):
+        path = self.article.url
+        self.get(path)
+        self.assertEqual(self.get(path)['X-Page-Cache'], 'hit')
+
+        restriction = PageViewRestriction.objects.create(
+            page=self.article, restriction_type='password', password='secret')
+        self.assertContains(self.get(path), 'name="password"')
+        self.client.post(
+            reverse('wagtailcore_authenticate_with_password',
+                    args=[restriction.pk, self.article.pk]),
+            {'password': 'secret', 'return_url': path})
+        response = self.get(path)
+        self.assertNotContains(response, 'name="password"')
+        self.assertEqual(self.get(path)['X-Page-Cache'], 'miss')
+
+        # other readers still need the password
+        response = self.client_class().get(path)
+        self.assertEqual(response['X-Page-Cache'], 'miss')
+        self.assertContains(response, 'name="password"')
+
+    def test_logged_in_readers_have_their_own_pages(self):
+        self.get()
+        User.objects.create_user(username='tester', password='tester')
+        self.client.login(username='tester', password='tester')
+        self.assertEqual(self.get()['X-Page-Cache'], 'miss')
+        response = self.get()
+        self.assertEqual(response['X-Page-Cache'], 'hit')
+        self.assertContains(
+            response, reverse('molo.profiles:view_my_profile'))
+        self.assertContains(response, reverse('molo.profiles:auth_logout'))
+
+    def test_group_restricted_pages_are_not_cached(self):
+        path = self.article.url
+        group = Group.objects.create(name='Members')
+        User.objects.create_user(
+            username='member', password='member').groups.add(group)
+        User.objects.create_user(username='other', password='other')
+        restriction = PageViewRestriction.objects.create(
+            page=self.article, restriction_type='groups')
+        restriction.groups.add(group)
+
+        self.client.login(username='member', password='member')
+        self.assertContains(self.get(path), 'Article 1')
+        response = self.get(path)
+        self.assertEqual(response['X-Page-Cache'], 'miss')
+        self.assertContains(response, 'Your mind')
+
+        other = self.client_class()
+        other.login(username='other', password='other')
+        response = other.get(path)
+        self.assertEqual(response['X-Page-Cache'], 'miss')
+        self.assertEqual(response.status_code, 302)
+
+    def test_views_other_than_pages_are_not_cached_for_logged_in_readers(
+            self):
+        User.objects.create_user(username='tester', password='tester')
+        self.client.login(username='tester', password='tester')
+        path = reverse('molo.profiles:view_my_profile')
+        self.get(path)
+        self.assertEqual(self.get(path)['X-Page-Cache'], 'miss')
+
+    def test_admin_is_not_cached(self):
+        response = self.get('/admin/login/')
+        self.assertFalse(response.has_header('X-Page-Cache'))
+
+    @override_settings(
+        FREE_BASICS_PROXY_NETWORKS=parse_networks(['127.0.0.1']))
+    def test_readers_get_their_own_noscript_session(self):
+        site_settings = SiteSettings.for_site(self.main.get_site())
+        site_settings.ga_tag_manager = 'GTM-XXXX'
+        site_settings.save()
+
+        response = self.get()
+        self.assertEqual(response['X-Page-Cache'], 'miss')
+        session_id = self.client.session[NOSCRIPT_SESSION_KEY]
+        self.assertContains(response, 'client_session_id=%s' % session_id)
+        self.assertNotContains(response, 'freebasics_uip')
+
+        self.client.cookies.clear()
+        response = self.get(HTTP_X_IORG_FBS_UIP='10.0.0.1')
+        self.assertEqual(response['X-Page-Cache'], 'hit')
+        self.assertContains(response, 'freebasics_uip=10.0.0.1')
+        response = self.get(HTTP_X_IORG_FBS_UIP='10.0.0.2')
+        self.assertEqual(response['X-Page-Cache'], 'hit')
+        self.assertContains(response, 'freebasics_uip=10.0.0.2')
+        self.assertNotContains(response, '10.0.0.1')
+        other_session_id = self.client.session[NOSCRIPT_SESSION_KEY]
+        self.assertNotEqual(other_session_id, session_id)
+        self.assertContains(
+            response, 'client_session_id=%s' % other_session_id)
+        self.assertNotContains(response, session_id)
+
+    def test_free_basics_ip_is_only_trusted_from_its_proxies(self):
+        site_settings = SiteSettings.for_site(self.main.get_site())
+        site_settings.ga_tag_manager = 'GTM-XXXX'
+        site_settings.save()
+
+        response = self.get(HTTP_X_IORG_FBS_UIP='10.0.0.1')
+        self.assertNotContains(response, '10.0.0.1')
+
+        self.client.cookies.clear()
+        with self.settings(
+                FREE_BASICS_PROXY_NETWORKS=parse_networks(['127.0.0.1'])):
+            response = self.get('/?page', HTTP_X_IORG_FBS_UIP='Your mind')
+            self.assertEqual(response['X-Page-Cache'], 'miss')
+            self.assertNotContains(response, 'freebasics_uip')
+
+            # content sent in the header never makes it into the cached page
+            response = self.get('/?page', HTTP_X_IORG_FBS_UIP='10.0.0.3')
+            self.assertEqual(response['X-Page-Cache'], 'hit')
+            self.assertContains(response, 'freebasics_uip=10.0.0.3')
+            self.assertContains(response, 'Your mind')
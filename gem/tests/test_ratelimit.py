@@ -0,0 +1,118 @@
+import time
+
+from django.core.cache import cache
+from django.test import TestCase, RequestFactory
+from django.test.utils import override_settings
+
+from gem.ratelimit import AttemptLimiter, get_client_ip
+from gem.utils import in_networks, parse_networks
+
+
+class AttemptLimiterTest(TestCase):
+
+    def test_attempts_are_limited_per_key(self):
+        limiter = AttemptLimiter('test', 2, window=60)
+
+        limiter.add_attempt('tester', '10.0.0.1')
+        self.assertFalse(limiter.is_limited('tester'))
+        limiter.add_attempt('tester')
+
+        self.assertTrue(limiter.is_limited('tester'))
+        self.assertTrue(limiter.is_limited('other', 'tester'))
+        self.assertFalse(limiter.is_limited('10.0.0.1'))
+
+    def test_attempts_expire_with_the_window(self):
+        limiter = AttemptLimiter('test', 2, window=0.5)
+
+        limiter.add_attempt('tester')
+        limiter.add_attempt('tester')
+        self.assertTrue(limiter.is_limited('tester'))
+
+        time.sleep(1)
+
+        self.assertFalse(limiter.is_limited('tester'))
+
+    def test_attempts_are_counted_in_the_cache(self):
+        limiter = AttemptLimiter('test', 3, window=60)
+        limiter.add_attempt('tester')
+        limiter.add_attempt('tester')
+        bucket = limiter.get_buckets()[-1]
+        self.assertEqual(
+            cache.get(limiter.get_cache_key('tester', bucket)), 2)
+        self.assertFalse(limiter.is_limited('tester'))
+        limiter.add_attempt('tester')
+        self.assertTrue(limiter.is_limited('tester'))
+
+    def test_bursts_across_windows_are_limited(self):
+        limiter = AttemptLimiter('test', 4, window=60)
+        limiter.clock = lambda: 6000 + 59
+        for _ in range(4):
+            limiter.add_attempt('tester')
+
+        # a fixed window would have started again a second later
+        limiter.clock = lambda: 6000 + 61
+        self.assertTrue(limiter.is_limited('tester'))
+
+        # the attempts are forgotten within a window and a tenth
+        limiter.clock = lambda: 6000 + 59 + 60
+        self.assertTrue(limiter.is_limited('tester'))
+        limiter.clock = lambda: 6000 + 59 + 66
+        self.assertFalse(limiter.is_limited('tester'))
+
+    @override_settings(SESSION_COOKIE_AGE=1234)
+    def test_window_defaults_to_session_cookie_age(self):
+        self.assertEqual(AttemptLimiter('test', 2).window, 1234)
+
+    @override_settings(
+        FREE_BASICS_PROXY_NETWORKS=parse_networks(['10.1.0.0/16']))
+    def test_get_client_ip(self):
+        factory = RequestFactory()
+
+        request = factory.get('/', REMOTE_ADDR='10.0.0.1')
+        self.assertEqual(get_client_ip(request), '10.0.0.1')
+
+        # only the address our proxy appended is trusted
+        request = factory.get(
+            '/', REMOTE_ADDR='10.0.0.1',
+            HTTP_X_FORWARDED_FOR='10.0.0.9, 10.0.0.2')
+        self.assertEqual(get_client_ip(request), '10.0.0.2')
+
+        # the Free Basics user IP is trusted from its proxies
+        request = factory.get(
+            '/', REMOTE_ADDR='10.0.0.1',
+            HTTP_X_FORWARDED_FOR='10.1.2.3',
+            HTTP_X_IORG_FBS_UIP='10.0.0.3')
+        self.assertEqual(get_client_ip(request), '10.0.0.3')
+
+        # but only if it is an address
+        request = factory.get(
+            '/', REMOTE_ADDR='10.0.0.1',
+            HTTP_X_FORWARDED_FOR='10.1.2.3',
+            HTTP_X_IORG_FBS_UIP='<b>10.0.0.3</b>')
+        self.assertEqual(get_client_ip(request), '10.1.2.3')
+
+        # and ignored from anyone else
+        request = factory.get(
+            '/', REMOTE_ADDR='10.0.0.1',
+            HTTP_X_FORWARDED_FOR='10.0.0.2',
+            HTTP_X_IORG_FBS_UIP='10.0.0.3')
+        self.assertEqual(get_client_ip(request), '10.0.0.2')
+        request = factory.get(
+            '/', REMOTE_ADDR='10.0.0.1', HTTP_X_IORG_FBS_UIP='10.0.0.3')
+        self.assertEqual(get_client_ip(request), '10.0.0.1')
+
+    def test_in_networks(self):
+        networks = parse_networks(
+            ['10.1.0.0/16', '192.168.0.1', '2001:db8::/32'])
+        self.assertTrue(in_networks('10.1.200.3', networks))
+        self.assertTrue(in_networks('192.168.0.1', networks))
+        self.assertTrue(in_networks('2001:db8::1', networks))
+        self.assertFalse(in_networks('10.2.0.1', networks))
+        self.assertFalse(in_networks('192.168.0.2', networks))
+        self.assertFalse(in_networks('2001:db9::1', networks))
+        self.assertFalse(in_networks('not an address', networks))
+
+    def test_invalid_networks_are_rejected(self):
+        for network in ['10.1.0.0/33', '10.1.0.0/', '10.1.0/16', 'proxy']:
+            with self.assertRaises(ValueError):
+                parse_networks([network])
@@ -0,0 +1,95 @@
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils.six import StringIO
+
+from gem.models import GemUserProfile, GemUserRollup
+from gem.registration import bulk_create_users
+from molo.core.tests.base import MoloTestCaseMixin
+from molo.profiles.models import UserProfile
+
+
+def get_rollups():
+    return sorted(
+        (rollup.date, rollup.site_id, rollup.language, rollup.gender,
+         rollup.count)
+        for rollup in GemUserRollup.objects.filter(count__gt=0))
+
+
+class BulkCreateUsersTest(TestCase, MoloTestCaseMixin):
+
+    def setUp(self):
+        self.mk_main()
+
+    def users(self, start, stop):
+        password = make_password('1234')
+        return (
+            {'username': 'user%s' % i, 'password': password,
+             'alias': 'Alias %s' % i, 'gender': 'fm'[i % 2],
+             'language': 'en'}
+            for i in range(start, stop))
+
+    def test_users_are_created_with_their_profiles(self):
+        answer = make_password('cat', hasher='gem_answer_pbkdf2_sha256')
+        created = bulk_create_users([{
+            'username': 'tester',
+            'password': make_password('1234'),
+            'alias': 'Tester',
+            'mobile_number': '+27821234567',
+            'gender': 'f',
+            'security_question_1_answer': answer,
+            'security_question_2_answer': answer,
+            'site': self.main.get_site(),
+            'language': 'en',
+        }])
+
+        self.assertEqual(created, 1)
+        user = User.objects.get(username='tester')
+        self.assertTrue(user.check_password('1234'))
+        self.assertEqual(user.profile.alias, 'Tester')
+        self.assertEqual(user.profile.mobile_number, '+27821234567')
+        self.assertEqual(user.gem_profile.gender, 'f')
+        self.assertEqual(user.gem_profile.site, self.main.get_site())
+        self.assertTrue(user.gem_profile.check_security_question_1_answer(
+            ' Cat '))
+
+    def test_queries_are_per_batch(self):
+        # the first batch creates the rollups the others add to
+        bulk_create_users(self.users(0, 10), batch_size=10)
+        with CaptureQueriesContext(connection) as queries:
+            bulk_create_users(self.users(10, 20), batch_size=5)
+        with CaptureQueriesContext(connection) as more_queries:
+            bulk_create_users(self.users(20, 50), batch_size=5)
+        self.assertEqual(User.objects.count(), 50)
+        self.assertEqual(UserProfile.objects.count(), 50)
+        self.assertEqual(GemUserProfile.objects.count(), 50)
+        self.assertEqual(
+            len(more_queries.captured_queries),
+            3 * len(queries.captured_queries))
+
+    def test_rollups_are_kept(self):
+        bulk_create_users(self.users(0, 25), batch_size=10)
+        rollups = get_rollups()
+        self.assertEqual(sum(rollup[-1] for rollup in rollups), 25)
+        GemUserRollup.rebuild()
+        self.assertEqual(get_rollups(), rollups)
+
+    def test_provision_users_command(self):
+        out = StringIO()
+        call_command(
+            'provision_users', '7', prefix='loadtest', batch_size=3,
+            site_id=self.main.get_site().pk, language='en', stdout=out)
+
+        self.assertIn('Created 7 users', out.getvalue())
+        users = User.objects.filter(username__startswith='loadtest')
+        self.assertEqual(users.count(), 7)
+        user = users.get(username='loadtest0')
+        self.assertTrue(user.check_password('1234'))
+        self.assertTrue(user.gem_profile.check_security_question_2_answer(
+            'answer'))
+        self.assertEqual(
+            sum(rollup[-1] for rollup in get_rollups()
+                if rollup[1] == self.main.get_site().pk), 7)
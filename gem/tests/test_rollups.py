@@ -0,0 +1,155 @@
+from datetime import timedelta
+
+from django.contrib.auth.models import Permission, User
+from django.contrib.contenttypes.models import ContentType
+from django.core.urlresolvers import reverse
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from gem.models import GemUserProfile, GemUserRollup
+from gem.registration import create_user
+from gem.tasks import reconcile_user_rollups
+from molo.core.tests.base import MoloTestCaseMixin
+
+
+def get_rollups():
+    return sorted(
+        (rollup.date, rollup.site_id, rollup.language, rollup.gender,
+         rollup.count)
+        for rollup in GemUserRollup.objects.filter(count__gt=0))
+
+
+class GemUserRollupTest(TestCase, MoloTestCaseMixin):
+
+    def setUp(self):
+        self.mk_main()
+        self.today = timezone.localtime(timezone.now()).date()
+
+    def test_registration_is_counted(self):
+        self.client.post(reverse('user_register'), {
+            'username': 'tester',
+            'password': '1234',
+            'alias': 'tester',
+            'gender': 'f',
+            'security_question_1_answer': 'cat',
+            'security_question_2_answer': 'dog',
+            'terms_and_conditions': 'on',
+        })
+        self.assertEqual(get_rollups(), [
+            (self.today, self.main.get_site().pk, 'en', 'f', 1)])
+
+    def test_profile_changes_move_the_count(self):
+        user = create_user('tester', '1234', gender='f', language='en')
+        create_user('tester2', '1234', gender='f', language='en')
+
+        profile = GemUserProfile.objects.get(user=user)
+        profile.gender = 'm'
+        profile.save()
+        self.assertEqual(get_rollups(), [
+            (self.today, GemUserRollup.NO_SITE, 'en', 'f', 1),
+            (self.today, GemUserRollup.NO_SITE, 'en', 'm', 1)])
+
+        user.delete()
+        self.assertEqual(get_rollups(), [
+            (self.today, GemUserRollup.NO_SITE, 'en', 'f', 1)])
+
+    def test_profiles_without_a_site_share_a_row(self):
+        create_user('tester', '1234', gender='f', language='en')
+        create_user('tester2', '1234', gender='f', language='en')
+        self.assertEqual(GemUserRollup.objects.count(), 1)
+        self.assertEqual(get_rollups(), [
+            (self.today, GemUserRollup.NO_SITE, 'en', 'f', 2)])
+
+    def test_deferred_profile_fields_are_not_fetched(self):
+        create_user('tester', '1234', gender='f', language='en')
+        with self.assertNumQueries(1):
+            profiles = list(GemUserProfile.objects.only(
+                'pk', 'security_question_1_answer'))
+        self.assertEqual(len(profiles), 1)
+
+        # saving fields the rollups don't count doesn't read them either
+        with self.assertNumQueries(1):
+            profiles[0].save(update_fields=['security_question_1_answer'])
+
+    def test_reconcile_recounts_the_profiles(self):
+        create_user('tester', '1234', gender='f', language='en')
+        user = create_user('tester2', '1234', gender='m', language='en')
+        User.objects.filter(pk=user.pk).update(
+            date_joined=timezone.now() - timedelta(days=1))
+        # changes without signals are only picked up by the reconciliation
+        GemUserProfile.objects.filter(user=user).update(gender='-')
+        GemUserRollup.objects.create(
+            date=self.today - timedelta(days=3), language='en', gender='m',
+            count=5)
+
+        reconcile_user_rollups()
+        self.assertEqual(get_rollups(), [
+            (self.today - timedelta(days=1), GemUserRollup.NO_SITE, 'en',
+             '-', 1),
+            (self.today, GemUserRollup.NO_SITE, 'en', 'f', 1)])
+        self.assertFalse(GemUserRollup.objects.filter(count=0).exists())
+
+    def test_reconcile_keeps_correct_rollups(self):
+        create_user('tester', '1234', gender='f', language='en')
+        rollup = GemUserRollup.objects.get()
+
+        reconcile_user_rollups()
+        self.assertEqual(GemUserRollup.objects.get().pk, rollup.pk)
+        self.assertEqual(get_rollups(), [
+            (self.today, GemUserRollup.NO_SITE, 'en', 'f', 1)])
+
+    def test_summary_view_counts_other_genders_as_unknown(self):
+        User.objects.create_superuser(
+            username='superuser', email='admin@example.com', password='0000')
+        self.client.login(username='superuser', password='0000')
+        GemUserRollup.objects.create(
+            date=self.today, site_id=self.main.get_site().pk, language='en',
+            gender='x', count=2)
+
+        response = self.client.get(reverse('user_rollups'))
+        self.assertEqual(response.context['rows'], [
+            (self.today, None, [0, 0, 0, 1], 1),
+            (self.today, 'localhost', [0, 0, 0, 2], 2)])
+
+    def test_summary_view(self):
+        User.objects.create_superuser(
+            username='superuser', email='admin@example.com', password='0000')
+        self.client.login(username='superuser', password='0000')
+        for i in range(5):
+            create_user('tester%s' % i, '1234', gender='fm'[i % 2],
+                        site=self.main.get_site(), language='en')
+
+        # warm up the caches of the first admin request
+        self.client.get(reverse('user_rollups'))
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('user_rollups'))
+        self.assertContains(response, 'Users by gender per day per site')
+        self.assertEqual(response.context['rows'], [
+            (self.today, None, [0, 0, 0, 1], 1),
+            (self.today, 'localhost', [0, 3, 2, 0], 5)])
+
+        # the summary is read from the rollups, not the users
+        for i in range(5, 50):
+            create_user('tester%s' % i, '1234', gender='f',
+                        site=self.main.get_site(), language='en')
+        with CaptureQueriesContext(connection) as more_queries:
+            self.client.get(reverse('user_rollups'))
+        self.assertEqual(
+            len(queries.captured_queries),
+            len(more_queries.captured_queries))
+        self.assertFalse([
+            query for query in more_queries.captured_queries
+            if 'gem_gemuserprofile' in query['sql']])
+
+    def test_summary_view_requires_permission(self):
+        editor = User.objects.create_user(
+            username='editor', password='0000', is_staff=True)
+        editor.user_permissions.add(Permission.objects.get_or_create(
+            content_type=ContentType.objects.get_or_create(
+                app_label='wagtailadmin', model='admin')[0],
+            codename='access_admin')[0])
+        self.client.login(username='editor', password='0000')
+        response = self.client.get(reverse('user_rollups'))
+        self.assertEqual(response.status_code, 403)
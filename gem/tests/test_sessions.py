@@ -1,15 +1,18 @@
 import time
 
 from django.contrib.auth.models import User
+from django.contrib.sessions.models import Session
 from django.test import TestCase, Client
 from django.test.utils import override_settings
+from gem.sessions import SessionStore
+from gem.tasks import save_session
 from molo.core.tests.base import MoloTestCaseMixin
 
 
 @override_settings(SESSION_COOKIE_AGE=1)
 class GemAutomaticLogoutTest(TestCase, MoloTestCaseMixin):
     """
-    Note that SESSION_SAVE_EVERY_REQUEST must = True for this to work
+    Note that SlidingSessionMiddleware must be installed for this to work
     """
     def setUp(self):
         self.client = Client()
@@ -67,3 +70,76 @@ class GemAutomaticLogoutTest(TestCase, MoloTestCaseMixin):
 
         self.assertContains(response, 'Hello tester')
         self.assertContains(response, 'log out')
+
+
+class SlidingSessionMiddlewareTest(TestCase, MoloTestCaseMixin):
+
+    def setUp(self):
+        self.client = Client()
+        self.mk_main()
+
+        User.objects.create_user(username='tester', password='tester')
+        self.client.login(username='tester', password='tester')
+        self.client.get('/profiles/view/myprofile/')
+
+    def get_expire_date(self):
+        session_key = self.client.session.session_key
+        return Session.objects.get(session_key=session_key).expire_date
+
+    def test_unmodified_session_is_not_saved_within_refresh_threshold(self):
+        expire_date = self.get_expire_date()
+
+        self.client.get('/profiles/view/myprofile/')
+
+        self.assertEqual(self.get_expire_date(), expire_date)
+
+    @override_settings(SESSION_REFRESH_RATIO=0)
+    def test_unmodified_session_is_saved_after_refresh_threshold(self):
+        expire_date = self.get_expire_date()
+
+        self.client.get('/profiles/view/myprofile/')
+
+        self.assertGreater(self.get_expire_date(), expire_date)
+
+
+class WriteBehindSessionStoreTest(TestCase):
+
+    def test_changes_are_written_to_the_database(self):
+        session = SessionStore()
+        session['answer'] = 'a'
+        session.save()
+
+        session['answer'] = 'b'
+        session.save()
+
+        stored = Session.objects.get(session_key=session.session_key)
+        self.assertEqual(stored.get_decoded()['answer'], 'b')
+        self.assertEqual(
+            SessionStore(session.session_key)['answer'], 'b')
+
+    def test_deleted_sessions_are_not_written_again(self):
+        session = SessionStore()
+        session['answer'] = 'a'
+        session.save()
+        session.delete()
+
+        session['answer'] = 'b'
+        session.save()
+
+        self.assertFalse(Session.objects.exists())
+        self.assertIsNone(SessionStore(session.session_key).get('answer'))
+
+    def test_older_writes_are_dropped(self):
+        session = SessionStore()
+        session['answer'] = 'a'
+        session.save()
+        # versions start with the first write after the session is created
+        session.save()
+        session.save()
+        older = session.encode(dict(session.items(), _session_version=1))
+
+        # the first write's task runs after the second one
+        save_session(session.session_key, older, 600, 1)
+
+        stored = Session.objects.get(session_key=session.session_key)
+        self.assertEqual(stored.get_decoded()['_session_version'], 2)
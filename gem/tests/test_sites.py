@@ -0,0 +1,93 @@
+from django.contrib.auth.models import Group, User
+from django.core.urlresolvers import reverse
+from django.test import TestCase, RequestFactory
+
+from wagtail.wagtailcore.models import Site
+
+from gem.middleware import CachedSiteMiddleware
+from gem.models import GemSettings
+from gem.sites import find_site, get_default_site, get_site_for_page
+from molo.core.tests.base import MoloTestCaseMixin
+
+
+class SiteResolutionTestCase(TestCase, MoloTestCaseMixin):
+
+    def setUp(self):
+        self.mk_main()
+        self.factory = RequestFactory()
+        self.other_site = Site.objects.create(
+            hostname='ninyampinga.com', port=80, root_page=self.main)
+
+    def test_find_site(self):
+        self.assertEqual(find_site('ninyampinga.com', '80'), self.other_site)
+        self.assertEqual(find_site('ninyampinga.com', 8000), self.other_site)
+        self.assertEqual(find_site('localhost', 80), self.site)
+        self.assertEqual(find_site('cewekeren.com', 80), self.site)
+
+    def test_find_site_without_default_site(self):
+        self.site.is_default_site = False
+        self.site.save()
+
+        self.assertEqual(find_site('ninyampinga.com', 80), self.other_site)
+        with self.assertRaises(Site.DoesNotExist):
+            find_site('cewekeren.com', 80)
+
+    def test_sites_are_reloaded_when_saved(self):
+        self.assertEqual(get_default_site(), self.site)
+
+        self.site.is_default_site = False
+        self.site.save()
+        self.other_site.is_default_site = True
+        self.other_site.save()
+
+        self.assertEqual(get_default_site(), self.other_site)
+
+        self.other_site.delete()
+        self.assertEqual(get_default_site(), None)
+
+    def test_sites_are_reloaded_when_a_root_page_is_published(self):
+        self.main.slug = 'home'
+        self.main.save_revision().publish()
+        self.assertEqual(get_default_site().root_page.slug, 'home')
+
+    def test_other_saves_do_not_reload_the_sites(self):
+        get_default_site()
+        with self.assertNumQueries(1):
+            Group.objects.create(name='Testers')
+        with self.assertNumQueries(0):
+            get_default_site()
+
+    def test_site_for_page(self):
+        section = self.mk_section(self.section_index, title='Your mind')
+        self.assertEqual(get_site_for_page(section), self.site)
+
+    def test_middleware_makes_no_queries_once_warm(self):
+        middleware = CachedSiteMiddleware()
+        request = self.factory.get('/', HTTP_HOST='ninyampinga.com')
+        middleware.process_request(request)
+
+        request = self.factory.get('/', HTTP_HOST='ninyampinga.com')
+        with self.assertNumQueries(0):
+            middleware.process_request(request)
+        self.assertEqual(request.site, self.other_site)
+
+    def test_display_name_is_validated_against_request_site(self):
+        GemSettings.objects.create(
+            site=self.other_site,
+            banned_names_with_offensive_language='naughty')
+        User.objects.create_user(username='tester', password='tester')
+        self.client.login(username='tester', password='tester')
+
+        expected_validation_message = 'Sorry, the name you have used is not ' \
+                                      'allowed.'
+
+        response = self.client.post(reverse('edit_my_profile'), {
+            'alias': 'naughty'
+        })
+        self.assertRedirects(
+            response, reverse('molo.profiles:view_my_profile'))
+
+        response = self.client.post(reverse('edit_my_profile'), {
+            'alias': 'naughty'
+        }, HTTP_HOST='ninyampinga.com')
+        self.assertContains(response, expected_validation_message)
@@ -1,3 +1,4 @@
+import re
 import time
 from datetime import datetime
 
@@ -7,17 +8,22 @@ from django.contrib.auth.tokens import default_token_generator
 from django.contrib.contenttypes.models import ContentType
 from django.contrib.sites.models import Site
 from django.core.urlresolvers import reverse
+from django.db import connection
 from django.http import QueryDict
-from django.test import TestCase, Client
-from django.test.utils import override_settings
+from django.test import TestCase, Client, RequestFactory
+from django.test.signals import template_rendered
+from django.test.utils import override_settings, CaptureQueriesContext
 
 from gem.forms import GemRegistrationForm, GemEditProfileForm
 from gem.models import GemSettings, GemCommentReport
+from gem.utils import parse_networks
+from gem.views import GemRssFeed
 
 from molo.commenting.forms import MoloCommentForm
+from django_comments.models import CommentFlag
 from molo.commenting.models import MoloComment
 from molo.core.tests.base import MoloTestCaseMixin
-from molo.core.models import SiteLanguage
+from molo.core.models import ArticlePage, SectionPage, SiteLanguage
 
 
 class GemRegistrationViewTest(TestCase, MoloTestCaseMixin):
@@ -49,6 +55,48 @@ class GemRegistrationViewTest(TestCase, MoloTestCaseMixin):
             ['This field is required.']
         )
 
+    def post_registration(self):
+        return self.client.post(reverse('user_register'), {
+            'username': 'tester',
+            'password': '1234',
+            'alias': 'Tess',
+            'gender': 'f',
+            'security_question_1_answer': 'cat',
+            'security_question_2_answer': 'dog',
+            'terms_and_conditions': 'on',
+            'next': '/',
+        })
+
+    def test_successful_registration(self):
+        response = self.post_registration()
+
+        self.assertRedirects(response, '/')
+        user = User.objects.get(username='tester')
+        self.assertEqual(int(self.client.session['_auth_user_id']), user.pk)
+        self.assertTrue(user.check_password('1234'))
+        self.assertEqual(user.profile.alias, 'Tess')
+        self.assertEqual(user.gem_profile.gender, 'f')
+        self.assertTrue(user.gem_profile.check_security_question_1_answer(
+            'cat'))
+        self.assertTrue(user.gem_profile.check_security_question_2_answer(
+            'dog'))
+
+    def test_registration_writes_each_profile_once(self):
+        with CaptureQueriesContext(connection) as queries:
+            self.post_registration()
+
+        def writes(table):
+            return [
+                query['sql'] for query in queries.captured_queries
+                if table in query['sql'] and
+                not query['sql'].startswith('SELECT')]
+
+        self.assertEqual(len(writes('"gem_gemuserprofile"')), 1)
+        # molo's handler tries an UPDATE before inserting the profile
+        self.assertEqual(len(writes('"profiles_userprofile"')), 2)
+        # the user is inserted, and last_login set when logging in
+        self.assertEqual(len(writes('"auth_user"')), 2)
+
     def test_email_or_phone_not_allowed_in_username(self):
         response = self.client.post(reverse('user_register'), {
             'username': 'tester@test.com',
@@ -199,6 +247,44 @@ class GemResetPasswordTest(TestCase, MoloTestCaseMixin):
         self.assertContains(response, 'Too many attempts. Please try again '
                                       'later.')
 
+    def test_attempts_are_limited_without_the_session_cookie(self):
+        for x in range(5):
+            self.post_invalid_answer_to_forgot_password_view()
+
+        client = Client()
+        client.get(reverse('forgot_password'))
+        response = client.post(reverse('forgot_password'), {
+            'username': self.user.username,
+            'random_security_question_answer': 'dog'
+        })
+
+        self.assertContains(response, 'Too many attempts. Please try again '
+                                      'later.')
+
+    @override_settings(
+        FREE_BASICS_PROXY_NETWORKS=parse_networks(['127.0.0.1']))
+    def test_attempts_are_limited_per_client_ip(self):
+        for x in range(settings.FORGOT_PASSWORD_IP_ATTEMPTS):
+            self.client.post(reverse('forgot_password'), {
+                'username': 'invalid%s' % x,
+                'random_security_question_answer': 'something'
+            }, HTTP_X_IORG_FBS_UIP='10.0.0.1')
+
+        response = self.client.post(reverse('forgot_password'), {
+            'username': 'invalid',
+            'random_security_question_answer': 'something'
+        }, HTTP_X_IORG_FBS_UIP='10.0.0.1')
+        self.assertContains(response, 'Too many attempts. Please try again '
+                                      'later.')
+
+        # another Free Basics user behind the same proxy
+        response = self.client.post(reverse('forgot_password'), {
+            'username': 'invalid',
+            'random_security_question_answer': 'something'
+        }, HTTP_X_IORG_FBS_UIP='10.0.0.2')
+        self.assertContains(response, 'The username that you entered appears '
+                                      'to be invalid. Please try again.')
+
     def get_expected_token_and_redirect_url(self):
         expected_token = default_token_generator.make_token(self.user)
         expected_query_params = QueryDict(mutable=True)
@@ -308,7 +394,8 @@ class GemResetPasswordTest(TestCase, MoloTestCaseMixin):
     def test_session_expiration_allows_subsequent_attempts(self):
         self.test_unsuccessful_username_attempts()
 
-        time.sleep(1)
+        # the attempts are forgotten within a window and a tenth
+        time.sleep(1.2)
 
         response = self.client.post(reverse('forgot_password'), {
             'username': 'invalid',
@@ -450,6 +537,171 @@ class GemFeedViewsTest(TestCase, MoloTestCaseMixin):
         self.assertContains(response, self.article_page.subtitle)
         self.assertNotContains(response, 'example.com')
 
+    def test_feed_is_cached_until_a_page_is_published(self):
+        self.client.get(reverse('feed_rss'))
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('feed_rss'))
+        self.assertContains(response, self.article_page.title)
+        self.assertFalse([
+            query for query in queries.captured_queries
+            if 'wagtailcore_page' in query['sql']])
+
+        # changed without being published
+        ArticlePage.objects.filter(pk=self.article_page.pk).update(
+            title='Renamed Article')
+        response = self.client.get(reverse('feed_rss'))
+        self.assertNotContains(response, 'Renamed Article')
+
+        article = self.mk_article(
+            self.article_page.get_parent(), title='Another Article')
+        response = self.client.get(reverse('feed_rss'))
+        self.assertContains(response, 'Renamed Article')
+        self.assertContains(response, 'http://testserver' + article.url)
+
+    def test_feed_conditional_get(self):
+        response = self.client.get(reverse('feed_atom'))
+        etag = response['ETag']
+        last_modified = response['Last-Modified']
+
+        response = self.client.get(
+            reverse('feed_atom'), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.content, '')
+        response = self.client.get(
+            reverse('feed_atom'), HTTP_IF_MODIFIED_SINCE=last_modified)
+        self.assertEqual(response.status_code, 304)
+
+        self.article_page.title = 'Renamed Article'
+        self.article_page.save_revision().publish()
+        response = self.client.get(
+            reverse('feed_atom'), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_feed_cache_ignores_other_query_parameters(self):
+        self.client.get(reverse('feed_rss'))
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('feed_rss'), {'junk': '1'})
+        self.assertContains(response, self.article_page.title)
+        self.assertNotContains(response, 'junk')
+        self.assertFalse([
+            query for query in queries.captured_queries
+            if 'wagtailcore_page' in query['sql']])
+
+    def test_feed_keeps_no_request_state(self):
+        feed = GemRssFeed()
+        request = RequestFactory().get(reverse('feed_rss'))
+        request.site = self.main.get_site()
+        self.assertContains(feed(request), self.article_page.title)
+        self.assertFalse(hasattr(feed, 'base_url'))
+        self.assertFalse(hasattr(feed, 'site'))
+
+    def test_feed_queries_do_not_grow_with_articles(self):
+        def count_queries():
+            self.article_page.save_revision().publish()
+            with CaptureQueriesContext(connection) as queries:
+                self.client.get(reverse('feed_rss'))
+            return len(queries.captured_queries)
+
+        self.client.get(reverse('feed_rss'))
+        queries = count_queries()
+        for i in range(5):
+            self.mk_article(
+                self.article_page.get_parent(), title='Article %s' % i,
+                owner=User.objects.create_user(
+                    username='owner%s' % i, first_name='Owner'))
+        self.assertEqual(count_queries(), queries)
+
+
+class GemSectionFeedViewsTest(TestCase, MoloTestCaseMixin):
+    def setUp(self):
+        self.english = SiteLanguage.objects.create(locale='en')
+        self.french = SiteLanguage.objects.create(
+            locale='fr', is_main_language=False)
+        self.mk_main()
+
+        self.section = self.mk_section(self.section_index, title='Your mind')
+        self.articles = [
+            self.mk_article(self.section, title='Article %s' % i)
+            for i in range(5)]
+        self.mk_article_translation(
+            self.articles[0], self.french, title='Article en francais')
+
+    def get_feed(self, locale='en', section=None, **params):
+        section = section or self.section
+        return self.client.get(
+            reverse('feed_section_rss', args=[locale, section.pk]), params)
+
+    def test_feed_has_the_section_articles_in_a_language(self):
+        response = self.get_feed()
+        for article in self.articles:
+            self.assertContains(response, article.title)
+        self.assertNotContains(response, 'Article en francais')
+
+        response = self.get_feed('fr')
+        self.assertContains(response, 'Article en francais')
+        self.assertNotContains(response, 'Article 0')
+
+    def test_unknown_locale_or_section(self):
+        self.assertEqual(self.get_feed('xx').status_code, 404)
+        self.assertEqual(
+            self.get_feed(section=self.section_index).status_code, 404)
+        self.assertEqual(self.get_feed(before='nonsense').status_code, 404)
+        self.assertEqual(
+            self.get_feed(before='9' * 30 + '-1').status_code, 404)
+
+    def test_sections_sharing_a_slug(self):
+        other = self.mk_section(self.section_index, title='Your body')
+        subsection = self.mk_section(other, title='Subsection')
+        article = self.mk_article(subsection, title='Subsection article')
+        SectionPage.objects.filter(pk=subsection.pk).update(slug='your-mind')
+
+        response = self.get_feed()
+        self.assertContains(response, 'Article 0')
+        self.assertNotContains(response, article.title)
+        response = self.get_feed(section=subsection)
+        self.assertContains(response, article.title)
+        self.assertNotContains(response, 'Article 0')
+
+    @override_settings(FEED_PAGE_SIZE=2)
+    def test_feed_is_paginated_with_a_cursor(self):
+        titles = []
+        params = {}
+        for page in range(3):
+            response = self.get_feed(**params)
+            titles += re.findall(
+                r'<title>(Article \d)</title>', response.content)
+            next_url = re.search(
+                r'<atom:link href="([^"]+)" rel="next"', response.content)
+            if next_url is None:
+                break
+            params = {'before': next_url.group(1).split('before=')[1]}
+
+        self.assertEqual(page, 2)
+        self.assertEqual(
+            titles, ['Article %s' % i for i in reversed(range(5))])
+
+        response = self.client.get(
+            reverse('feed_section_atom', args=['en', self.section.pk]))
+        self.assertContains(response, 'rel="next"')
+
+    def test_publishing_an_article_renders_one_new_item(self):
+        self.get_feed()
+
+        rendered = []
+
+        def count_descriptions(sender, template, **kwargs):
+            if template.name == 'feed_description.html':
+                rendered.append(template)
+
+        template_rendered.connect(count_descriptions)
+        self.addCleanup(template_rendered.disconnect, count_descriptions)
+
+        self.mk_article(self.section, title='Article 5')
+        response = self.get_feed()
+        self.assertContains(response, 'Article 5')
+        self.assertEqual(len(rendered), 1)
+
 
 class GemReportCommentViewTest(TestCase, MoloTestCaseMixin):
     def setUp(self):
@@ -462,6 +714,7 @@ class GemReportCommentViewTest(TestCase, MoloTestCaseMixin):
 
         self.content_type = ContentType.objects.get_for_model(self.user)
 
+        self.english = SiteLanguage.objects.create(locale='en')
         self.mk_main()
 
         self.yourmind = self.mk_section(
@@ -508,3 +761,68 @@ class GemReportCommentViewTest(TestCase, MoloTestCaseMixin):
         )
 
         self.assertContains(response, 'You have already reported this comment')
+
+    def test_reporting_twice_keeps_one_report(self):
+        comment = self.create_comment(self.article, 'report me')
+        for reason in ('Spam', 'Bullying'):
+            self.client.post(
+                reverse('report_comment', args=(comment.pk,)),
+                {'report_reason': reason})
+
+        report = GemCommentReport.objects.get(comment=comment)
+        self.assertEqual(report.reported_reason, 'Spam')
+        self.assertEqual(comment.gem_report_count.count, 1)
+
+    def test_report_count(self):
+        comment = self.create_comment(self.article, 'report me')
+        other_user = User.objects.create_user(
+            username='other', password='other')
+        report, created = GemCommentReport.report(comment, self.user, 'Spam')
+        self.assertTrue(created)
+        GemCommentReport.report(comment, other_user, 'Spam')
+        self.assertEqual(
+            GemCommentReport.report(comment, self.user, 'Other'),
+            (report, False))
+        self.assertEqual(
+            MoloComment.objects.get(pk=comment.pk).gem_report_count.count, 2)
+
+        report.delete()
+        self.assertEqual(
+            MoloComment.objects.get(pk=comment.pk).gem_report_count.count, 1)
+
+    def test_report_is_recorded_and_flagged_in_one_request(self):
+        comment = self.create_comment(self.article, 'report me')
+        response = self.client.post(
+            reverse('report_comment', args=(comment.pk,)),
+            {'report_reason': 'Spam'})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'This comment has been reported.')
+        self.assertContains(response, self.article.url)
+        self.assertTrue(GemCommentReport.objects.filter(
+            comment=comment, user=self.user).exists())
+        self.assertEqual(comment.flags.filter(
+            flag=CommentFlag.SUGGEST_REMOVAL, user=self.user).count(), 1)
+
+    def test_report_fetches_the_comment_and_article_once(self):
+        comment = self.create_comment(self.article, 'report me')
+        self.client.get(reverse('report_comment', args=(comment.pk,)))
+
+        with CaptureQueriesContext(connection) as queries:
+            self.client.post(
+                reverse('report_comment', args=(comment.pk,)),
+                {'report_reason': 'Spam'})
+        tables = [
+            query['sql'] for query in queries.captured_queries
+            if query['sql'].startswith('SELECT') and (
+                'FROM "commenting_molocomment"' in query['sql'] or
+                'FROM "core_articlepage"' in query['sql'])]
+        self.assertEqual(len(tables), 2)
+
+    def test_reporting_a_reply_does_not_flag_it(self):
+        comment = self.create_comment(self.article, 'report me')
+        reply = self.create_comment(self.article, 'reply', parent=comment)
+        self.client.post(
+            reverse('report_comment', args=(reply.pk,)),
+            {'report_reason': 'Spam'})
+        self.assertFalse(reply.flags.exists())
@@ -12,9 +12,10 @@ from wagtail.wagtaildocs import urls as wagtaildocs_urls
 from wagtail.wagtailcore import urls as wagtail_urls
 
 from gem.views import report_response, GemRegistrationView, \
-    GemRssFeed, GemAtomFeed, GemForgotPasswordView, GemResetPasswordView, \
+    GemRssFeed, GemAtomFeed, GemSectionRssFeed, GemSectionAtomFeed, \
+    GemForgotPasswordView, GemResetPasswordView, \
     GemResetPasswordSuccessView, ReportCommentView, GemEditProfileView, \
-    AlreadyReportedCommentView
+    AlreadyReportedCommentView, export_download
 
 # implement CAS URLs in a production setting
 if settings.ENABLE_SSO:
@@ -75,8 +76,15 @@ urlpatterns += patterns(
                 namespace='molo.yourwords',
                 app_name='molo.yourwords')),
 
+    url(r'^exports/(?P<token>[\w:-]+)/$',
+        export_download, name='export_download'),
+
     url(r'^feed/rss/$', GemRssFeed(), name='feed_rss'),
     url(r'^feed/atom/$', GemAtomFeed(), name='feed_atom'),
+    url(r'^feed/rss/(?P<locale>[\w-]+)/(?P<section_id>\d+)/$',
+        GemSectionRssFeed(), name='feed_section_rss'),
+    url(r'^feed/atom/(?P<locale>[\w-]+)/(?P<section_id>\d+)/$',
+        GemSectionAtomFeed(), name='feed_section_atom'),
 
     url(r'^servicedirectory/', include('molo.servicedirectory.urls',
         namespace='molo.servicedirectory')),
@@ -0,0 +1,103 @@
+import binascii
+import socket
+
+from django.utils import timezone
+
+
+def queryset_chunks(queryset, chunk_size=2000, last_pk=None):
+    """
+    Iterate over a queryset in primary key order in lists of up to
+    chunk_size instances, fetching one list at a time. Starts after
+    last_pk if it is given.
+    """
+    queryset = queryset.order_by('pk')
+    while True:
+        chunk = queryset if last_pk is None else queryset.filter(
+            pk__gt=last_pk)
+        chunk = list(chunk[:chunk_size])
+        if not chunk:
+            return
+        yield chunk
+        last_pk = chunk[-1].pk
+
+
+def queryset_in_chunks(queryset, chunk_size=2000):
+    """
+    Iterate over a queryset in primary key order, fetching chunk_size rows
+    at a time so that only one chunk of instances is in memory at once.
+    """
+    for chunk in queryset_chunks(queryset, chunk_size):
+        for obj in chunk:
+            yield obj
+
+
+def encode_csv_value(value):
+    if isinstance(value, unicode):
+        return value.encode('utf-8')
+    return value
+
+
+class Echo(object):
+    """
+    A file-like object for csv.writer that returns each row instead of
+    keeping it, for streaming responses.
+    """
+
+    def write(self, value):
+        return value
+
+
+def local_date(value):
+    """
+    The date of a datetime in the current time zone.
+    """
+    if timezone.is_aware(value):
+        value = timezone.localtime(value)
+    return value.date()
+
+
+def parse_address(address):
+    """
+    Return an IPv4 or IPv6 address as an integer and its length in bits, or
+    None if it isn't one.
+    """
+    for family, bits in ((socket.AF_INET, 32), (socket.AF_INET6, 128)):
+        try:
+            packed = socket.inet_pton(family, address)
+        except (socket.error, ValueError):
+            continue
+        return int(binascii.hexlify(packed), 16), bits
+    return None
+
+
+def parse_networks(networks):
+    """
+    Parse networks given as addresses or in CIDR notation for in_networks,
+    raising ValueError for any that aren't valid.
+    """
+    parsed = []
+    for network in networks:
+        address, slash, prefix = network.partition('/')
+        parsed_address = parse_address(address)
+        if parsed_address is None or slash and not prefix.isdigit():
+            raise ValueError('Invalid network: %r' % network)
+        value, bits = parsed_address
+        shift = bits - int(prefix or bits)
+        if shift < 0:
+            raise ValueError('Invalid network: %r' % network)
+        parsed.append((value >> shift, bits, shift))
+    return parsed
+
+
+def in_networks(address, networks):
+    """
+    Return whether an address is in any of the networks parsed by
+    parse_networks.
+    """
+    parsed = parse_address(address)
+    if parsed is None:
+        return False
+    value, bits = parsed
+    return any(
+        network_bits == bits and value >> shift == network_value
+        for network_value, network_bits, shift in networks)
@@ -1,39 +1,139 @@
+import calendar
+import copy
+import hashlib
 import logging
 import random
-import re
+from collections import OrderedDict
+from datetime import datetime, timedelta
 
 from django import forms
 from django.conf import settings
-from django.contrib.auth import authenticate, login
+from django.contrib import messages
+from django.contrib.admin.views.decorators import staff_member_required
+from django.contrib.auth.decorators import permission_required
 from django.contrib.auth.models import User
 from django.contrib.auth.tokens import default_token_generator
 from django.contrib.syndication.views import Feed
+from django.core import signing
+from django.core.cache import cache
 from django.core.urlresolvers import reverse
-from django.http import HttpResponseRedirect
+from django.db import transaction
+from django.db.models import Q, Sum
+from django.http import FileResponse, Http404, HttpResponse, \
+    HttpResponseRedirect
 from django.http.request import QueryDict
 from django.http.response import HttpResponseForbidden
 from django.shortcuts import render
-from django.utils.feedgenerator import Atom1Feed
+from django.template.loader import render_to_string
+from django.utils import timezone
+from django.utils.cache import get_conditional_response
+from django.utils.feedgenerator import Atom1Feed, Rss201rev2Feed
+from django.utils.functional import cached_property
+from django.utils.http import http_date, parse_http_date, quote_etag
+from django.utils.timezone import utc
 from django.utils.translation import ugettext_lazy as _
 from django.views.generic import TemplateView
 from django.views.generic.edit import FormView
 
 from django_comments.forms import CommentDetailsForm
+from django_comments.views.moderation import perform_flag
 
 from forms import GemRegistrationForm, GemForgotPasswordForm, \
     GemResetPasswordForm, ReportCommentForm, GemEditProfileForm
 
-from gem.models import GemSettings, GemCommentReport
-from gem.settings import REGEX_PHONE, REGEX_EMAIL
+from gem.caching import get_cache_version
+from gem.exports import get_export_path_from_token
+from gem.constants import GENDER_NAMES
+from gem.models import GemSettings, GemCommentReport, \
+    GemCommentReportCount, GemUserRollup
+from gem.moderation import get_matcher
+from gem.ratelimit import get_client_ip, \
+    forgot_password_username_limiter, forgot_password_ip_limiter
+from gem.registration import create_user, login_new_user
+from gem.sites import get_site_for_page, get_site_for_request
 
 from molo.commenting.models import MoloComment
 
-from molo.core.models import ArticlePage
+from molo.core.models import (
+    ArticlePage, SectionIndexPage, SectionPage, SiteLanguage)
 from molo.profiles.views import RegistrationView, MyProfileEdit
-
+from wagtail.utils.pagination import paginate
 from wagtail.wagtailcore.models import Site
 
 
+@staff_member_required
+def export_download(request, token):
+    try:
+        path = get_export_path_from_token(token)
+        export_file = open(path, 'rb')
+    except (signing.BadSignature, IOError):
+        raise Http404
+
+    response = FileResponse(export_file, content_type='application/gzip')
+    response['Content-Disposition'] = \
+        'attachment;filename=Molo_export_%s.csv.gz' % settings.SITE_NAME
+    return response
+
+
+@permission_required('auth.change_user', raise_exception=True)
+def user_rollups(request):
+    """
+    The users that joined each day by site and gender, summed from
+    GemUserRollup for the last `days` days.
+    """
+    try:
+        days = max(1, min(int(request.GET.get('days', 30)), 366))
+    except ValueError:
+        days = 30
+    since = timezone.localtime(timezone.now()).date() - timedelta(days - 1)
+
+    rollups = GemUserRollup.objects.filter(date__gte=since)
+    language = request.GET.get('language')
+    if language:
+        rollups = rollups.filter(language=language)
+
+    genders = sorted(GENDER_NAMES) + ['']
+    hostnames = dict(Site.objects.values_list('pk', 'hostname'))
+    rows = {}
+    for rollup in rollups.values('date', 'site_id', 'gender').annotate(
+            users=Sum('count')):
+        key = (rollup['date'], hostnames.get(rollup['site_id']))
+        counts = rows.setdefault(key, dict.fromkeys(genders, 0))
+        # genders that are no longer choices are counted as unknown
+        column = rollup['gender'] if rollup['gender'] in counts else ''
+        counts[column] += rollup['users']
+    rows = OrderedDict(sorted(
+        rows.items(), key=lambda item: (-item[0][0].toordinal(),
+                                        item[0][1] or '')))
+
+    return render(request, 'admin/user_rollups.html', {
+        'days': days,
+        'language': language,
+        'genders': [GENDER_NAMES.get(gender, _('unknown'))
+                    for gender in genders],
+        'rows': [
+            (date, hostname, [row[gender] for gender in genders],
+             sum(row.values()))
+            for (date, hostname), row in rows.items()],
+    })
+
+
+@permission_required('commenting.change_molocomment', raise_exception=True)
+def comment_report_queue(request):
+    """
+    The reported comments, most reported and most recently reported first,
+    listed from GemCommentReportCount so the comments aren't scanned.
+    """
+    report_counts = GemCommentReportCount.objects.filter(
+        count__gt=0).select_related('comment', 'comment__user').order_by(
+        '-count', '-last_reported_at')
+    paginator, report_counts = paginate(request, report_counts)
+
+    return render(request, 'admin/comment_report_queue.html', {
+        'report_counts': report_counts,
+    })
+
+
 def report_response(request, comment_pk):
     comment = MoloComment.objects.get(pk=comment_pk)
 
@@ -45,6 +145,11 @@ def report_response(request, comment_pk):
 class GemRegistrationView(RegistrationView):
     form_class = GemRegistrationForm
 
+    def get_form_kwargs(self):
+        kwargs = super(GemRegistrationView, self).get_form_kwargs()
+        kwargs['site'] = get_site_for_request(self.request)
+        return kwargs
+
     def form_valid(self, form):
         username = form.cleaned_data['username']
         password = form.cleaned_data['password']
@@ -58,23 +163,18 @@ class GemRegistrationView(RegistrationView):
         security_question_2_answer = form.cleaned_data[
             'security_question_2_answer'
         ]
-        user = User.objects.create_user(username=username, password=password)
-
-        user.profile.alias = alias
-        user.profile.mobile_number = mobile_number
-        user.profile.save()
-
-        user.gem_profile.gender = gender
-        user.gem_profile.set_security_question_1_answer(
-            security_question_1_answer
-        )
-        user.gem_profile.set_security_question_2_answer(
-            security_question_2_answer
-        )
-        user.gem_profile.save()
-
-        authed_user = authenticate(username=username, password=password)
-        login(self.request, authed_user)
+        user = create_user(
+            username=username,
+            password=password,
+            alias=alias,
+            mobile_number=mobile_number,
+            gender=gender,
+            security_question_1_answer=security_question_1_answer,
+            security_question_2_answer=security_question_2_answer,
+            site=get_site_for_request(self.request),
+            language=getattr(self.request, 'LANGUAGE_CODE', ''))
+
+        login_new_user(self.request, user)
         return HttpResponseRedirect(form.cleaned_data.get('next', '/'))
 
     def render_to_response(self, context, **response_kwargs):
@@ -101,21 +201,17 @@ class GemForgotPasswordView(FormView):
             # and submitted, restart the process
             return HttpResponseRedirect(reverse('forgot_password'))
 
-        if 'forgot_password_attempts' not in self.request.session:
-            self.request.session['forgot_password_attempts'] = 0
+        username = form.cleaned_data['username']
+        client_ip = get_client_ip(self.request)
 
-        if self.request.session['forgot_password_attempts'] >= 5:
-            # GEM-195 implemented a 10 min session timeout, so effectively
-            # the user can only try again once their anonymous session expires.
-            # If they make another request within the 10 min time window the
-            # expiration will be reset to 10 mins in the future.
-            # This is obviously not bulletproof as an attacker could simply
-            # not send the session cookie to circumvent this.
+        # checked before looking up the user or the answer so that rejected
+        # attempts are cheap, whatever the client does with its cookies
+        if forgot_password_username_limiter.is_limited(username) or \
+                forgot_password_ip_limiter.is_limited(client_ip):
             form.add_error(None,
                            _('Too many attempts. Please try again later.'))
             return self.render_to_response({'form': form})
 
-        username = form.cleaned_data['username']
         random_security_question_idx = self.request.session[
             'random_security_question_idx'
         ]
@@ -128,7 +224,7 @@ class GemForgotPasswordView(FormView):
         try:
             user = User.objects.get_by_natural_key(username)
         except User.DoesNotExist:
-            self.request.session['forgot_password_attempts'] += 1
+            self.add_failed_attempt(username, client_ip)
             form.add_error('username',
                            _('The username that you entered appears to be '
                              'invalid. Please try again.'))
@@ -153,7 +249,7 @@ class GemForgotPasswordView(FormView):
             logging.warn('Unhandled security question index')
 
         if not is_answer_correct:
-            self.request.session['forgot_password_attempts'] += 1
+            self.add_failed_attempt(username, client_ip)
             form.add_error('random_security_question_answer',
                            _('Your answer to the security question was '
                              'invalid. Please try again.'))
@@ -169,6 +265,10 @@ class GemForgotPasswordView(FormView):
 
         return HttpResponseRedirect(reset_password_url)
 
+    def add_failed_attempt(self, username, client_ip):
+        forgot_password_username_limiter.add_attempt(username)
+        forgot_password_ip_limiter.add_attempt(client_ip)
+
     def render_to_response(self, context, **response_kwargs):
         random_security_question_idx = random.randint(
             0, len(self.security_questions) - 1
@@ -247,6 +347,11 @@ class GemResetPasswordSuccessView(TemplateView):
 class GemEditProfileView(MyProfileEdit):
     form_class = GemEditProfileForm
 
+    def get_form_kwargs(self):
+        kwargs = super(GemEditProfileView, self).get_form_kwargs()
+        kwargs['site'] = get_site_for_request(self.request)
+        return kwargs
+
     def get_initial(self):
         initial = super(GemEditProfileView, self).get_initial()
         initial.update({'gender': self.request.user.gem_profile.gender})
@@ -265,13 +370,72 @@ class GemEditProfileView(MyProfileEdit):
 
 
 class GemRssFeed(Feed):
+    """
+    The latest articles of the request's site.
+
+    Feeds are cached per site, language and address, with only the query
+    parameters in query_params, until a page of the site is published or
+    unpublished, and carry an ETag and Last-Modified header so polling
+    readers get a 304 when nothing changed.
+    """
     title = 'GEM Feed'
     description = 'GEM Feed'
-    description_template = 'feed_description.html'
+
+    # the query parameters the feed depends on
+    query_params = ()
 
     def __call__(self, request, *args, **kwargs):
-        self.base_url = '{0}://{1}'.format(request.scheme, request.get_host())
-        return super(GemRssFeed, self).__call__(request, *args, **kwargs)
+        # The feed is shared by every request, so the request's state is
+        # kept on a copy of it.
+        feed = copy.copy(self)
+        feed.base_url = '{0}://{1}'.format(request.scheme, request.get_host())
+        feed.request_path = request.path
+        feed.site = get_site_for_request(request)
+        return feed.serve(request, *args, **kwargs)
+
+    def serve(self, request, *args, **kwargs):
+        key = self.get_cache_key(request)
+        cached = cache.get(key)
+        if cached is None:
+            response = super(GemRssFeed, self).__call__(
+                request, *args, **kwargs)
+            cached = {
+                'content': response.content,
+                'content_type': response['Content-Type'],
+                'etag': hashlib.md5(response.content).hexdigest(),
+                'last_modified': http_date(),
+            }
+            cache.set(key, cached, settings.FEED_CACHE_TIMEOUT)
+
+        response = get_conditional_response(
+            request, etag=cached['etag'],
+            last_modified=parse_http_date(cached['last_modified']))
+        if response is None:
+            response = HttpResponse(
+                cached['content'], content_type=cached['content_type'])
+        response['ETag'] = quote_etag(cached['etag'])
+        response['Last-Modified'] = cached['last_modified']
+        return response
+
+    def get_feed_url(self, request):
+        """
+        The URL of the feed with only the query parameters it depends on, so
+        other parameters don't make new copies of it.
+        """
+        query = QueryDict(mutable=True)
+        for name in self.query_params:
+            if name in request.GET:
+                query[name] = request.GET[name]
+        url = self.base_url + self.request_path
+        return '%s?%s' % (url, query.urlencode()) if query else url
+
+    def get_cache_key(self, request):
+        site_id = getattr(self.site, 'pk', None)
+        return 'gem:feed:%s:%s:%s:%s:%s' % (
+            site_id, get_cache_version('feeds:%s' % site_id),
+            type(self).__name__,
+            getattr(request, 'LANGUAGE_CODE', settings.LANGUAGE_CODE),
+            hashlib.md5(self.get_feed_url(request)).hexdigest())
 
     def get_feed(self, obj, request):
         feed = super(GemRssFeed, self).get_feed(obj, request)
@@ -279,7 +443,7 @@ class GemRssFeed(Feed):
         # TODO: consider overriding django.contrib.sites.get_current_site to
         # work with Wagtail sites - could remove the need for all the URL
         # overrides
-        feed.feed['feed_url'] = self.base_url + request.path
+        feed.feed['feed_url'] = self.get_feed_url(request)
         return feed
 
     def link(self):
@@ -290,15 +454,39 @@ class GemRssFeed(Feed):
         return self.base_url + '/'
 
     def items(self):
-        return ArticlePage.objects.live().order_by(
-            '-first_published_at'
-        )[:20]
+        articles = ArticlePage.objects.live().select_related('owner')
+        if self.site is not None:
+            articles = articles.descendant_of(self.site.root_page)
+        return articles.order_by('-first_published_at')[:20]
 
     def item_title(self, article_page):
         return article_page.title
 
     def item_link(self, article_page):
-        return self.base_url + article_page.url
+        # the articles are all on the request's site, so their URLs are
+        # worked out from its root page instead of looking up every site
+        if self.site is None:
+            return self.base_url + article_page.url
+        return self.base_url + reverse('wagtail_serve', args=(
+            article_page.url_path[len(self.site.root_page.url_path):],))
+
+    def item_description(self, article_page):
+        # Cached for each revision of the article, so rebuilding a feed only
+        # renders the articles that changed. Rendered without the request,
+        # so the context processors aren't run for every article.
+        key = 'gem:feed:item:%s:%s:%s' % (
+            article_page.pk,
+            hashlib.md5(self.base_url).hexdigest(),
+            article_page.latest_revision_created_at and
+            article_page.latest_revision_created_at.isoformat())
+        description = cache.get(key)
+        if description is None:
+            description = render_to_string('feed_description.html', {
+                'obj': article_page,
+                'base_url': self.base_url,
+            })
+            cache.set(key, description, settings.FEED_CACHE_TIMEOUT)
+        return description
 
     def item_pubdate(self, article_page):
         return article_page.first_published_at
@@ -316,6 +504,130 @@ class GemAtomFeed(GemRssFeed):
     subtitle = GemRssFeed.description
 
 
+class PaginatedRssFeed(Rss201rev2Feed):
+    def add_root_elements(self, handler):
+        super(PaginatedRssFeed, self).add_root_elements(handler)
+        if self.feed.get('next_url'):
+            handler.addQuickElement(
+                'atom:link', None,
+                {'rel': 'next', 'href': self.feed['next_url']})
+
+
+class PaginatedAtomFeed(Atom1Feed):
+    def add_root_elements(self, handler):
+        super(PaginatedAtomFeed, self).add_root_elements(handler)
+        if self.feed.get('next_url'):
+            handler.addQuickElement(
+                'link', '', {'rel': 'next', 'href': self.feed['next_url']})
+
+
+class SectionFeedPage(object):
+    """
+    A page of the articles of a section in one language, newest first,
+    starting after the article a `before` cursor points to.
+    """
+
+    def __init__(self, section, locale, before, size):
+        self.section = section
+        self.locale = locale
+        self.before = before
+        self.size = size
+
+    @cached_property
+    def rows(self):
+        articles = ArticlePage.objects.live().descendant_of(
+            self.section).filter(
+            languages__language__locale=self.locale).select_related(
+            'owner').order_by('-first_published_at', '-pk')
+        if self.before is not None:
+            published_at, pk = self.before
+            articles = articles.filter(
+                Q(first_published_at__lt=published_at) |
+                Q(first_published_at=published_at, pk__lt=pk))
+        # one more than a page, to tell whether there is a next page
+        return list(articles[:self.size + 1])
+
+    @property
+    def articles(self):
+        return self.rows[:self.size]
+
+    @property
+    def next_cursor(self):
+        if len(self.rows) > self.size:
+            return encode_feed_cursor(self.articles[-1])
+
+
+def encode_feed_cursor(article_page):
+    published_at = article_page.first_published_at
+    return '%d-%d' % (
+        calendar.timegm(published_at.utctimetuple()) * 1000000 +
+        published_at.microsecond, article_page.pk)
+
+
+def decode_feed_cursor(cursor):
+    try:
+        timestamp, pk = [int(part) for part in cursor.split('-')]
+        published_at = datetime.utcfromtimestamp(
+            timestamp // 1000000).replace(
+            microsecond=timestamp % 1000000, tzinfo=utc)
+    except (ValueError, OverflowError):
+        raise Http404
+    return published_at, pk
+
+
+class GemSectionRssFeed(GemRssFeed):
+    """
+    The articles of a section in one language, FEED_PAGE_SIZE at a time.
+    Older articles are linked to from a `next` link with a cursor. The
+    section is given by its id.
+    """
+    feed_type = PaginatedRssFeed
+    query_params = ('before',)
+
+    def get_object(self, request, locale, section_id):
+        if not SiteLanguage.objects.filter(
+                locale=locale, is_active=True).exists():
+            raise Http404
+        index = SectionIndexPage.objects.child_of(
+            self.site.root_page).first() if self.site is not None else None
+        if index is None:
+            raise Http404
+        # sections are found by id, as sections in different parts of the
+        # tree can share a slug
+        section = SectionPage.objects.live().descendant_of(index).filter(
+            pk=section_id).first()
+        if section is None:
+            raise Http404
+        # translated articles are kept in the main language section
+        section = section.get_main_language_page()
+
+        before = request.GET.get('before')
+        return SectionFeedPage(
+            section.specific, locale,
+            before and decode_feed_cursor(before), settings.FEED_PAGE_SIZE)
+
+    def title(self, page):
+        return '%s: %s' % (self.description, page.section.title)
+
+    def link(self, page):
+        return self.item_link(page.section)
+
+    def feed_extra_kwargs(self, page):
+        next_cursor = page.next_cursor
+        return {
+            'next_url': next_cursor and '%s%s?before=%s' % (
+                self.base_url, self.request_path, next_cursor),
+        }
+
+    def items(self, page):
+        return page.articles
+
+
+class GemSectionAtomFeed(GemSectionRssFeed):
+    feed_type = PaginatedAtomFeed
+    subtitle = GemRssFeed.description
+
+
 # https://github.com/praekelt/yal-merge/blob/develop/yal/views.py#L711-L751
 def clean_comment(self):
     """
@@ -324,27 +636,18 @@ def clean_comment(self):
     """
     comment = self.cleaned_data['comment']
 
-    site = Site.objects.get(is_default_site=True)
-    settings = GemSettings.for_site(site)
-
-    banned_list = [REGEX_EMAIL, REGEX_PHONE]
-
-    banned_keywords_and_patterns = \
-        settings.banned_keywords_and_patterns.split('\n') \
-        if settings.banned_keywords_and_patterns else []
+    # comments are posted without the request, so validate against the
+    # site of the page being commented on
+    settings = GemSettings.for_site(get_site_for_page(self.target_object))
 
-    banned_list += banned_keywords_and_patterns
-
-    for keyword in banned_list:
-        keyword = keyword.replace('\r', '')
-        match = re.search(keyword, comment.lower())
-        if match:
-            raise forms.ValidationError(
-                _(
-                    'This comment has been removed as it contains profanity, '
-                    'contact information or other inappropriate content. '
-                )
+    matcher = get_matcher(settings, 'banned_keywords_and_patterns')
+    if matcher.search(comment):
+        raise forms.ValidationError(
+            _(
+                'This comment has been removed as it contains profanity, '
+                'contact information or other inappropriate content. '
             )
+        )
 
     return comment
 
@@ -353,14 +656,28 @@ CommentDetailsForm.clean_comment = clean_comment
 
 
 class ReportCommentView(FormView):
+    """
+    Record a user's report of a comment, flag the comment and thank the
+    user, all in the one request.
+    """
     template_name = 'comments/report_comment.html'
     form_class = ReportCommentForm
 
+    def get_comment(self):
+        if not hasattr(self, 'comment'):
+            # content_object caches the article on the comment, for both the
+            # form and the response
+            self.comment = MoloComment.objects.select_related(
+                'content_type').filter(pk=self.kwargs['comment_pk']).first()
+        return self.comment
+
     def render_to_response(self, context, **response_kwargs):
-        comment = MoloComment.objects.get(pk=self.kwargs['comment_pk'])
+        comment = self.get_comment()
+        if comment is None:
+            raise Http404
 
         if comment.gemcommentreport_set.filter(
-                user_id=self.request.user.id):
+                user_id=self.request.user.id).exists():
             return HttpResponseRedirect(
                 reverse('already_reported',
                         args=(self.kwargs['comment_pk'],)
@@ -375,27 +692,28 @@ class ReportCommentView(FormView):
         )
 
     def form_valid(self, form):
-        try:
-            comment = MoloComment.objects.get(pk=self.kwargs['comment_pk'])
-        except MoloComment.DoesNotExist:
+        comment = self.get_comment()
+        if comment is None:
             return HttpResponseForbidden()
 
-        GemCommentReport.objects.create(
-            comment=comment,
-            user=self.request.user,
-            reported_reason=form.cleaned_data['report_reason']
-        )
-
-        return HttpResponseRedirect(
-            "{0}?next={1}".format(
-                reverse(
-                    'molo.commenting:molo-comments-report',
-                    args=(self.kwargs['comment_pk'],)
-                ),
-                reverse(
-                    'report_response', args=(self.kwargs['comment_pk'],))
+        with transaction.atomic():
+            GemCommentReport.report(
+                comment=comment,
+                user=self.request.user,
+                reported_reason=form.cleaned_data['report_reason']
             )
-        )
+            # as molo.commenting's report view does
+            if comment.parent_id is None:
+                perform_flag(self.request, comment)
+                messages.info(self.request, _(
+                    'The comment has been reported.'))
+            else:
+                messages.info(self.request, _(
+                    'Reporting comment replies is not allowed.'))
+
+        return render(self.request, 'comments/report_response.html', {
+            'article': comment.content_object,
+        })
 
 
 class AlreadyReportedCommentView(TemplateView):
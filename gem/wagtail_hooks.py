@@ -1,5 +1,64 @@
+from django.conf.urls import url
+from django.core import urlresolvers
+from django.utils.translation import ugettext_lazy as _
+
 from gem.admin import GemFrontendUsersModelAdmin
+from gem.views import comment_report_queue, user_rollups
 from wagtail.contrib.modeladmin.options import modeladmin_register
+from wagtail.wagtailadmin.menu import MenuItem
+from wagtail.wagtailcore import hooks
 
 
 modeladmin_register(GemFrontendUsersModelAdmin)
+
+
+@hooks.register('before_serve_page')
+def record_page_view_restrictions(page, request, serve_args, serve_kwargs):
+    # PageCacheMiddleware doesn't cache pages with view restrictions, which
+    # are only checked when the page is served
+    request.page_view_restricted = page.get_view_restrictions().exists()
+
+
+@hooks.register('register_admin_urls')
+def register_user_rollups_url():
+    return [
+        url(r'^user-rollups/$', user_rollups, name='user_rollups'),
+    ]
+
+
+@hooks.register('register_admin_urls')
+def register_comment_report_queue_url():
+    return [
+        url(r'^comment-reports/$', comment_report_queue,
+            name='comment_report_queue'),
+    ]
+
+
+class UserRollupsMenuItem(MenuItem):
+    def is_shown(self, request):
+        return request.user.has_perm('auth.change_user')
+
+
+@hooks.register('register_admin_menu_item')
+def register_user_rollups_menu_item():
+    return UserRollupsMenuItem(
+        _('Users by gender'),
+        urlresolvers.reverse('user_rollups'),
+        classnames='icon icon-group',
+        order=10000,
+    )
+
+
+class CommentReportQueueMenuItem(MenuItem):
+    def is_shown(self, request):
+        return request.user.has_perm('commenting.change_molocomment')
+
+
+@hooks.register('register_admin_menu_item')
+def register_comment_report_queue_menu_item():
+    return CommentReportQueueMenuItem(
+        _('Reported comments'),
+        urlresolvers.reverse('comment_report_queue'),
+        classnames='icon icon-warning',
+        order=10001,
+    )
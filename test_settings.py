@@ -1,3 +1,5 @@
+import tempfile
+
 from gem.settings import *
 
 DATABASES = {
@@ -9,3 +11,4 @@ DATABASES = {
 
 DEBUG = True
 CELERY_ALWAYS_EAGER = True
+EXPORT_ROOT = join(tempfile.gettempdir(), 'gem-test-exports')